@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+ai_cache.py — AI (GPT) çağırışlarının nəticələri üçün davamlı keş
+
+`@cached("ad", model="gpt-3.5-turbo")` ilə bəzədilmiş funksiya eyni giriş üçün API-ni yenidən çağırmır:
+nəticə `ai_cache` cədvəlində saxlanılır (TTL ilə) və prosesdə kiçik LRU yaddaşında da tutulur.
+
+- Açar: ad + model + funksiyanın "prompt barmaq izi" + arqumentlərin heşi. Barmaq izi funksiyanın
+  bytecode-u və sabitlərindən (prompt mətnləri, parametrlər; daxili funksiyalar/comprehension-lar rekursiv)
+  hesablanır — prompt dəyişəndə köhnə nəticələr avtomatik istifadə olunmur, restartdan sonra isə eyni qalır.
+- DB-dən oxuma yalnız-oxuma hovuzundadır; `last_used`/`hits` yeniləmələri yaddaşda yığılır və
+  TOUCH_FLUSH_S-də bir dəfə (və ya növbəti yazılışla birlikdə) bir `executemany` ilə yazılır.
+- Ölçü məhduddur: AI_CACHE_MAX_ENTRIES keçiləndə ən çoxdan istifadə olunmayanlar (LRU) silinir.
+- Xəta (exception) keşlənmir.
+- `stats()` hit/miss/store/eviction sayğaclarını qaytarır (/admin/ai-cache).
+"""
+
+import atexit
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import database
+
+AI_CACHE_DEFAULTS = {
+    "AI_CACHE_ENABLED": os.getenv("AI_CACHE_ENABLED", "1") == "1",
+    "AI_CACHE_TTL_S": int(os.getenv("AI_CACHE_TTL_S", str(7 * 24 * 3600))),     # 7 gün
+    "AI_CACHE_MAX_ENTRIES": int(os.getenv("AI_CACHE_MAX_ENTRIES", "5000")),
+    "AI_CACHE_MEMORY_ENTRIES": int(os.getenv("AI_CACHE_MEMORY_ENTRIES", "256")),
+}
+EVICT_EVERY = 50  # hər N yazılışdan bir ölçü yoxlanılır (cədvəl müvəqqəti olaraq MAX + N sətrə çata bilər)
+TOUCH_FLUSH_S = 30  # DB hit-lərinin last_used/hits yeniləmələri ən azı bu qədər aralıqla yazılır
+
+_config = dict(AI_CACHE_DEFAULTS)
+_memory = OrderedDict()  # key -> (expires_at, value)
+_lock = threading.Lock()
+_stats = {"hits": 0, "memory_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+_by_namespace = {}
+_writes = 0
+_touches = {}  # key -> [last_used, hits] — hələ yazılmamış DB hit-ləri
+_last_touch_flush = 0.0
+
+
+def init_app(app):
+    """Parametrləri `app.config`-dən oxuyur (`ai_cache` cədvəli — database miqrasiyası)."""
+    for key, value in AI_CACHE_DEFAULTS.items():
+        app.config.setdefault(key, value)
+    _config.update({key: app.config[key] for key in AI_CACHE_DEFAULTS})
+    with _lock:
+        _memory.clear()
+
+
+def _run(fn, readonly: bool = False):
+    """Keş əməliyyatını öz bağlantısında icra edir (çağıranın tranzaksiyasına qarışmır)."""
+    pool = database.get_pool(readonly)
+    conn = pool.acquire()
+    try:
+        result = fn(conn)
+        conn.commit()
+        return result
+    finally:
+        pool.release(conn)
+
+
+def _count(namespace: str, field: str):
+    with _lock:
+        _stats[field] += 1
+        ns = _by_namespace.setdefault(namespace, {"hits": 0, "misses": 0})
+        if field in ns:
+            ns[field] += 1
+
+
+def _stable(value):
+    """Sabitin prosesdən asılı olmayan təsviri: daxili code obyektləri öz heşinə çevrilir (repr-də ünvan var)."""
+    if hasattr(value, "co_code"):
+        return _code_hash(value)
+    if isinstance(value, tuple):
+        return tuple(_stable(v) for v in value)
+    if isinstance(value, frozenset):
+        return tuple(sorted(repr(_stable(v)) for v in value))   # sıra PYTHONHASHSEED-dən asılıdır
+    return value
+
+
+def _code_hash(code) -> str:
+    payload = repr((code.co_code.hex(), _stable(code.co_consts), code.co_names))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _fingerprint(fn) -> str:
+    return _code_hash(fn.__code__)[:16]
+
+
+def make_key(namespace: str, model: str, fingerprint: str, args, kwargs) -> str:
+    payload = json.dumps([namespace, model, fingerprint, args, kwargs], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _memory_get(key: str, now: float):
+    with _lock:
+        item = _memory.get(key)
+        if item is None:
+            return None
+        if item[0] <= now:
+            del _memory[key]
+            return None
+        _memory.move_to_end(key)
+        return item
+
+
+def _memory_put(key: str, expires_at: float, value):
+    with _lock:
+        _memory[key] = (expires_at, value)
+        _memory.move_to_end(key)
+        while len(_memory) > _config["AI_CACHE_MEMORY_ENTRIES"]:
+            _memory.popitem(last=False)
+
+
+def _evict(conn, now: float) -> int:
+    removed = conn.execute("DELETE FROM ai_cache WHERE expires_at <= ?", (now,)).rowcount
+    overflow = conn.execute("SELECT COUNT(*) FROM ai_cache").fetchone()[0] - _config["AI_CACHE_MAX_ENTRIES"]
+    if overflow > 0:
+        removed += conn.execute(
+            "DELETE FROM ai_cache WHERE key IN (SELECT key FROM ai_cache ORDER BY last_used LIMIT ?)", (overflow,)
+        ).rowcount
+    return removed
+
+
+def cached(namespace: str, model: str, ttl: int = None):
+    """GPT köməkçi funksiyası üçün dekorator: nəticəni giriş heşinə görə keşləyir."""
+    def decorator(fn):
+        fingerprint = _fingerprint(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _config["AI_CACHE_ENABLED"]:
+                return fn(*args, **kwargs)
+            key = make_key(namespace, model, fingerprint, args, kwargs)
+            now = time.time()
+
+            item = _memory_get(key, now)
+            if item is not None:
+                _count(namespace, "hits")
+                _count(namespace, "memory_hits")
+                return item[1]
+
+            try:
+                row = _run(lambda conn: _lookup(conn, key, now), readonly=True)
+            except sqlite3.Error:
+                _count(namespace, "errors")
+                row = None
+            if row is not None:
+                _touch(key, now)
+                value = json.loads(row["value_json"])
+                _memory_put(key, row["expires_at"], value)
+                _count(namespace, "hits")
+                return value
+
+            _count(namespace, "misses")
+            value = fn(*args, **kwargs)
+            _store(key, namespace, model, value, ttl if ttl is not None else _config["AI_CACHE_TTL_S"])
+            return value
+
+        wrapper.cache_namespace = namespace
+        return wrapper
+    return decorator
+
+
+def _lookup(conn, key: str, now: float):
+    return conn.execute("SELECT value_json, expires_at FROM ai_cache WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+
+
+def _touch(key: str, now: float) -> None:
+    """DB hit-ini yaddaşda qeyd edir; yığılanlar ən çoxu TOUCH_FLUSH_S-də bir dəfə yazılır (hər hit-də yox)."""
+    with _lock:
+        item = _touches.setdefault(key, [now, 0])
+        item[0] = now
+        item[1] += 1
+        due = now - _last_touch_flush >= TOUCH_FLUSH_S
+    if due:
+        flush_touches()
+
+
+def _take_touches(now: float) -> list:
+    global _last_touch_flush
+    with _lock:
+        items = [(last_used, hits, key) for key, (last_used, hits) in _touches.items()]
+        _touches.clear()
+        _last_touch_flush = now
+    return items
+
+
+def _write_touches(conn, items: list) -> None:
+    conn.executemany("UPDATE ai_cache SET last_used = MAX(last_used, ?), hits = hits + ? WHERE key = ?", items)
+
+
+def flush_touches() -> None:
+    """Yığılmış last_used/hits yeniləmələrini bir tranzaksiyada yazır."""
+    items = _take_touches(time.time())
+    if not items:
+        return
+    try:
+        _run(lambda conn: _write_touches(conn, items))
+    except sqlite3.Error:
+        with _lock:
+            _stats["errors"] += 1
+
+
+def _store(key: str, namespace: str, model: str, value, ttl: int):
+    global _writes
+    now = time.time()
+    expires_at = now + ttl
+    _memory_put(key, expires_at, value)
+    with _lock:
+        _writes += 1
+        evict = _writes % EVICT_EVERY == 0
+
+    touches = _take_touches(now)
+
+    def write(conn):
+        if touches:
+            _write_touches(conn, touches)   # LRU eviction-dan əvvəl last_used aktual olsun
+        conn.execute(
+            "INSERT INTO ai_cache (key, namespace, model, value_json, created_at, expires_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value_json = excluded.value_json, expires_at = excluded.expires_at, "
+            "last_used = excluded.last_used",
+            (key, namespace, model, json.dumps(value, ensure_ascii=False), now, expires_at, now),
+        )
+        return _evict(conn, now) if evict else 0
+
+    try:
+        removed = _run(write)
+    except sqlite3.Error:
+        _count(namespace, "errors")
+        return
+    with _lock:
+        _stats["stores"] += 1
+        _stats["evictions"] += removed
+
+
+def stats() -> dict:
+    """Sayğaclar (proses üzrə) və cədvəlin cari ölçüsü."""
+    flush_touches()
+    try:
+        entries = _run(lambda conn: conn.execute("SELECT COUNT(*) FROM ai_cache").fetchone()[0])
+    except sqlite3.Error:
+        entries = None
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "hit_ratio": round(_stats["hits"] / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "memory_entries": len(_memory),
+            "max_entries": _config["AI_CACHE_MAX_ENTRIES"],
+            "ttl_s": _config["AI_CACHE_TTL_S"],
+            "by_namespace": {ns: dict(v) for ns, v in _by_namespace.items()},
+        }
+
+
+def clear() -> int:
+    """Keşi tam təmizləyir; silinən sətir sayını qaytarır."""
+    with _lock:
+        _memory.clear()
+        _touches.clear()
+    return _run(lambda conn: conn.execute("DELETE FROM ai_cache").rowcount)
+
+
+atexit.register(flush_touches)
@@ -2,7 +2,19 @@
 # -*- coding: utf-8 -*-
 
 import os
-from flask import Flask, render_template
+from dotenv import load_dotenv
+
+# .env bir dəfə, hər şeydən əvvəl yüklənir: modullar parametrlərini import zamanı oxuyur
+load_dotenv()
+
+from flask import Flask, render_template, jsonify, request
+import ai_cache
+import database
+import debug_log
+import jobs
+import metrics
+import query_audit
+import startup_report
 from database import init_db
 from blog import bp as blog_bp
 from events import bp as events_bp
@@ -20,6 +32,15 @@ from gallery_faces import bp as gallery_faces_bp
 from forum_tts import bp as forum_tts_bp
 from polls_speech import bp as polls_speech_bp
 
+ADMIN_PASS = "admin123"  # demo parol (yalnız dərs məqsədi üçün)
+
+
+def _admin_denied():
+    """`/admin/...` JSON səhifələri üçün parol yoxlaması (`?password=...`); parol səhvdirsə 403 cavabı."""
+    if request.args.get("password") != ADMIN_PASS:
+        return jsonify({"error": "Görüntü üçün ?password=admin123 əlavə edin."}), 403
+    return None
+
 def create_app():
     """Flask tətbiq obyektini yaradır və bütün blueprint-ləri qeydiyyatdan keçirir."""
     app = Flask(__name__)
@@ -27,15 +48,24 @@ def create_app():
     app.config["UPLOAD_FOLDER"] = os.path.join(app.root_path, "static", "uploads")
     app.config["AUDIO_FOLDER"] = os.path.join(app.root_path, "static", "audio")
     app.config["DETECTIONS_FOLDER"] = os.path.join(app.root_path, "static", "detections")
+    app.config["CACHE_FOLDER"] = os.path.join(app.root_path, "cache")  # yaradılan aralıq fayllar (git-ə düşmür)
     
     # Static qovluqları yarat
     os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
     os.makedirs(os.path.join(app.config["AUDIO_FOLDER"], "blog"), exist_ok=True)
     os.makedirs(os.path.join(app.config["AUDIO_FOLDER"], "forum"), exist_ok=True)
     os.makedirs(os.path.join(app.config["DETECTIONS_FOLDER"], "gallery"), exist_ok=True)
+    os.makedirs(app.config["CACHE_FOLDER"], exist_ok=True)
 
-    # Məlumat bazasını qur
+    # Məlumat bazasını qur, miqrasiyaları tətbiq et, bağlantı hovuzunu konfiqurasiya et
     init_db()
+    debug_log.init_app(app)
+    metrics.init_app(app)
+    database.init_app(app)
+    jobs.init_app(app)
+    ai_cache.init_app(app)
+    startup_report.init_app(app)
+    query_audit.init_app(app)
 
     # Modulları qoş
     app.register_blueprint(blog_bp)
@@ -44,6 +74,7 @@ def create_app():
     app.register_blueprint(gallery_bp)
     app.register_blueprint(polls_bp)
     app.register_blueprint(feedback_bp)
+    app.register_blueprint(jobs.bp)
     
     # Workshop 2 - AI/ML modulları
     app.register_blueprint(blog_ocr_bp)
@@ -63,6 +94,22 @@ def create_app():
         """
         return render_template("index.html")
 
+    @app.route("/admin/db-pool")
+    def db_pool_stats():
+        """DB bağlantı hovuzunun vəziyyəti: ölçü, açıq/boş bağlantılar, hit/miss/gözləmə sayğacları."""
+        denied = _admin_denied()
+        if denied:
+            return denied
+        return jsonify(database.pool_stats())
+
+    @app.route("/admin/ai-cache")
+    def ai_cache_stats():
+        """AI nəticə keşinin vəziyyəti: hit/miss/store/eviction sayğacları, sətir sayı."""
+        denied = _admin_denied()
+        if denied:
+            return denied
+        return jsonify(ai_cache.stats())
+
     return app
 
 if __name__ == "__main__":
@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from database import get_db, paginate_query
-import datetime, re
+from database import get_db, paginate_keyset, decode_cursor, encode_cursor
+from search import build_match_query, ensure_blog_search, fts_table_exists, rebuild_blog_search, query_terms
+import datetime, re, click
 
 bp = Blueprint("blog", __name__, url_prefix="/blog")
 
 ADMIN_PASS = "admin123"  # demo
+PER_PAGE = 5
+_fts_ready = False
 
 
 def slugify(text: str) -> str:
@@ -20,6 +23,59 @@ def slugify(text: str) -> str:
     return s[:80]
 
 
+def normalize_tag(tag: str) -> str:
+    """Teqi müqayisə üçün normallaşdırır (boşluqsuz, kiçik hərf)."""
+    return (tag or "").strip().lower()
+
+
+def parse_tags(text: str) -> list:
+    """`"python, Flask,python"` → `["python", "flask"]` (təkrarsız, sıranı saxlayır)."""
+    tags = []
+    for part in (text or "").split(","):
+        t = normalize_tag(part)
+        if t and t not in tags:
+            tags.append(t)
+    return tags
+
+
+def sync_post_tags(db, post_id: int, tags_text: str):
+    """`blog_post_tags` cədvəlini yazının `tags` sahəsi ilə eyniləşdirir (commit çağıran tərəfdədir)."""
+    db.execute("DELETE FROM blog_post_tags WHERE post_id = ?", (post_id,))
+    db.executemany(
+        "INSERT INTO blog_post_tags (post_id, tag) VALUES (?, ?)",
+        [(post_id, t) for t in parse_tags(tags_text)],
+    )
+
+
+def rebuild_post_tags(db) -> int:
+    """Bütün yazıların teqlərini `blog_posts.tags`-dan yenidən qurur (backfill)."""
+    db.execute("DELETE FROM blog_post_tags")
+    rows = db.execute("SELECT id, tags FROM blog_posts").fetchall()
+    db.executemany(
+        "INSERT INTO blog_post_tags (post_id, tag) VALUES (?, ?)",
+        [(r["id"], t) for r in rows for t in parse_tags(r["tags"])],
+    )
+    return len(rows)
+
+
+def _search_ready(db) -> bool:
+    """FTS5 indeksi mövcuddurmu (blog_search miqrasiyası yaradır; proses üzrə yadda saxlanılır)."""
+    global _fts_ready
+    if not _fts_ready:
+        _fts_ready = fts_table_exists(db, "blog_search")
+    return _fts_ready
+
+
+@bp.cli.command("reindex")
+def reindex_command():
+    """Teq cədvəlini və FTS5 axtarış indeksini `blog_posts`-dan yenidən qurur."""
+    db = get_db()
+    posts = rebuild_post_tags(db)
+    indexed = rebuild_blog_search(db) if ensure_blog_search(db) else 0
+    db.commit()
+    click.echo(f"Tags rebuilt for {posts} posts, {indexed} posts indexed for search.")
+
+
 @bp.route("/")
 def list_posts():
     db = get_db()
@@ -28,22 +84,16 @@ def list_posts():
     q = request.args.get("q", "").strip()
     tag = request.args.get("tag", "").strip()
     published = request.args.get("published", "").strip()
-    page = int(request.args.get("page", 1))
+    cursor = request.args.get("cursor", "").strip()
 
     # Build WHERE conditions
-    conditions = ["1=1"]
+    conditions = []
     params = []
 
-    # Search filter
-    if q:
-        conditions.append("(title LIKE ? OR content LIKE ?)")
-        search_term = f"%{q}%"
-        params.extend([search_term, search_term])
-
-    # Tag filter
+    # Tag filter: exact tag via idx_blog_post_tags_tag ("py" no longer matches "python")
     if tag:
-        conditions.append("tags LIKE ?")
-        params.append(f"%{tag}%")
+        conditions.append("id IN (SELECT post_id FROM blog_post_tags WHERE tag = ?)")
+        params.append(normalize_tag(tag))
 
     # Published filter
     if published == "1":
@@ -51,19 +101,50 @@ def list_posts():
     elif published == "0":
         conditions.append("is_published = 0")
 
-    # Build SQL query
-    where_clause = " AND ".join(conditions)
-    base_sql = f"SELECT * FROM blog_posts WHERE {where_clause} ORDER BY created_at DESC"
+    # Search: ranked FTS5 match (LIKE only if this SQLite has no FTS5)
+    if q and query_terms(q) and _search_ready(db):
+        return _search_posts(db, q, conditions, params, cursor, tag=tag, published=published)
+    if q:
+        conditions.append("(title LIKE ? OR content LIKE ?)")
+        search_term = f"%{q}%"
+        params.extend([search_term, search_term])
 
-    # Pagination: 5 posts per page
-    sql_with_limit, limit, offset = paginate_query(base_sql, page, 5)
-    params.extend([limit, offset])
+    # Keyset pagination on (created_at, id): 5 posts per page
+    rows, next_cursor, prev_cursor = paginate_keyset(
+        db, "SELECT * FROM blog_posts", conditions, params,
+        [("created_at", "DESC"), ("id", "DESC")], cursor, PER_PAGE,
+    )
+    posts = [dict(row) for row in rows]
 
-    # Execute query
-    cursor = db.execute(sql_with_limit, params)
-    posts = [dict(row) for row in cursor.fetchall()]
+    return render_template(
+        "blog/list.html", posts=posts, q=q, tag=tag, published=published,
+        next_cursor=next_cursor, prev_cursor=prev_cursor,
+    )
 
-    return render_template("blog/list.html", posts=posts, q=q, tag=tag, published=published, page=page)
+
+def _search_posts(db, q, conditions, params, cursor, **filters):
+    # bm25 order has no stable key, so the cursor carries the page number.
+    _, values = decode_cursor(cursor)
+    page = values[0] if values and isinstance(values[0], int) and values[0] > 0 else 1
+
+    where = " AND ".join(["blog_search MATCH ?"] + conditions)
+    rows = db.execute(
+        f"""
+        SELECT p.*
+        FROM blog_search JOIN blog_posts p ON p.id = blog_search.rowid
+        WHERE {where}
+        ORDER BY bm25(blog_search, 10.0, 1.0)
+        LIMIT ? OFFSET ?
+        """,
+        [build_match_query(q)] + params + [PER_PAGE + 1, (page - 1) * PER_PAGE],
+    ).fetchall()
+    posts = [dict(row) for row in rows[:PER_PAGE]]
+
+    return render_template(
+        "blog/list.html", posts=posts, q=q, **filters,
+        next_cursor=encode_cursor("n", [page + 1]) if len(rows) > PER_PAGE else None,
+        prev_cursor=encode_cursor("p", [page - 1]) if page > 1 else None,
+    )
 
 
 @bp.route("/<slug>")
@@ -133,10 +214,11 @@ def new_post():
 
     # Insert into database
     created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-    db.execute(
+    cursor = db.execute(
         "INSERT INTO blog_posts (title, content, tags, created_at, is_published, slug) VALUES (?, ?, ?, ?, ?, ?)",
         (title, content, tags, created_at, is_published, slug)
     )
+    sync_post_tags(db, cursor.lastrowid, tags)
     db.commit()
 
     flash("Yazı uğurla yaradıldı!", "success")
@@ -191,6 +273,7 @@ def edit(post_id: int):
         "UPDATE blog_posts SET title=?, content=?, tags=?, is_published=? WHERE id=?",
         (title, content, tags, is_published, post_id)
     )
+    sync_post_tags(db, post_id, tags)
     db.commit()
 
     flash("Yazı uğurla yeniləndi!", "success")
@@ -205,7 +288,8 @@ def delete(post_id: int):
         flash("Admin parolu səhvdir. İcazə yoxdur.", "error")
         return redirect(url_for("blog.list_posts")), 403
 
-    db = get_db()
+    # GET route that writes: ask for the writer explicitly
+    db = get_db(readonly=False)
 
     # Check if post exists
     cursor = db.execute("SELECT id FROM blog_posts WHERE id = ?", (post_id,))
@@ -8,25 +8,16 @@ sonra GPT Chat API ilə mətni təmizləyir və təkmilləşdirir.
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from database import get_db
+import ai_cache
+import jobs
+import openai_client
+import media
 import os
 import datetime
-import secrets
 import base64
-from dotenv import load_dotenv
-
-load_dotenv()
 
 bp = Blueprint("blog_ocr", __name__, url_prefix="/blog")
 
-def get_gpt_api_key():
-    """
-    Environment variable-dan GPT API açarını alır.
-    """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY tapılmadı! .env faylına əlavə edin.")
-    return api_key
-
 def extract_text_with_gpt_vision(image_path: str) -> str:
     """
     GPT Vision API ilə şəkilərdən mətn çıxarır.
@@ -40,12 +31,11 @@ def extract_text_with_gpt_vision(image_path: str) -> str:
     
     Nümunə:
     import base64
-    from openai import OpenAI
     
     with open(image_path, "rb") as image_file:
         image_base64 = base64.b64encode(image_file.read()).decode('utf-8')
     
-    client = OpenAI(api_key=get_gpt_api_key())
+    client = openai_client.get_client()
     response = client.chat.completions.create(
         model="gpt-4o-mini",
         messages=[{
@@ -62,6 +52,7 @@ def extract_text_with_gpt_vision(image_path: str) -> str:
     # TODO: Tələbə burada kod yazmalıdır
     return "TODO: GPT Vision API çağırışı implement edilməlidir"
 
+@ai_cache.cached("blog_ocr.improve", model="gpt-3.5-turbo")
 def improve_text_with_gpt(extracted_text: str) -> str:
     """
     GPT Chat API istifadə edərək OCR mətnini təmizləyir və təkmilləşdirir.
@@ -75,11 +66,9 @@ def improve_text_with_gpt(extracted_text: str) -> str:
     Nümunə prompt:
     "Bu OCR nəticəsini təmizlə, səhvləri düzəlt və strukturlaşdır:\n\n{extracted_text}"
     """
-    api_key = get_gpt_api_key()
+    client = openai_client.get_client()
     
     # TODO: Tələbə burada kod yazmalıdır
-    # from openai import OpenAI
-    # client = OpenAI(api_key=api_key)
     # prompt = f"Bu OCR nəticəsini təmizlə, səhvləri düzəlt və strukturlaşdır. Mətni daha oxunaqlı et, amma məzmunu dəyişmə:\n\n{extracted_text}"
     # response = client.chat.completions.create(
     #     model="gpt-3.5-turbo",
@@ -91,13 +80,49 @@ def improve_text_with_gpt(extracted_text: str) -> str:
     
     return "TODO: GPT API çağırışı implement edilməlidir"
 
+@jobs.handler("blog_ocr")
+def run_ocr_job(payload: dict) -> dict:
+    """Fon işi: GPT Vision ilə mətn çıxarır, GPT Chat ilə təmizləyir və DB-yə yazır."""
+    post_id = payload["post_id"]
+    image_path = os.path.join(current_app.config["UPLOAD_FOLDER"], payload["filename"])
+    db = get_db()
+
+    # Eyni şəkil (fayl adı = məzmun heşi) artıq emal olunubsa, nəticəni təkrar istifadə et
+    previous = None
+    if media.content_hash(payload["filename"]) is not None:   # köhnə (təsadüfi/seed) adlar başqa məzmun ola bilər
+        previous = db.execute(
+            "SELECT extracted_text, improved_text FROM blog_ocr_results WHERE image_path = ? ORDER BY id DESC LIMIT 1",
+            (payload["filename"],)
+        ).fetchone()
+    if previous is not None:
+        extracted_text, improved_text = previous["extracted_text"], previous["improved_text"]
+    else:
+        # GPT Vision ilə mətn çıxar
+        extracted_text = extract_text_with_gpt_vision(image_path)
+
+        # GPT Chat ilə təmizlə
+        improved_text = improve_text_with_gpt(extracted_text)
+
+    # DB-yə yaz
+    created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+    cursor = db.execute(
+        "INSERT INTO blog_ocr_results (post_id, extracted_text, improved_text, image_path, created_at) VALUES (?, ?, ?, ?, ?)",
+        (post_id, extracted_text, improved_text, payload["filename"], created_at)
+    )
+    db.commit()
+    return {
+        "endpoint": "blog_ocr.ocr_result",
+        "values": {"post_id": post_id, "result_id": cursor.lastrowid},
+        "message": "OCR uğurla tamamlandı!",
+    }
+
 @bp.route("/<int:post_id>/ocr", methods=["GET", "POST"])
 def ocr_extract(post_id: int):
     """
     Blog yazısına şəkil yükləyib GPT Vision ilə mətn çıxarır.
     
     GET: Şəkil yükləmə formu göstərir
-    POST: Şəkil yükləyir, GPT Vision ilə OCR işlədir, GPT Chat ilə təmizləyir və DB-yə yazır
+    POST: Şəkli yükləyir və OCR işini növbəyə qoyur (GPT Vision + GPT Chat fon worker-ində işləyir)
     """
     db = get_db()
     
@@ -117,31 +142,16 @@ def ocr_extract(post_id: int):
             flash("Şəkil faylı seçilməyib.", "error")
             return redirect(url_for("blog_ocr.ocr_extract", post_id=post_id))
         
-        # Şəkili yüklə
-        ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else 'jpg'
-        filename = f"{secrets.token_hex(8)}.{ext}"
-        image_path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
-        
         try:
-            file.save(image_path)
+            # Şəkili yüklə (məzmun-ünvanlı: eyni fayl yenidən yazılmır)
+            filename = media.save_upload(db, file, default_ext="jpg")
             
-            # GPT Vision ilə mətn çıxar
-            extracted_text = extract_text_with_gpt_vision(image_path)
-            
-            # GPT Chat ilə təmizlə
-            improved_text = improve_text_with_gpt(extracted_text)
-            
-            # DB-yə yaz
-            created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-            cursor = db.execute(
-                "INSERT INTO blog_ocr_results (post_id, extracted_text, improved_text, image_path, created_at) VALUES (?, ?, ?, ?, ?)",
-                (post_id, extracted_text, improved_text, filename, created_at)
+            # OCR işini növbəyə qoy (request thread-i model/API cavabını gözləmir)
+            job_id = jobs.enqueue(
+                "blog_ocr", {"post_id": post_id, "filename": filename},
+                back_endpoint="blog_ocr.ocr_extract", back_values={"post_id": post_id},
             )
-            db.commit()
-            
-            result_id = cursor.lastrowid
-            flash("OCR uğurla tamamlandı!", "success")
-            return redirect(url_for("blog_ocr.ocr_result", post_id=post_id, result_id=result_id))
+            return redirect(url_for("jobs.status", job_id=job_id))
             
         except ValueError as e:
             flash(f"Xəta: {str(e)}", "error")
@@ -8,24 +8,16 @@ sonra OpenAI TTS API ilə səs faylına çevirir.
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from database import get_db
+import ai_cache
+import jobs
+import openai_client
+import tts_stream
 import os
 import datetime
-import secrets
-from dotenv import load_dotenv
-
-load_dotenv()
 
 bp = Blueprint("blog_tts", __name__, url_prefix="/blog")
 
-def get_gpt_api_key():
-    """
-    Environment variable-dan GPT API açarını alır.
-    """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY tapılmadı! .env faylına əlavə edin.")
-    return api_key
-
+@ai_cache.cached("blog_tts.generate", model="gpt-3.5-turbo")
 def generate_blog_with_gpt(title: str, keywords: str) -> str:
     """
     GPT Chat API istifadə edərək başlıq və açar sözlərdən blog yazısı yaradır.
@@ -39,11 +31,9 @@ def generate_blog_with_gpt(title: str, keywords: str) -> str:
     Nümunə prompt:
     "Bu başlıq və açar sözlərdən 500 sözlük, maraqlı və informativ blog yazısı yaz:\nBaşlıq: {title}\nAçar sözlər: {keywords}"
     """
-    api_key = get_gpt_api_key()
+    client = openai_client.get_client()
     
     # TODO: Tələbə burada kod yazmalıdır
-    # from openai import OpenAI
-    # client = OpenAI(api_key=api_key)
     # prompt = f"Bu başlıq və açar sözlərdən 500 sözlük, maraqlı və informativ blog yazısı yaz. Yazı strukturlaşdırılmış, oxunaqlı və məzmunlu olsun.\n\nBaşlıq: {title}\nAçar sözlər: {keywords}\n\nBlog yazısını yalnız mətn kimi qaytar, başqa formatlama olmasın."
     # response = client.chat.completions.create(
     #     model="gpt-3.5-turbo",
@@ -55,36 +45,54 @@ def generate_blog_with_gpt(title: str, keywords: str) -> str:
     
     return "TODO: GPT API çağırışı implement edilməlidir"
 
-def create_tts_audio_with_openai(text: str, voice: str = "alloy") -> str:
+def create_tts_audio_with_openai(text: str, voice: str = "alloy", filename: str = None) -> str:
     """
-    OpenAI TTS API ilə mətni səs faylına çevirir.
-    
-    TODO: Tələbə bu funksiyanı implement etməlidir:
-    1. OpenAI client yarat
-    2. TTS API çağırışı et (tts-1 model)
-    3. Audio faylını static/audio/blog/ qovluğuna yaz
-    4. Fayl adını qaytar
+    OpenAI TTS API ilə mətni səs faylına çevirir (static/audio/blog/) və fayl adını qaytarır.
+    Audio hissələri gəldikcə diskə yazılır (`tts_stream`), player səhifəsi sintez bitmədən oxumağa başlaya bilər.
+    `filename` — əvvəlcədən `tts_stream.reserve("blog")` ilə seçilmiş ad.
     
     Voice seçimləri: alloy, echo, fable, onyx, nova, shimmer
-    
-    Nümunə:
-    from openai import OpenAI
-    
-    client = OpenAI(api_key=get_gpt_api_key())
-    response = client.audio.speech.create(
-        model="tts-1",
-        voice=voice,
-        input=text
-    )
-    
-    filename = f"{secrets.token_hex(8)}.mp3"
-    audio_path = os.path.join(current_app.config["AUDIO_FOLDER"], "blog", filename)
-    os.makedirs(os.path.dirname(audio_path), exist_ok=True)
-    response.stream_to_file(audio_path)
-    return f"blog/{filename}"
     """
-    # TODO: Tələbə burada kod yazmalıdır
-    return "TODO: OpenAI TTS API çağırışı implement edilməlidir"
+    return tts_stream.synthesize(text, voice, "blog", filename)
+
+@jobs.handler("blog_tts")
+def run_tts_job(payload: dict) -> dict:
+    """Fon işi: GPT ilə blog yazısı yaradır, OpenAI TTS ilə audio yaradır və DB-yə yazır."""
+    post_id = payload["post_id"]
+
+    # GPT ilə blog yazısı yarat
+    generated_content = generate_blog_with_gpt(payload["title"], payload["keywords"])
+
+    # Audio faylının adını əvvəlcədən seç və DB-yə yaz: player səhifəsi sintez bitmədən açılır
+    audio_filename = tts_stream.reserve("blog")
+    db = get_db()
+    file_id = None
+    try:
+        created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+        cursor = db.execute(
+            "INSERT INTO blog_tts_files (post_id, audio_filename, generated_content, created_at) VALUES (?, ?, ?, ?)",
+            (post_id, audio_filename, generated_content, created_at)
+        )
+        db.commit()
+        file_id = cursor.lastrowid
+        result = {
+            "endpoint": "blog_tts.tts_player",
+            "values": {"post_id": post_id, "file_id": file_id},
+            "message": "Blog yazısı yaradıldı, audio hazırlanır...",
+        }
+        jobs.publish(result)
+
+        # OpenAI TTS audio yarat (hissələr gəldikcə diskə yazılır və player-ə axır)
+        voice = os.getenv("OPENAI_TTS_VOICE", "alloy")
+        create_tts_audio_with_openai(generated_content, voice, audio_filename)
+    except Exception:
+        # Marker yalnız sintez zamanı deyil, insert/publish xətasında da qalmamalıdır
+        tts_stream.discard("blog", audio_filename)
+        if file_id is not None:
+            db.execute("DELETE FROM blog_tts_files WHERE id = ?", (file_id,))
+            db.commit()
+        raise
+    return result
 
 @bp.route("/<int:post_id>/tts/generate", methods=["GET", "POST"])
 def tts_generate(post_id: int):
@@ -92,7 +100,7 @@ def tts_generate(post_id: int):
     Blog yazısı üçün TTS yaradır.
     
     GET: Form göstərir (başlıq + açar sözlər)
-    POST: GPT ilə blog yazısı yaradır, OpenAI TTS ilə audio yaradır və DB-yə yazır
+    POST: Yaratma işini növbəyə qoyur (GPT + OpenAI TTS fon worker-ində işləyir)
     """
     db = get_db()
     
@@ -111,24 +119,12 @@ def tts_generate(post_id: int):
             return redirect(url_for("blog_tts.tts_generate", post_id=post_id))
         
         try:
-            # GPT ilə blog yazısı yarat
-            generated_content = generate_blog_with_gpt(title, keywords)
-            
-            # OpenAI TTS audio yarat
-            voice = os.getenv("OPENAI_TTS_VOICE", "alloy")
-            audio_filename = create_tts_audio_with_openai(generated_content, voice)
-            
-            # DB-yə yaz
-            created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-            cursor = db.execute(
-                "INSERT INTO blog_tts_files (post_id, audio_filename, generated_content, created_at) VALUES (?, ?, ?, ?)",
-                (post_id, audio_filename, generated_content, created_at)
+            # GPT + TTS işini növbəyə qoy
+            job_id = jobs.enqueue(
+                "blog_tts", {"post_id": post_id, "title": title, "keywords": keywords},
+                back_endpoint="blog_tts.tts_generate", back_values={"post_id": post_id},
             )
-            db.commit()
-            
-            file_id = cursor.lastrowid
-            flash("Blog yazısı və audio uğurla yaradıldı!", "success")
-            return redirect(url_for("blog_tts.tts_player", post_id=post_id, file_id=file_id))
+            return redirect(url_for("jobs.status", job_id=job_id))
             
         except ValueError as e:
             flash(f"Xəta: {str(e)}", "error")
@@ -154,3 +150,15 @@ def tts_player(post_id: int, file_id: int):
         return render_template("404.html"), 404
     
     return render_template("blog/tts_player.html", tts_file=dict(tts_file), post_id=post_id)
+
+@bp.route("/<int:post_id>/tts/<int:file_id>/audio")
+def tts_audio(post_id: int, file_id: int):
+    """
+    Audio faylı: hazırdırsa adi fayl kimi, hələ sintez olunursa chunked axın kimi (gələn hissələrlə).
+    """
+    row = get_db().execute(
+        "SELECT audio_filename FROM blog_tts_files WHERE id = ? AND post_id = ?", (file_id, post_id)
+    ).fetchone()
+    if not row:
+        return render_template("404.html"), 404
+    return tts_stream.stream_audio("blog", row["audio_filename"])
@@ -1,43 +1,690 @@
-
 # -*- coding: utf-8 -*-
 
-import os, sqlite3, datetime, json
-from flask import g
+import os, sqlite3, datetime, json, queue, threading, pathlib, base64
+import click
+from flask import g, has_request_context, request
+from flask.cli import AppGroup
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "campusconnect.db")
 
-def get_db():
-    """Flask `g` daxilində tək SQLite bağlantısı saxlayır və qaytarır."""
-    if "db" not in g:
-        g.db = sqlite3.connect(DB_PATH)
-        g.db.row_factory = sqlite3.Row
-    return g.db
+# Bağlantı hovuzunun (connection pool) default parametrləri.
+# `init_app` bunları `app.config`-ə yazır; orada və ya env dəyişənləri ilə dəyişmək olar.
+POOL_DEFAULTS = {
+    "DB_POOL_SIZE": int(os.getenv("DB_POOL_SIZE", "8")),            # prosesdə maksimum açıq bağlantı
+    "DB_POOL_TIMEOUT": float(os.getenv("DB_POOL_TIMEOUT", "5")),    # boş bağlantı üçün gözləmə (saniyə)
+    "DB_READ_POOL_SIZE": int(os.getenv("DB_READ_POOL_SIZE", "16")), # yalnız-oxuma bağlantıları (GET)
+    "DB_BUSY_TIMEOUT_MS": int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000")),
+    "DB_CACHE_SIZE_KIB": int(os.getenv("DB_CACHE_SIZE_KIB", "16384")),
+    "DB_MMAP_SIZE": int(os.getenv("DB_MMAP_SIZE", str(128 * 1024 * 1024))),
+}
+
+# Tətbiq başlayanda tətbiq olunmamış miqrasiyaları icra et (deploy zamanı `flask db upgrade` ilə 0 qoymaq olar).
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1") == "1"
+
+# Bu HTTP metodları ilə gələn sorğularda `get_db()` avtomatik yalnız-oxuma bağlantısı verir.
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Hovuzda `DB_POOL_TIMEOUT` saniyə ərzində boş bağlantı tapılmadıqda atılır."""
+
+
+def configure_connection(conn, busy_timeout_ms: int = 5000, cache_size_kib: int = 16384, mmap_size: int = 0,
+                         readonly: bool = False):
+    """
+    Yeni açılmış bağlantıya PRAGMA-ları bir dəfə tətbiq edir (hər sorğuda yox).
+
+    - journal_mode=WAL: oxucular yazanı bloklamır, yazanlar oxucuları bloklamır
+    - synchronous=NORMAL: WAL rejimində təhlükəsiz və hər commit-də fsync etmir
+    - busy_timeout: "database is locked" əvəzinə kilidin açılmasını gözləyir
+    - cache_size / mmap_size: səhifə keşi və yaddaşa xəritələnmiş oxuma
+    - foreign_keys=ON: ON DELETE CASCADE işləsin
+    - readonly=True: journal rejiminə toxunmur, `query_only=ON` ilə istənilən yazını rədd edir
+    """
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+    else:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{int(cache_size_kib)}")
+    conn.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+class ConnectionPool:
+    """
+    Proses daxilində hazır (konfiqurasiya olunmuş) SQLite bağlantılarını saxlayan hovuz.
+
+    - `acquire()` boş bağlantı qaytarır (hit); yoxdursa və limit dolmayıbsa yenisini açır (miss);
+      limit dolubsa `timeout` saniyə gözləyir, sonra `PoolTimeoutError` atır.
+    - `release()` açıq qalmış tranzaksiyanı geri qaytarır (rollback) və bağlantını hovuza qaytarır.
+    - `stats()` müşahidə üçün sayğacları qaytarır.
+    - `readonly=True` olduqda bağlantılar `mode=ro` URI ilə açılır (WAL-da yazanı gözləmədən paralel oxuyur).
+    - `dedicated()` hovuzdan kənar, eyni qaydada konfiqurasiya olunmuş ayrıca bağlantı açır (fon yazıçıları üçün).
+    """
+
+    def __init__(self, path: str, size: int = 8, timeout: float = 5.0, readonly: bool = False, **pragmas):
+        self.path = path
+        self.readonly = readonly
+        self.size = max(1, int(size))
+        self.timeout = float(timeout)
+        self.pragmas = pragmas
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._in_use = 0
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.timeouts = 0
+
+    def _connect(self):
+        if self.readonly:
+            uri = pathlib.Path(self.path).resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=_connection_factory)
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=False, factory=_connection_factory)
+        conn.row_factory = sqlite3.Row
+        return configure_connection(conn, readonly=self.readonly, **self.pragmas)
+
+    def dedicated(self):
+        """
+        Hovuzun limitinə daxil olmayan ayrıca bağlantı: uzunömürlü fon thread-i (məs. `vote_buffer`) sorğularla
+        hovuz üçün yarışmasın. Bağlamaq çağıranın işidir.
+        """
+        return self._connect()
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+                self._in_use += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+                self.misses += 1
+            else:
+                self.waits += 1
+        if can_open:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+            with self._lock:
+                self._in_use += 1
+            return conn
+
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeoutError(f"{self.timeout:g} saniyə ərzində boş DB bağlantısı tapılmadı (pool size={self.size}).")
+        with self._lock:
+            self.hits += 1
+            self._in_use += 1
+        return conn
+
+    def release(self, conn) -> None:
+        with self._lock:
+            self._in_use -= 1
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Pozulmuş bağlantını hovuza qaytarmırıq
+            with self._lock:
+                self._opened -= 1
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            return
+        self._idle.put(conn)
+
+    def close_all(self) -> None:
+        """Boş dayanan bağlantıları bağlayır (istifadədə olanlar `release`-də hovuza qayıdır)."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._opened -= 1
+            conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "readonly": self.readonly,
+                "size": self.size,
+                "timeout": self.timeout,
+                "opened": self._opened,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+            }
+
+
+_pools = {}  # {"write": ConnectionPool, "read": ConnectionPool}
+_pool_lock = threading.Lock()
+_pool_config = dict(POOL_DEFAULTS)
+_connection_factory = sqlite3.Connection
+
+
+def set_connection_factory(factory) -> None:
+    """
+    Hovuzun yeni bağlantıları üçün `sqlite3.Connection` alt-sinfi (məs. `metrics` — sorğu sayı/vaxtı).
+    Boş dayanan köhnə bağlantılar bağlanır; istifadədə olanlar `release`-dən sonra hovuza qayıdır.
+    """
+    global _connection_factory
+    with _pool_lock:
+        _connection_factory = factory
+        for pool in _pools.values():
+            pool.close_all()
+
+
+def _new_pool(readonly: bool) -> ConnectionPool:
+    return ConnectionPool(
+        DB_PATH,
+        size=_pool_config["DB_READ_POOL_SIZE" if readonly else "DB_POOL_SIZE"],
+        timeout=_pool_config["DB_POOL_TIMEOUT"],
+        readonly=readonly,
+        busy_timeout_ms=_pool_config["DB_BUSY_TIMEOUT_MS"],
+        cache_size_kib=_pool_config["DB_CACHE_SIZE_KIB"],
+        mmap_size=_pool_config["DB_MMAP_SIZE"],
+    )
+
+
+def get_pool(readonly: bool = False) -> ConnectionPool:
+    """Prosesin yazı (və ya `readonly=True` ilə oxuma) hovuzunu qaytarır; fork-dan sonra yenisi yaradılır."""
+    kind = "read" if readonly else "write"
+    pool = _pools.get(kind)
+    if pool is None or pool.pid != os.getpid():
+        with _pool_lock:
+            pool = _pools.get(kind)
+            if pool is None or pool.pid != os.getpid():
+                pool = _pools[kind] = _new_pool(readonly)
+    return pool
+
+
+def pool_stats() -> dict:
+    """Hər iki hovuzun cari vəziyyəti və hit/miss sayğacları (müşahidə üçün)."""
+    return {"write": get_pool().stats(), "read": get_pool(readonly=True).stats()}
+
+
+def get_db(readonly=None):
+    """
+    Flask `g` daxilində hovuzdan götürülmüş SQLite bağlantısı saxlayır və qaytarır.
+
+    - `readonly=None` (default): GET/HEAD sorğularında yalnız-oxuma bağlantısı, qalanlarında yazı bağlantısı.
+    - `readonly=False`: GET daxilində də yazmaq lazımdırsa (məs. sxem yoxlaması) yazı bağlantısını məcbur edir.
+    - `readonly=True`: həmişə yalnız-oxuma bağlantısı.
+    """
+    if readonly is None:
+        readonly = has_request_context() and request.method in READ_METHODS
+    key = "read_db" if readonly else "db"
+    if key not in g:
+        setattr(g, key, get_pool(readonly).acquire())
+    return g.get(key)
+
+
+def close_db(exc=None):
+    """Sorğunun sonunda (teardown) bağlantıları hovuza qaytarır."""
+    for key, readonly in (("db", False), ("read_db", True)):
+        db = g.pop(key, None)
+        if db is not None:
+            get_pool(readonly).release(db)
+
+
+def init_app(app):
+    """
+    Hovuz parametrlərini `app.config`-dən oxuyur, teardown-da bağlantıların qaytarılmasını qeydiyyata alır
+    və `flask db ...` əmrlərini əlavə edir. AUTO_MIGRATE=1 olduqda tətbiq olunmamış miqrasiyaları icra edir
+    (sorğu zamanı heç bir sxem dəyişikliyi edilmir).
+    """
+    for key, value in POOL_DEFAULTS.items():
+        app.config.setdefault(key, value)
+    app.config.setdefault("AUTO_MIGRATE", AUTO_MIGRATE)
+    with _pool_lock:
+        _pool_config.update({key: app.config[key] for key in POOL_DEFAULTS})
+        for pool in _pools.values():
+            pool.close_all()
+        _pools.clear()
+    app.teardown_appcontext(close_db)
+    app.cli.add_command(db_cli)
+
+    if app.config["AUTO_MIGRATE"]:
+        for version, name in migrate():
+            app.logger.info("Migration %03d %s applied", version, name)
+    else:
+        pending = pending_migrations()
+        if pending:
+            app.logger.warning("%d pending DB migration(s) — run `flask db upgrade`", len(pending))
+
+
+db_cli = AppGroup("db", help="Məlumat bazası sxemi (miqrasiyalar).")
+
+
+@db_cli.command("upgrade")
+@click.option("--to", "target", type=int, default=None, help="Bu versiyaya qədər (default: sonuncu)")
+def upgrade_command(target):
+    """Tətbiq olunmamış miqrasiyaları icra edir."""
+    applied = migrate(target)
+    for version, name in applied:
+        click.echo(f"  {version:03d} {name}")
+    click.echo(f"{len(applied)} miqrasiya tətbiq olundu." if applied else "Sxem aktualdır.")
+
+
+@db_cli.command("status")
+def status_command():
+    """Miqrasiyaların siyahısı: tətbiq olunub / gözləyir."""
+    for version, name, applied_at in schema_status():
+        click.echo(f"  {version:03d} {name:<28} {applied_at or 'gözləyir'}")
 
 def dict_from_row(row):
     """sqlite3.Row obyektini adi lüğətə çevirir (şablonlarda rahat istifadə üçün)."""
     return {k: row[k] for k in row.keys()} if row else None
 
-def paginate_query(base_sql: str, page: int, per_page: int):
+def encode_cursor(direction: str, values) -> str:
+    """Keyset kursorunu qeyri-şəffaf (opaque) URL-təhlükəsiz sətirə çevirir."""
+    raw = json.dumps({"d": direction, "k": list(values)}, ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str):
+    """`encode_cursor` nəticəsini (direction, values) cütünə qaytarır; pozulmuş kursor üçün (None, None)."""
+    if not token:
+        return None, None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw.decode("utf-8"))
+        direction, values = data["d"], data["k"]
+    except (ValueError, KeyError, TypeError):
+        return None, None
+    if direction not in ("n", "p") or not isinstance(values, list):
+        return None, None
+    return direction, values
+
+def _keyset_condition(order_by, values, backwards: bool):
     """
-    Səhifələmə üçün LIMIT/OFFSET hesablayır və SQL-i genişləndirir.
+    (a DESC, b DESC) sıralaması üçün "bu açardan sonra gələn sətirlər" şərtini qurur.
+    Bütün istiqamətlər eynidirsə row-value müqayisəsi `(a, b) < (?, ?)` (indeksdən istifadə edir),
+    əks halda `(a < ?) OR (a = ? AND b < ?)` zənciri.
+    """
+    ops = []
+    for _, direction in order_by:
+        descending = direction.upper() == "DESC"
+        ops.append("<" if descending != backwards else ">")
+    cols = [expr for expr, _ in order_by]
+    if len(set(ops)) == 1:
+        placeholders = ", ".join("?" * len(cols))
+        return f"({', '.join(cols)}) {ops[0]} ({placeholders})", list(values)
+    parts, params = [], []
+    for i, (col, op) in enumerate(zip(cols, ops)):
+        eqs = [f"{c} = ?" for c in cols[:i]]
+        parts.append("(" + " AND ".join(eqs + [f"{col} {op} ?"]) + ")")
+        params.extend(values[:i] + [values[i]])
+    return "(" + " OR ".join(parts) + ")", params
+
+def paginate_keyset(db, select_sql: str, conditions: list, params: list, order_by: list, cursor: str = None, per_page: int = 10):
+    """
+    OFFSET əvəzinə keyset (kursor) ilə səhifələmə: dərin səhifələr də ilk səhifə qədər sürətlidir.
 
     Parametrlər:
-      - base_sql: 'SELECT ... FROM ... WHERE ... ORDER BY ...' tipli əsas sorğu
-      - page: 1-dən başlayan səhifə nömrəsi
+      - select_sql: 'SELECT ... FROM ...' (WHERE/ORDER BY/LIMIT olmadan)
+      - conditions, params: WHERE şərtləri siyahısı və onların parametrləri
+      - order_by: sıralama açarı, məs. [("created_at", "DESC"), ("id", "DESC")];
+        son sütun unikal olmalıdır (adətən `id`), sətirdə açar adı sütunun `.`-dan sonrakı hissəsidir
+      - cursor: əvvəlki cavabdan gələn `next`/`prev` kursoru (və ya None — ilk səhifə)
       - per_page: hər səhifədə neçə sətir
 
-    Qayıdır: (sql_with_limit, limit, offset)
+    Qayıdır: (rows, next_cursor, prev_cursor) — kursor yoxdursa None.
     """
-    page = max(1, int(page or 1))
     per_page = max(1, min(100, int(per_page or 10)))
-    offset = (page - 1) * per_page
-    sql = f"{base_sql} LIMIT ? OFFSET ?"
-    return sql, per_page, offset
+    direction, values = decode_cursor(cursor)
+    if values is not None and len(values) != len(order_by):
+        direction, values = None, None
+    backwards = direction == "p"
+
+    conditions = list(conditions)
+    params = list(params)
+    if values is not None:
+        cond, cond_params = _keyset_condition(order_by, values, backwards)
+        conditions.append(cond)
+        params.extend(cond_params)
+
+    def flip(d):
+        return "ASC" if d.upper() == "DESC" else "DESC"
+    order_sql = ", ".join(f"{expr} {flip(d) if backwards else d.upper()}" for expr, d in order_by)
+    where_sql = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    sql = f"{select_sql}{where_sql} ORDER BY {order_sql} LIMIT ?"
+    rows = db.execute(sql, params + [per_page + 1]).fetchall()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    keys = [expr.rsplit(".", 1)[-1] for expr, _ in order_by]
+    def key_of(row):
+        return [row[k] for k in keys]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if backwards:
+            next_cursor = encode_cursor("n", key_of(rows[-1]))
+            prev_cursor = encode_cursor("p", key_of(rows[0])) if has_more else None
+        else:
+            next_cursor = encode_cursor("n", key_of(rows[-1])) if has_more else None
+            prev_cursor = encode_cursor("p", key_of(rows[0])) if values is not None else None
+    return rows, next_cursor, prev_cursor
+
+def run_script(conn, script: str) -> None:
+    """
+    SQL skriptini ifadə-ifadə icra edir. `executescript`-dən fərqli olaraq açıq tranzaksiyanı commit etmir —
+    miqrasiya bütövlükdə ya tətbiq olunur, ya da geri qaytarılır. (Trigger-lərin `BEGIN ... END;` bloku
+    `sqlite3.complete_statement` ilə düzgün bir ifadə kimi toplanır.)
+    """
+    buf = ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            conn.execute(buf)
+            buf = ""
+    if buf.strip() and any(not ln.strip().startswith("--") for ln in buf.splitlines() if ln.strip()):
+        conn.execute(buf)
+
+
+def _columns(conn, table: str) -> list:
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def _table_exists(conn, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+# --- Miqrasiyalar -----------------------------------------------------------------------------------------
+# Sxem dəyişiklikləri sorğu zamanı yox, burada — versiyalı addımlarla edilir. Hər addım bir tranzaksiyada
+# tətbiq olunur və `schema_version`-a yazılır; `flask db upgrade` (və ya AUTO_MIGRATE=1 ilə tətbiq başlayanda)
+# yalnız hələ tətbiq olunmamış addımları icra edir. Yeni dəyişiklik = siyahının sonuna yeni addım
+# (köhnə addımlar dəyişdirilmir). Addımlar idempotentdir: əvvəlki versiyaların sorğu zamanı yaratdığı
+# cədvəl/sütunları olan DB-lərdə də təhlükəsiz işləyir.
+
+MIGRATIONS = []  # [(version, name, fn)]
+
+
+def migration(version: int, name: str):
+    """Miqrasiya addımını qeydiyyata alır: `fn(conn)` açıq tranzaksiya daxilində çağırılır."""
+    def decorator(fn):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+@migration(1, "base_indexes")
+def _m001_base_indexes(conn):
+    run_script(conn, """
+        -- Blog siyahısı: ORDER BY created_at DESC, id DESC (keyset səhifələmə)
+        CREATE INDEX IF NOT EXISTS idx_blog_posts_created_at ON blog_posts(created_at);
+        -- Qalereya: "hələ analiz olunmamış şəkillər" (NOT EXISTS) və şəkil üzrə nəticələr
+        CREATE INDEX IF NOT EXISTS idx_gallery_detections_image ON gallery_detections(image_id);
+        -- Məzmun-ünvanlı fayllar: eyni fayl üçün əvvəlki AI nəticəsini fayl adına görə tapmaq
+        CREATE INDEX IF NOT EXISTS idx_gallery_images_filename ON gallery_images(filename);
+        CREATE INDEX IF NOT EXISTS idx_gallery_faces_image ON gallery_faces(image_id);
+        CREATE INDEX IF NOT EXISTS idx_blog_ocr_results_image ON blog_ocr_results(image_path);
+        CREATE INDEX IF NOT EXISTS idx_event_speech_audio ON event_speech_registrations(audio_filename);
+        CREATE INDEX IF NOT EXISTS idx_poll_speech_votes_audio ON poll_speech_votes(audio_filename);
+    """)
+
+
+@migration(2, "forum_pinned_and_reactions")
+def _m002_forum(conn):
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS forum_topic_reactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic_id INTEGER NOT NULL,
+            emoji TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (topic_id) REFERENCES forum_topics(id) ON DELETE CASCADE
+        );
+    """)
+    # Forum kodu `pinned` sütununu oxuyur, köhnə DB-lər isə `is_pinned` saxlayır; hər ikisi yazılır.
+    cols = _columns(conn, "forum_topics")
+    if "pinned" not in cols:
+        conn.execute("ALTER TABLE forum_topics ADD COLUMN pinned INTEGER NOT NULL DEFAULT 0")
+    if "is_pinned" not in cols:
+        conn.execute("ALTER TABLE forum_topics ADD COLUMN is_pinned INTEGER NOT NULL DEFAULT 0")
+    # Bir dəfəlik backfill. (Əvvəlki `SET pinned = COALESCE(pinned, is_pinned)` heç vaxt köçürmürdü:
+    # `pinned` NOT NULL DEFAULT 0 olduğu üçün COALESCE həmişə 0 qaytarırdı.)
+    conn.execute("UPDATE forum_topics SET pinned = is_pinned WHERE pinned = 0 AND is_pinned != 0")
+    run_script(conn, """
+        CREATE INDEX IF NOT EXISTS idx_forum_topics_pinned_created_at ON forum_topics(pinned, created_at);
+        CREATE INDEX IF NOT EXISTS idx_forum_replies_topic_created_at ON forum_replies(topic_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_forum_reactions_topic_id ON forum_topic_reactions(topic_id, id);
+    """)
+
+
+@migration(3, "forum_search")
+def _m003_forum_search(conn):
+    from search import ensure_forum_search
+    ensure_forum_search(conn)  # FTS5 yoxdursa heç nə etmir (forum LIKE axtarışına qayıdır)
+
+
+@migration(4, "blog_post_tags")
+def _m004_blog_tags(conn):
+    from blog import rebuild_post_tags
+    existed = _table_exists(conn, "blog_post_tags")
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS blog_post_tags (
+            post_id INTEGER NOT NULL,
+            tag TEXT NOT NULL,
+            PRIMARY KEY (post_id, tag),
+            FOREIGN KEY (post_id) REFERENCES blog_posts(id) ON DELETE CASCADE
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_blog_post_tags_tag ON blog_post_tags(tag, post_id);
+    """)
+    if not existed:
+        rebuild_post_tags(conn)
+
+
+@migration(5, "blog_search")
+def _m005_blog_search(conn):
+    from search import ensure_blog_search
+    ensure_blog_search(conn)
+
+
+@migration(6, "poll_tallies")
+def _m006_poll_tallies(conn):
+    from polls import rebuild_tallies
+    existed = _table_exists(conn, "poll_tallies")
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS poll_tallies (
+            poll_id INTEGER NOT NULL,
+            option_index INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (poll_id, option_index),
+            FOREIGN KEY (poll_id) REFERENCES polls(id) ON DELETE CASCADE
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_poll_votes_poll_option ON poll_votes(poll_id, option_index);
+        CREATE INDEX IF NOT EXISTS idx_poll_speech_votes_poll ON poll_speech_votes(poll_id, matched_option_index);
+    """)
+    if not existed:
+        rebuild_tallies(conn)
+
+
+@migration(7, "gallery_image_columns")
+def _m007_gallery_columns(conn):
+    # Parlaqlıq (NULL — hələ hesablanmayıb) və kiçildilmiş versiyalar üçün məzmun heşi + orijinal ölçülər
+    cols = _columns(conn, "gallery_images")
+    for col, typ in (("brightness", "REAL"), ("brightness_label", "TEXT"),
+                     ("content_hash", "TEXT"), ("width", "INTEGER"), ("height", "INTEGER")):
+        if col not in cols:
+            conn.execute(f"ALTER TABLE gallery_images ADD COLUMN {col} {typ}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_gallery_images_content_hash ON gallery_images(content_hash)")
+
+
+@migration(8, "jobs")
+def _m008_jobs(conn):
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload_json TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',   -- queued | running | done | failed
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            run_after REAL NOT NULL,                 -- unix vaxtı: bundan əvvəl götürülmür (retry backoff / lease)
+            result_json TEXT,
+            error TEXT,
+            owner TEXT,                              -- işi yaradan sessiya (session["voter_id"])
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs(status, run_after);
+    """)
+
+
+@migration(9, "media_files")
+def _m009_media_files(conn):
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS media_files (
+            sha256 TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL
+        ) WITHOUT ROWID;
+    """)
+
+
+@migration(10, "ai_cache")
+def _m010_ai_cache(conn):
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS ai_cache (
+            key TEXT PRIMARY KEY,
+            namespace TEXT NOT NULL,
+            model TEXT NOT NULL,
+            value_json TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_ai_cache_last_used ON ai_cache(last_used);
+    """)
+
+
+@migration(11, "foreign_key_and_filter_indexes")
+def _m011_fk_filter_indexes(conn):
+    # Hər xarici açar sütunu indeksli olmalıdır: əks halda valideyn silinəndə ON DELETE CASCADE uşaq cədvəli
+    # tam skan edir. Yoxlama: `flask db audit` (query_audit.py).
+    run_script(conn, """
+        CREATE INDEX IF NOT EXISTS idx_blog_ocr_results_post ON blog_ocr_results(post_id);
+        CREATE INDEX IF NOT EXISTS idx_blog_tts_files_post ON blog_tts_files(post_id);
+        CREATE INDEX IF NOT EXISTS idx_event_speech_event ON event_speech_registrations(event_id);
+        CREATE INDEX IF NOT EXISTS idx_forum_tts_files_topic ON forum_tts_files(topic_id);
+        CREATE INDEX IF NOT EXISTS idx_forum_tts_files_reply ON forum_tts_files(reply_id);
+        -- "Mənim qeydiyyatlarım": WHERE email = ? ORDER BY created_at
+        CREATE INDEX IF NOT EXISTS idx_event_registrations_email ON event_registrations(email, created_at);
+        -- media.release: fayl adına görə istinad
+        CREATE INDEX IF NOT EXISTS idx_media_files_filename ON media_files(filename);
+        -- ai_cache eviction: vaxtı keçmiş nəticələr
+        CREATE INDEX IF NOT EXISTS idx_ai_cache_expires_at ON ai_cache(expires_at);
+    """)
+
+
+@migration(12, "jobs_consumed_at")
+def _m012_jobs_consumed_at(conn):
+    # Status səhifəsi nəticəni (sessiya açarları + flash) bir dəfə tətbiq edir: təkrar baxışda təkrarlanmır
+    if "consumed_at" not in _columns(conn, "jobs"):
+        conn.execute("ALTER TABLE jobs ADD COLUMN consumed_at TEXT")
+
+
+def _migration_conn():
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA busy_timeout = 30000")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TEXT NOT NULL)"
+    )
+    conn.commit()
+    return conn
+
+
+def _applied_versions(conn) -> set:
+    return {r[0] for r in conn.execute("SELECT version FROM schema_version").fetchall()}
+
+
+def schema_status() -> list:
+    """Bütün miqrasiyalar: [(version, name, applied_at və ya None), ...]."""
+    conn = _migration_conn()
+    try:
+        applied = {r["version"]: r["applied_at"] for r in conn.execute("SELECT version, applied_at FROM schema_version")}
+    finally:
+        conn.close()
+    return [(version, name, applied.get(version)) for version, name, _ in MIGRATIONS]
+
+
+def pending_migrations() -> list:
+    """Hələ tətbiq olunmamış miqrasiyalar: [(version, name), ...]."""
+    return [(version, name) for version, name, applied_at in schema_status() if applied_at is None]
+
+
+def migrate(target: int = None) -> list:
+    """
+    Tətbiq olunmamış miqrasiyaları sıra ilə icra edir (`target` versiyasına qədər) və
+    tətbiq olunanları [(version, name), ...] qaytarır. Hər addım `BEGIN IMMEDIATE` tranzaksiyasındadır:
+    eyni anda başlayan bir neçə proses eyni addımı iki dəfə icra etmir.
+    """
+    done = []
+    conn = _migration_conn()
+    try:
+        for version, name, fn in MIGRATIONS:
+            if target is not None and version > target:
+                break
+            if version in _applied_versions(conn):
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if version in _applied_versions(conn):  # başqa proses bizdən əvvəl tətbiq etdi
+                    conn.rollback()
+                    continue
+                fn(conn)
+                conn.execute(
+                    "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                    (version, name, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            done.append((version, name))
+    finally:
+        conn.close()
+    return done
+
 
 def init_db(force: bool = False):
     """
     DB faylını yaradır və cədvəlləri qurur. Əgər `force=True` olarsa, DB silinib sıfırdan qurulur.
-    İlk işə salınmada demo məlumatlar daxil edilir.
+    İlk işə salınmada demo məlumatlar daxil edilir. Sonrakı sxem dəyişiklikləri miqrasiyalardadır (`migrate`).
     """
     if os.path.exists(DB_PATH) and not force:
         return
@@ -45,6 +692,7 @@ def init_db(force: bool = False):
         os.remove(DB_PATH)
 
     conn = sqlite3.connect(DB_PATH)
+    conn.execute("PRAGMA journal_mode = WAL")
     c = conn.cursor()
 
     c.executescript(
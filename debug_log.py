@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+debug_log.py — asinxron, toplu (batch) yazılan strukturlaşdırılmış debug loqu
+
+`debug_log.event("login_post_received", login_type="user")` sorğunun içində fayl açmır: qeyd (LogRecord)
+yaddaşdakı məhdud növbəyə qoyulur və fon thread-i qeydləri `DEBUG_LOG_FLUSH_MS` pəncərəsində yığıb
+bir `write` + bir `flush` ilə JSON sətirləri kimi fayla yazır (RotatingFileHandler — ölçü limiti ilə fırlanır).
+
+Parametrlər (env və ya `app.config`):
+- DEBUG_LOG_LEVEL — DEBUG / INFO / WARNING ... (default INFO: `event()` qeydləri DEBUG səviyyəsindədir,
+  yəni söndürülüb və çağırış sadəcə bir səviyyə yoxlamasıdır)
+- DEBUG_LOG_SAMPLE — 0..1, DEBUG/INFO qeydlərinin neçə faizi saxlanılsın (WARNING+ həmişə yazılır)
+- DEBUG_LOG_PATH — fayl (default: <app>/logs/debug.log); DEBUG_LOG_MAX_BYTES / DEBUG_LOG_BACKUPS — fırlanma
+- DEBUG_LOG_QUEUE_MAX — növbə dolu olduqda yeni qeydlər atılır (sorğu heç vaxt gözləmir), `stats()["dropped"]`
+
+Stdlib `logging` üzərindədir: `debug_log.logger`-ə adi `logger.warning(...)` da yazmaq olar.
+"""
+
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+
+DEBUG_LOG_DEFAULTS = {
+    "DEBUG_LOG_LEVEL": os.getenv("DEBUG_LOG_LEVEL", "INFO").upper(),
+    "DEBUG_LOG_SAMPLE": float(os.getenv("DEBUG_LOG_SAMPLE", "1.0")),
+    "DEBUG_LOG_PATH": os.getenv("DEBUG_LOG_PATH", ""),                 # boşdursa <app>/logs/debug.log
+    "DEBUG_LOG_MAX_BYTES": int(os.getenv("DEBUG_LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+    "DEBUG_LOG_BACKUPS": int(os.getenv("DEBUG_LOG_BACKUPS", "5")),
+    "DEBUG_LOG_QUEUE_MAX": int(os.getenv("DEBUG_LOG_QUEUE_MAX", "10000")),
+    "DEBUG_LOG_BATCH_SIZE": int(os.getenv("DEBUG_LOG_BATCH_SIZE", "500")),
+    "DEBUG_LOG_FLUSH_MS": int(os.getenv("DEBUG_LOG_FLUSH_MS", "200")),
+}
+
+logger = logging.getLogger("campuslink.debug")
+logger.propagate = False
+logger.setLevel(DEBUG_LOG_DEFAULTS["DEBUG_LOG_LEVEL"])
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Bir qeyd = bir JSON sətri: ts, level, event, location və `extra` ilə verilən sahələr."""
+
+    def format(self, record) -> str:
+        payload = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "event": record.getMessage(),
+            "location": f"{record.module}:{record.funcName}",
+        }
+        payload.update({k: v for k, v in vars(record).items() if k not in _STANDARD_ATTRS})
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """`rate` payında DEBUG/INFO qeydlərini buraxır; WARNING və yuxarı həmişə keçir."""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+        self.sampled_out = 0
+
+    def filter(self, record) -> bool:
+        if record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class BatchFileWriter:
+    """
+    Növbədən qeydləri toplu götürüb fayla yazan fon thread-i (`vote_buffer.VoteBuffer` ilə eyni quruluş).
+    Fayl və fırlanma məntiqi `RotatingFileHandler`-dəndir, amma batch bir yazılış + bir flush ilə gedir.
+    """
+
+    def __init__(self, path: str, max_bytes: int, backups: int, batch_size: int = 500, flush_ms: int = 200,
+                 max_queue: int = 10000):
+        self.path = path
+        self.batch_size = max(1, int(batch_size))
+        self.flush_ms = max(1, int(flush_ms))
+        self.queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._file = None
+        self._file_args = (max_bytes, backups)
+        self._formatter = JsonFormatter()
+        self._lock = threading.Lock()         # fon thread-i və `flush()` eyni anda yazmasın
+        self._stats_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.pid = None
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failures = 0
+        atexit.register(self.stop)
+
+    def ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive() and self.pid == os.getpid():
+            return
+        with self._stats_lock:
+            if self._thread is not None and self._thread.is_alive() and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="debug-log-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self.queue.get(timeout=self.flush_ms / 1000)
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_ms / 1000
+            batch = [first]
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _drain(self) -> list:
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _handler(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            max_bytes, backups = self._file_args
+            self._file = logging.handlers.RotatingFileHandler(
+                self.path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+            )
+        return self._file
+
+    def _write(self, batch: list) -> None:
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self._formatter.format(record))
+            except Exception:
+                with self._stats_lock:
+                    self.failures += 1
+        try:
+            if lines:
+                text = "\n".join(lines) + "\n"
+                with self._lock:
+                    handler = self._handler()
+                    pos = handler.stream.tell()
+                    if handler.maxBytes and pos and pos + len(text) >= handler.maxBytes:
+                        handler.doRollover()
+                    handler.stream.write(text)
+                    handler.stream.flush()
+                with self._stats_lock:
+                    self.written += len(lines)
+                    self.batches += 1
+        except OSError:
+            with self._stats_lock:
+                self.failures += len(lines)
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+
+    def flush(self) -> None:
+        """Növbədə qalanları dərhal yazır və fon thread-inin əlindəki batch-i gözləyir."""
+        while True:
+            batch = self._drain()
+            if not batch:
+                break
+            self._write(batch)
+        if self._thread is not None and self._thread.is_alive() and self.pid == os.getpid():
+            self.queue.join()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive() and self.pid == os.getpid():
+            self._thread.join(timeout=max(1.0, self.flush_ms / 1000 * 2))
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Qeydi növbəyə qoyur; növbə doludursa gözləmir — qeyd atılır və sayılır."""
+
+    def __init__(self, writer: BatchFileWriter):
+        super().__init__(writer.queue)
+        self.writer = writer
+
+    def prepare(self, record):
+        # Formatlama fon thread-indədir; burada yalnız mesajı sabitləyirik (args sonradan dəyişə bilər)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record) -> None:
+        self.writer.ensure_thread()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.writer._stats_lock:
+                self.writer.dropped += 1
+
+
+_handler = None
+_sampler = SampleFilter()
+
+
+def configure(path: str, level: str = "INFO", sample: float = 1.0, max_bytes: int = 10 * 1024 * 1024,
+              backups: int = 5, queue_max: int = 10000, batch_size: int = 500, flush_ms: int = 200) -> None:
+    """Loqu (yenidən) qurur: köhnə writer-in növbəsi yazılıb bağlanır."""
+    global _handler
+    if _handler is not None:
+        logger.removeHandler(_handler)
+        _handler.writer.stop()
+    writer = BatchFileWriter(path, max_bytes, backups, batch_size, flush_ms, queue_max)
+    _handler = NonBlockingQueueHandler(writer)
+    _sampler.rate = sample
+    _handler.addFilter(_sampler)
+    logger.addHandler(_handler)
+    logger.setLevel(level)
+
+
+def init_app(app):
+    """Parametrləri `app.config`-dən oxuyur və fayl loqunu qurur."""
+    for key, value in DEBUG_LOG_DEFAULTS.items():
+        app.config.setdefault(key, value)
+    cfg = app.config
+    configure(
+        cfg["DEBUG_LOG_PATH"] or os.path.join(app.root_path, "logs", "debug.log"),
+        level=cfg["DEBUG_LOG_LEVEL"],
+        sample=cfg["DEBUG_LOG_SAMPLE"],
+        max_bytes=cfg["DEBUG_LOG_MAX_BYTES"],
+        backups=cfg["DEBUG_LOG_BACKUPS"],
+        queue_max=cfg["DEBUG_LOG_QUEUE_MAX"],
+        batch_size=cfg["DEBUG_LOG_BATCH_SIZE"],
+        flush_ms=cfg["DEBUG_LOG_FLUSH_MS"],
+    )
+
+
+def event(name: str, level: int = logging.DEBUG, **data) -> None:
+    """Strukturlaşdırılmış qeyd: `event("like_denied_guest", topic_id=5)`. Səviyyə söndürülübsə heç nə etmir."""
+    if logger.isEnabledFor(level):
+        logger.log(level, name, extra=data, stacklevel=2)
+
+
+def flush() -> None:
+    if _handler is not None:
+        _handler.writer.flush()
+
+
+def stats() -> dict:
+    writer = _handler.writer if _handler is not None else None
+    return {
+        "level": logging.getLevelName(logger.level),
+        "sample": _sampler.rate,
+        "path": writer.path if writer else None,
+        "queued": writer.queue.qsize() if writer else 0,
+        "written": writer.written if writer else 0,
+        "batches": writer.batches if writer else 0,
+        "dropped": writer.dropped if writer else 0,
+        "failures": writer.failures if writer else 0,
+        "sampled_out": _sampler.sampled_out,
+    }
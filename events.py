@@ -11,15 +11,15 @@ ADMIN_PASS = "admin123"
 @bp.route("/")
 def list_events():
     db = get_db()
-    cur = db.execute("SELECT * FROM events ORDER BY date ASC")
-    rows = cur.fetchall()
-    events = []
-    for row in rows:
-        e = dict_from_row(row)
-        cur2 = db.execute("SELECT COUNT(*) AS c FROM event_registrations WHERE event_id = ?", (e["id"],))
-        reg_count = cur2.fetchone()[0]
-        e["remaining"] = max(0, e["capacity"] - reg_count)
-        events.append(e)
+    # One query for the whole page: the per-event COUNT is answered from the
+    # UNIQUE(event_id, email) index (covering), not one extra query per event.
+    cur = db.execute(
+        "SELECT e.*, MAX(0, e.capacity - ("
+        "  SELECT COUNT(*) FROM event_registrations r WHERE r.event_id = e.id"
+        ")) AS remaining "
+        "FROM events e ORDER BY e.date ASC"
+    )
+    events = [dict_from_row(row) for row in cur.fetchall()]
     return render_template("events/list.html", events=events)
 
 @bp.route("/create", methods=["GET","POST"])
@@ -48,6 +48,36 @@ def create_event():
     db.commit()
     return redirect(url_for("events.list_events"))
 
+def register_attendee(db, event_id: int, name: str, email: str) -> str:
+    """
+    Kapasiteni aşmadan qeydiyyat: yoxlama və INSERT eyni tranzaksiyada, bir SQL əmri ilə.
+
+    BEGIN IMMEDIATE yazı kilidini əvvəlcədən götürür, şərtli INSERT ... SELECT yalnız
+    qeydiyyat sayı `capacity`-dən azdırsa sətir əlavə edir. Paralel sorğular növbə ilə
+    (busy_timeout) keçir, ona görə tədbirə heç vaxt `capacity`-dən çox adam yazılmır.
+
+    Qayıdır: "ok" | "full" | "duplicate"
+    """
+    created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+    if db.in_transaction:
+        db.commit()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        cur = db.execute(
+            "INSERT INTO event_registrations (event_id, name, email, created_at) "
+            "SELECT e.id, ?, ?, ? FROM events e "
+            "WHERE e.id = ? AND (SELECT COUNT(*) FROM event_registrations r WHERE r.event_id = e.id) < e.capacity",
+            (name, email, created_at, event_id),
+        )
+        db.commit()
+    except sqlite3.IntegrityError:
+        db.rollback()
+        return "duplicate"
+    except Exception:
+        db.rollback()
+        raise
+    return "ok" if cur.rowcount == 1 else "full"
+
 @bp.route("/<int:event_id>", methods=["GET", "POST"])
 def detail(event_id: int):
     db = get_db()
@@ -56,30 +86,23 @@ def detail(event_id: int):
     if not row:
         return render_template("404.html"), 404
     event = dict_from_row(row)
-    cur = db.execute("SELECT COUNT(*) FROM event_registrations WHERE event_id = ?", (event_id,))
-    reg_count = cur.fetchone()[0]
-    remaining = max(0, event["capacity"] - reg_count)
     if request.method == "POST":
         name = (request.form.get("name") or "").strip()
         email = (request.form.get("email") or "").strip()
         if not name or not email:
             flash("Ad və e-poçt mütləqdir.")
             return redirect(url_for("events.detail", event_id=event_id))
-        if remaining <= 0:
+        status = register_attendee(db, event_id, name, email)
+        if status == "full":
             flash("Kapasite dolub.")
-            return redirect(url_for("events.detail", event_id=event_id))
-        created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-        try:
-            db.execute(
-                "INSERT INTO event_registrations (event_id, name, email, created_at) VALUES (?, ?, ?, ?)",
-                (event_id, name, email, created_at),
-            )
-            db.commit()
-        except sqlite3.IntegrityError:
+        elif status == "duplicate":
             flash("Bu e-poçt ilə artıq qeydiyyatdan keçmisiniz.")
-            return redirect(url_for("events.detail", event_id=event_id))
-        flash("Qeydiyyat uğurla tamamlandı.")
+        else:
+            flash("Qeydiyyat uğurla tamamlandı.")
         return redirect(url_for("events.detail", event_id=event_id))
+    cur = db.execute("SELECT COUNT(*) FROM event_registrations WHERE event_id = ?", (event_id,))
+    reg_count = cur.fetchone()[0]
+    remaining = max(0, event["capacity"] - reg_count)
     cur = db.execute(
         "SELECT * FROM event_registrations WHERE event_id = ? ORDER BY id DESC",
         (event_id,),
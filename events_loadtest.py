@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+events_loadtest.py — tədbir qeydiyyatı üçün yük testi (overbooking yoxlaması)
+
+Minlərlə paralel qeydiyyat göndərir və tədbirə `capacity`-dən çox adam yazılmadığını yoxlayır.
+
+    python events_loadtest.py                                # DB-nin müvəqqəti surəti üzərində, proses daxilində
+    python events_loadtest.py --url http://127.0.0.1:5000    # işləyən serverə HTTP ilə
+"""
+
+import argparse
+import os
+import re
+import secrets
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ADMIN_PASS = "admin123"
+
+
+class HttpClient:
+    """İşləyən serverə minimal HTTP klient (yönləndirmələri izləmir)."""
+
+    class _NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.opener = urllib.request.build_opener(self._NoRedirect)
+
+    def get(self, path: str) -> str:
+        with self.opener.open(self.base_url + path) as resp:
+            return resp.read().decode("utf-8")
+
+    def post(self, path: str, data: dict) -> int:
+        body = urllib.parse.urlencode(data).encode("utf-8")
+        try:
+            with self.opener.open(self.base_url + path, data=body) as resp:
+                return resp.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+class AppClient:
+    """Flask test client üzərində eyni interfeys; hər thread öz klientini alır."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, "client"):
+            self._local.client = self.app.test_client()
+        return self._local.client
+
+    def get(self, path: str) -> str:
+        return self._client().get(path).get_data(as_text=True)
+
+    def post(self, path: str, data: dict) -> int:
+        return self._client().post(path, data=data).status_code
+
+
+def make_local_client() -> AppClient:
+    """Əsas DB-yə toxunmamaq üçün onun müvəqqəti surəti ilə tətbiq yaradır."""
+    import database
+
+    tmp_db = os.path.join(tempfile.mkdtemp(prefix="campuslink-loadtest-"), "campusconnect.db")
+    if os.path.exists(database.DB_PATH):
+        shutil.copy(database.DB_PATH, tmp_db)
+    database.DB_PATH = tmp_db
+
+    from app import create_app
+
+    return AppClient(create_app())
+
+
+def create_event(client, capacity: int) -> int:
+    title = f"Loadtest {secrets.token_hex(4)}"
+    client.post(
+        "/events/create",
+        {
+            "title": title,
+            "date": "2099-01-01 10:00",
+            "location": "Loadtest",
+            "description": "events_loadtest.py",
+            "capacity": str(capacity),
+            "password": ADMIN_PASS,
+        },
+    )
+    html = client.get("/events/")
+    m = re.search(r'href="/events/(\d+)">\s*<div[^>]*>\s*<h5[^>]*>' + re.escape(title), html)
+    if not m:
+        raise SystemExit("Test tədbiri yaradıla bilmədi.")
+    return int(m.group(1))
+
+
+def count_registrations(client, event_id: int) -> int:
+    csv_text = client.get(f"/events/{event_id}/export.csv?password={ADMIN_PASS}")
+    return max(0, len(csv_text.strip().splitlines()) - 1)
+
+
+def run(client, capacity: int, requests: int, workers: int) -> bool:
+    event_id = create_event(client, capacity)
+    print(f"Tədbir #{event_id}: capacity={capacity}, {requests} qeydiyyat, {workers} paralel işçi")
+
+    def register(i: int) -> int:
+        return client.post(f"/events/{event_id}", {"name": f"User {i}", "email": f"user{i}@loadtest.local"})
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        statuses = list(pool.map(register, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    errors = sum(1 for s in statuses if s >= 500)
+    registered = count_registrations(client, event_id)
+    print(f"{elapsed:.2f} s, {requests / elapsed:.0f} sorğu/s, server xətası: {errors}")
+    print(f"Qeydiyyat sayı: {registered} / {capacity}")
+
+    ok = registered == min(capacity, requests) and errors == 0
+    print("✅ Overbooking yoxdur." if ok else "❌ Uyğunsuzluq!")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tədbir qeydiyyatı üçün paralel yük testi")
+    parser.add_argument("--url", help="İşləyən serverin ünvanı (verilməsə proses daxilində test edilir)")
+    parser.add_argument("--capacity", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=64)
+    args = parser.parse_args()
+
+    client = HttpClient(args.url) if args.url else make_local_client()
+    sys.exit(0 if run(client, args.capacity, args.requests, args.workers) else 1)
+
+
+if __name__ == "__main__":
+    main()
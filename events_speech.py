@@ -8,25 +8,16 @@ sonra GPT Chat API ilə transkripti strukturlaşdırır (ad, email, mesaj).
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from database import get_db
+import ai_cache
+import jobs
+import openai_client
+import media
 import os
 import datetime
-import secrets
 import json
-from dotenv import load_dotenv
-
-load_dotenv()
 
 bp = Blueprint("events_speech", __name__, url_prefix="/events")
 
-def get_gpt_api_key():
-    """
-    Environment variable-dan GPT API açarını alır.
-    """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY tapılmadı! .env faylına əlavə edin.")
-    return api_key
-
 def transcribe_audio_with_whisper(audio_path: str) -> str:
     """
     OpenAI Whisper API ilə audio faylından mətn çıxarır.
@@ -38,9 +29,7 @@ def transcribe_audio_with_whisper(audio_path: str) -> str:
     4. Transkript mətni qaytar
     
     Nümunə:
-    from openai import OpenAI
-    
-    client = OpenAI(api_key=get_gpt_api_key())
+    client = openai_client.get_client()
     with open(audio_path, "rb") as audio_file:
         transcript = client.audio.transcriptions.create(
             model="whisper-1",
@@ -52,6 +41,7 @@ def transcribe_audio_with_whisper(audio_path: str) -> str:
     # TODO: Tələbə burada kod yazmalıdır
     return "TODO: Whisper API çağırışı implement edilməlidir"
 
+@ai_cache.cached("events_speech.parse", model="gpt-3.5-turbo")
 def parse_speech_with_gpt(transcribed_text: str) -> dict:
     """
     GPT Chat API istifadə edərək səs transkriptini strukturlaşdırır.
@@ -66,11 +56,9 @@ def parse_speech_with_gpt(transcribed_text: str) -> dict:
     Nümunə prompt:
     "Bu mətndən ad, email və mesajı çıxar. Yalnız JSON formatında qaytar:\n{{\"name\": \"...\", \"email\": \"...\", \"message\": \"...\"}}\n\nMətn: {transcribed_text}"
     """
-    api_key = get_gpt_api_key()
+    client = openai_client.get_client()
     
     # TODO: Tələbə burada kod yazmalıdır
-    # from openai import OpenAI
-    # client = OpenAI(api_key=api_key)
     # prompt = f"Bu mətndən ad, email və mesajı çıxar. Yalnız JSON formatında qaytar, başqa mətn yazma.\n\nFormat:\n{{\"name\": \"ad\", \"email\": \"email@example.com\", \"message\": \"mesaj mətni\"}}\n\nMətn:\n{transcribed_text}"
     # response = client.chat.completions.create(
     #     model="gpt-3.5-turbo",
@@ -91,13 +79,50 @@ def parse_speech_with_gpt(transcribed_text: str) -> dict:
     
     return {"name": "TODO", "email": "TODO", "message": "TODO"}
 
+@jobs.handler("events_speech")
+def run_speech_register_job(payload: dict) -> dict:
+    """Fon işi: Whisper ilə transkript edir, GPT ilə formatlaşdırır və DB-yə yazır."""
+    event_id = payload["event_id"]
+    audio_path = os.path.join(current_app.config["UPLOAD_FOLDER"], payload["filename"])
+    db = get_db()
+
+    # Eyni audio (fayl adı = məzmun heşi) artıq emal olunubsa, nəticəni təkrar istifadə et
+    previous = None
+    if media.content_hash(payload["filename"]) is not None:   # köhnə (təsadüfi/seed) adlar başqa məzmun ola bilər
+        previous = db.execute(
+            "SELECT transcribed_text, parsed_data_json FROM event_speech_registrations WHERE audio_filename = ? "
+            "ORDER BY id DESC LIMIT 1",
+            (payload["filename"],)
+        ).fetchone()
+    if previous is not None:
+        transcribed_text, parsed_data = previous["transcribed_text"], json.loads(previous["parsed_data_json"] or "{}")
+    else:
+        # Whisper ilə transkript et
+        transcribed_text = transcribe_audio_with_whisper(audio_path)
+
+        # GPT ilə formatlaşdır
+        parsed_data = parse_speech_with_gpt(transcribed_text)
+
+    # DB-yə yaz
+    created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+    cursor = db.execute(
+        "INSERT INTO event_speech_registrations (event_id, audio_filename, transcribed_text, parsed_data_json, created_at) VALUES (?, ?, ?, ?, ?)",
+        (event_id, payload["filename"], transcribed_text, json.dumps(parsed_data), created_at)
+    )
+    db.commit()
+    return {
+        "endpoint": "events_speech.speech_result",
+        "values": {"event_id": event_id, "reg_id": cursor.lastrowid},
+        "message": "Qeydiyyat uğurla tamamlandı!",
+    }
+
 @bp.route("/<int:event_id>/speech-register", methods=["GET", "POST"])
 def speech_register(event_id: int):
     """
     Səs ilə tədbirə qeydiyyat.
     
     GET: Audio yükləmə formu göstərir
-    POST: Audio yükləyir, Whisper ilə transkript edir, GPT ilə formatlaşdırır və DB-yə yazır
+    POST: Audio yükləyir və qeydiyyat işini növbəyə qoyur (Whisper + GPT fon worker-ində işləyir)
     """
     db = get_db()
     
@@ -117,31 +142,16 @@ def speech_register(event_id: int):
             flash("Audio faylı seçilməyib.", "error")
             return redirect(url_for("events_speech.speech_register", event_id=event_id))
         
-        # Audio faylını yüklə
-        ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else 'mp3'
-        filename = f"{secrets.token_hex(8)}.{ext}"
-        audio_path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
-        
         try:
-            file.save(audio_path)
-            
-            # Whisper ilə transkript et
-            transcribed_text = transcribe_audio_with_whisper(audio_path)
+            # Audio faylını yüklə (məzmun-ünvanlı: eyni fayl yenidən yazılmır)
+            filename = media.save_upload(db, file, default_ext="mp3")
             
-            # GPT ilə formatlaşdır
-            parsed_data = parse_speech_with_gpt(transcribed_text)
-            
-            # DB-yə yaz
-            created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-            cursor = db.execute(
-                "INSERT INTO event_speech_registrations (event_id, audio_filename, transcribed_text, parsed_data_json, created_at) VALUES (?, ?, ?, ?, ?)",
-                (event_id, filename, transcribed_text, json.dumps(parsed_data), created_at)
+            # Transkripsiya işini növbəyə qoy
+            job_id = jobs.enqueue(
+                "events_speech", {"event_id": event_id, "filename": filename},
+                back_endpoint="events_speech.speech_register", back_values={"event_id": event_id},
             )
-            db.commit()
-            
-            reg_id = cursor.lastrowid
-            flash("Qeydiyyat uğurla tamamlandı!", "success")
-            return redirect(url_for("events_speech.speech_result", event_id=event_id, reg_id=reg_id))
+            return redirect(url_for("jobs.status", job_id=job_id))
             
         except ValueError as e:
             flash(f"Xəta: {str(e)}", "error")
@@ -13,11 +13,12 @@ lazım olduğu göstərilib.
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, Response, flash
-from database import get_db
+from database import get_db, paginate_keyset
 import datetime, csv, io
 
 bp = Blueprint("feedback", __name__)
 ADMIN_PASS = "admin123"  # demo parol (yalnız dərs məqsədi üçün)
+PER_PAGE = 20
 
 
 @bp.route("/contact", methods=["GET", "POST"])
@@ -81,12 +82,14 @@ def admin_feedback():
            ```
          - SQL:
            `SELECT * FROM feedback WHERE ... ORDER BY id DESC`
+         - Səhifələmə: `paginate_keyset(..., [("id", "DESC")], cursor, PER_PAGE)` (OFFSET yox, kursor)
 
       3) Şablon render:
          - `feedback/admin_list.html`-ə:
            - `items`: nəticələr
            - `error`: varsa xəta mətni (yoxdursa `None`)
            - `q`, `status`, `category` dəyərləri (formda geri göstərmək üçün)
+           - `next_cursor`, `prev_cursor`: səhifələmə düymələri üçün
 
       4) UX ipucları:
          - Üst hissədə filtr formu (q, status, category).
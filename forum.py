@@ -3,21 +3,26 @@
 from __future__ import annotations
 
 import datetime
-import json
 import os
-import time
 from typing import Optional
 
+import click
 from flask import Blueprint, abort, flash, render_template, request, redirect, session, url_for
 
-from database import get_db
+import debug_log
+from database import decode_cursor, encode_cursor, get_db, paginate_keyset
+from search import ensure_forum_search, fts_table_exists, make_snippet, query_terms, rebuild_forum_search, search_forum
 
 bp = Blueprint("forum", __name__, url_prefix="/forum")
 
 ADMIN_CODE = os.getenv("ADMIN_CODE", "1234")  # override via env
 ALLOWED_EMOJIS = ["🔥", "✅", "⚠️", "📌", "💡", "🚀", "❗"]
-DEBUG_LOG_PATH = "/Users/ilkinmammadov/PycharmProjects/PythonProject/CampusLink-2025C/.cursor/debug.log"
-_schema_ready: bool = False
+TOPICS_PER_PAGE = 20
+# Keep `IN (?, ?, ...)` lists well below SQLite's host-parameter limit.
+SQL_IN_CHUNK = 500
+# Only the columns forum_list.html renders; `content` is trimmed in SQL to the preview length + 1.
+TOPIC_LIST_COLUMNS = "id, title, author, created_at, likes, pinned, substr(content, 1, 161) AS content"
+_fts_ready: bool = False
 
 
 def _now_str() -> str:
@@ -58,29 +63,10 @@ def _safe_next(next_url: Optional[str]) -> Optional[str]:
     return None
 
 
-def _dlog(hypothesisId: str, location: str, message: str, data: dict, runId: str = "pre") -> None:
-    payload = {
-        "sessionId": "debug-session",
-        "runId": runId,
-        "hypothesisId": hypothesisId,
-        "location": location,
-        "message": message,
-        "data": data,
-        "timestamp": int(time.time() * 1000),
-    }
-    try:
-        with open(DEBUG_LOG_PATH, "a", encoding="utf-8") as f:
-            f.write(json.dumps(payload, ensure_ascii=False) + "\n")
-    except Exception:
-        pass
-
-
 def _redirect_login(message: str, next_url: Optional[str]):
     flash(message)
     nxt = _safe_next(next_url) or url_for("forum.list_topics")
-    # region agent log
-    _dlog("B", "forum.py:_redirect_login", "redirect_to_login", {"role": session.get("role") or "guest", "next": nxt})
-    # endregion
+    debug_log.event("redirect_to_login", role=session.get("role") or "guest", next=nxt)
     return redirect(url_for("forum.login", next=nxt))
 
 
@@ -89,96 +75,23 @@ def _inject_forum_auth():
     return {"forum_role": session.get("role") or "guest", "forum_name": _current_user_display()}
 
 
-def ensure_forum_schema() -> None:
-    """
-    Ensure the forum schema meets the assignment requirements without touching other files.
+def _search_ready(db) -> bool:
+    """Whether the FTS5 index exists (created by the forum_search migration; memoized per process)."""
+    global _fts_ready
+    if not _fts_ready:
+        _fts_ready = fts_table_exists(db, "forum_search")
+    return _fts_ready
 
-    The repo already creates `forum_topics` with `is_pinned`; the assignment expects `pinned`.
-    We add `pinned` if missing, backfill it from `is_pinned`, and create required indexes.
-    """
-    global _schema_ready
-    if _schema_ready:
-        return
 
+@bp.cli.command("reindex")
+def reindex_command():
+    """Rebuild the forum full-text search index from forum_topics / forum_replies."""
     db = get_db()
-    db.execute("PRAGMA foreign_keys = ON;")
-
-    # Ensure tables exist in case DB was created elsewhere.
-    db.executescript(
-        """
-        CREATE TABLE IF NOT EXISTS forum_topics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            content TEXT NOT NULL,
-            author TEXT NOT NULL,
-            likes INTEGER NOT NULL DEFAULT 0,
-            pinned INTEGER NOT NULL DEFAULT 0,
-            created_at TEXT NOT NULL
-        );
-
-        CREATE TABLE IF NOT EXISTS forum_replies (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            topic_id INTEGER NOT NULL,
-            content TEXT NOT NULL,
-            author TEXT NOT NULL,
-            created_at TEXT NOT NULL,
-            FOREIGN KEY (topic_id) REFERENCES forum_topics(id) ON DELETE CASCADE
-        );
-
-        CREATE TABLE IF NOT EXISTS forum_topic_reactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            topic_id INTEGER NOT NULL,
-            emoji TEXT NOT NULL,
-            created_at TEXT NOT NULL,
-            FOREIGN KEY (topic_id) REFERENCES forum_topics(id) ON DELETE CASCADE
-        );
-        """
-    )
-
-    # Add `pinned` column if missing (existing DB uses `is_pinned`).
-    cols = [r["name"] for r in db.execute("PRAGMA table_info(forum_topics)").fetchall()]
-    if "pinned" not in cols:
-        db.execute("ALTER TABLE forum_topics ADD COLUMN pinned INTEGER NOT NULL DEFAULT 0;")
-        cols.append("pinned")
-
-    # Keep legacy column too (some code/DBs rely on it).
-    if "is_pinned" not in cols:
-        db.execute("ALTER TABLE forum_topics ADD COLUMN is_pinned INTEGER NOT NULL DEFAULT 0;")
-        cols.append("is_pinned")
-
-    if "is_pinned" in cols:
-        # Backfill pinned from is_pinned (one-way safe backfill).
-        db.execute("UPDATE forum_topics SET pinned = COALESCE(pinned, is_pinned) WHERE pinned IS NULL OR pinned = 0;")
-
-    # Indexes (recommended/required by assignment).
-    db.execute(
-        "CREATE INDEX IF NOT EXISTS idx_forum_topics_pinned_created_at ON forum_topics(pinned, created_at);"
-    )
-    db.execute(
-        "CREATE INDEX IF NOT EXISTS idx_forum_replies_topic_created_at ON forum_replies(topic_id, created_at);"
-    )
-    db.execute(
-        "CREATE INDEX IF NOT EXISTS idx_forum_reactions_topic_id ON forum_topic_reactions(topic_id, id);"
-    )
-
+    if not ensure_forum_search(db):
+        raise click.ClickException("This SQLite build has no FTS5 support.")
+    count = rebuild_forum_search(db)
     db.commit()
-    _schema_ready = True
-    # region agent log
-    _dlog(
-        "D",
-        "forum.py:ensure_forum_schema",
-        "schema_ready",
-        {"has_pinned": "pinned" in cols, "has_is_pinned": "is_pinned" in cols},
-    )
-    # endregion
-
-
-@bp.before_app_request
-def _forum_schema_bootstrap():
-    # Ensure FK enforcement per request/connection, then ensure schema once per process.
-    db = get_db()
-    db.execute("PRAGMA foreign_keys = ON;")
-    ensure_forum_schema()
+    click.echo(f"Indexed {count} forum documents.")
 
 
 @bp.route("/login", methods=["GET", "POST"])
@@ -189,14 +102,10 @@ def login():
         return render_template("forum/login.html", error=None, next_url=next_url, admin_code_hint=bool(ADMIN_CODE))
 
     login_type = (request.form.get("login_type") or "user").strip()
-    # region agent log
-    _dlog(
-        "A",
-        "forum.py:login",
+    debug_log.event(
         "login_post_received",
-        {"login_type": login_type, "role_before": session.get("role") or "guest", "has_next": bool(next_url)},
+        login_type=login_type, role_before=session.get("role") or "guest", has_next=bool(next_url),
     )
-    # endregion
 
     if login_type == "admin":
         admin_code = (request.form.get("admin_code") or "").strip()
@@ -211,9 +120,7 @@ def login():
         else:
             session["admin_name"] = session.get("admin_name") or session.get("user_name") or "Admin"
 
-        # region agent log
-        _dlog("A", "forum.py:login", "admin_login_success", {"role_after": session.get("role"), "name_len": len(session.get("admin_name") or "")})
-        # endregion
+        debug_log.event("admin_login_success", role_after=session.get("role"), name_len=len(session.get("admin_name") or ""))
         flash("Logged in as admin.")
         return redirect(next_url)
 
@@ -224,9 +131,7 @@ def login():
     session["user_name"] = user_name
     session["role"] = "user"
     session.pop("admin_name", None)
-    # region agent log
-    _dlog("A", "forum.py:login", "user_login_success", {"role_after": session.get("role"), "name_len": len(user_name)})
-    # endregion
+    debug_log.event("user_login_success", role_after=session.get("role"), name_len=len(user_name))
     flash("Logged in.")
     return redirect(next_url)
 
@@ -241,9 +146,84 @@ def logout():
     return redirect(next_url)
 
 
+def _reactions_by_topic(db, topic_ids) -> dict:
+    # Reactions for the visible topics only, in chunks that stay under the host-parameter limit.
+    reactions_by_topic = {}
+    for start in range(0, len(topic_ids), SQL_IN_CHUNK):
+        chunk = topic_ids[start:start + SQL_IN_CHUNK]
+        placeholders = ",".join(["?"] * len(chunk))
+        rx_rows = db.execute(
+            f"SELECT id, topic_id, emoji FROM forum_topic_reactions WHERE topic_id IN ({placeholders}) ORDER BY id ASC",
+            chunk,
+        ).fetchall()
+        for r in rx_rows:
+            reactions_by_topic.setdefault(r["topic_id"], []).append(r)
+    return reactions_by_topic
+
+
+def _search_topics(q: str, cursor: str):
+    # Ranked FTS5 results; the cursor carries the page number since bm25 order has no stable key.
+    _, values = decode_cursor(cursor)
+    page = values[0] if values and isinstance(values[0], int) and values[0] > 0 else 1
+
+    db = get_db()
+    hits = search_forum(db, q, TOPICS_PER_PAGE + 1, (page - 1) * TOPICS_PER_PAGE)
+    has_more = len(hits) > TOPICS_PER_PAGE
+    hits = hits[:TOPICS_PER_PAGE]
+
+    topics, snippets, reply_hits = [], {}, set()
+    if hits:
+        ids = [topic_id for topic_id, _, _ in hits]
+        placeholders = ",".join(["?"] * len(ids))
+        rows = db.execute(
+            f"SELECT {TOPIC_LIST_COLUMNS}, content AS full_content FROM forum_topics WHERE id IN ({placeholders})",
+            ids,
+        ).fetchall()
+        by_id = {r["id"]: r for r in rows}
+        topics = [by_id[i] for i in ids if i in by_id]
+
+        reply_ids = [rid // 2 for _, _, rid in hits if rid % 2 == 1]
+        replies = {}
+        if reply_ids:
+            placeholders = ",".join(["?"] * len(reply_ids))
+            replies = {
+                r["topic_id"]: r["content"]
+                for r in db.execute(
+                    f"SELECT topic_id, content FROM forum_replies WHERE id IN ({placeholders})", reply_ids
+                ).fetchall()
+            }
+
+        terms = query_terms(q)
+        for t in topics:
+            if t["id"] in replies:
+                reply_hits.add(t["id"])
+                snippets[t["id"]] = make_snippet(replies[t["id"]], terms)
+            else:
+                snippets[t["id"]] = make_snippet(t["full_content"], terms)
+
+    return render_template(
+        "forum/forum_list.html",
+        topics=topics,
+        q=q,
+        is_admin=_is_admin(),
+        is_logged_in=_is_logged_in(),
+        reactions_by_topic=_reactions_by_topic(db, [t["id"] for t in topics]),
+        allowed_emojis=ALLOWED_EMOJIS,
+        next_url=request.full_path if request.query_string else request.path,
+        next_cursor=encode_cursor("n", [page + 1]) if has_more else None,
+        prev_cursor=encode_cursor("p", [page - 1]) if page > 1 else None,
+        snippets=snippets,
+        reply_hits=reply_hits,
+    )
+
+
 @bp.route("/")
 def list_topics():
     q = (request.args.get("q") or "").strip()
+    cursor = (request.args.get("cursor") or "").strip()
+
+    if q and query_terms(q) and _search_ready(get_db()):
+        return _search_topics(q, cursor)
 
     where = []
     params = []
@@ -252,27 +232,21 @@ def list_topics():
         like = f"%{q}%"
         params.extend([like, like])
 
-    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
-    sql = f"""
-        SELECT *
-        FROM forum_topics
-        {where_sql}
-        ORDER BY pinned DESC, created_at DESC
-    """
-
     db = get_db()
-    topics = db.execute(sql, params).fetchall()
 
-    topic_ids = [t["id"] for t in topics]
-    reactions_by_topic = {}
-    if topic_ids:
-        placeholders = ",".join(["?"] * len(topic_ids))
-        rx_rows = db.execute(
-            f"SELECT id, topic_id, emoji FROM forum_topic_reactions WHERE topic_id IN ({placeholders}) ORDER BY id ASC",
-            topic_ids,
-        ).fetchall()
-        for r in rx_rows:
-            reactions_by_topic.setdefault(r["topic_id"], []).append(r)
+    # Pinned topics come first and page like everything else: (pinned, created_at, id) walks
+    # idx_forum_topics_pinned_created_at backwards, so any number of pinned topics stays reachable.
+    topics, next_cursor, prev_cursor = paginate_keyset(
+        db,
+        f"SELECT {TOPIC_LIST_COLUMNS} FROM forum_topics",
+        where,
+        params,
+        [("pinned", "DESC"), ("created_at", "DESC"), ("id", "DESC")],
+        cursor,
+        TOPICS_PER_PAGE,
+    )
+
+    reactions_by_topic = _reactions_by_topic(db, [t["id"] for t in topics])
 
     return render_template(
         "forum/forum_list.html",
@@ -283,6 +257,8 @@ def list_topics():
         reactions_by_topic=reactions_by_topic,
         allowed_emojis=ALLOWED_EMOJIS,
         next_url=request.full_path if request.query_string else request.path,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
     )
 
 
@@ -418,9 +394,7 @@ def like(topic_id: int):
     Qeyd: Skeleton olaraq hazırda yalnız şablonu qaytarır.
     """
     if not _is_logged_in():
-        # region agent log
-        _dlog("B", "forum.py:like", "like_denied_guest", {"topic_id": topic_id, "role": session.get("role") or "guest"})
-        # endregion
+        debug_log.event("like_denied_guest", topic_id=topic_id, role=session.get("role") or "guest")
         return _redirect_login("Please log in to like or reply.", url_for("forum.detail", topic_id=topic_id))
 
     db = get_db()
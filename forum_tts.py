@@ -8,24 +8,16 @@ sonra OpenAI TTS API ilə səs faylına çevirir.
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from database import get_db
+import ai_cache
+import jobs
+import openai_client
+import tts_stream
 import os
 import datetime
-import secrets
-from dotenv import load_dotenv
-
-load_dotenv()
 
 bp = Blueprint("forum_tts", __name__, url_prefix="/forum")
 
-def get_gpt_api_key():
-    """
-    Environment variable-dan GPT API açarını alır.
-    """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY tapılmadı! .env faylına əlavə edin.")
-    return api_key
-
+@ai_cache.cached("forum_tts.summarize", model="gpt-3.5-turbo")
 def summarize_with_gpt(content: str) -> str:
     """
     GPT Chat API istifadə edərək mətni qısaldır (xülasə).
@@ -39,11 +31,9 @@ def summarize_with_gpt(content: str) -> str:
     Nümunə prompt:
     "Bu forum mesajını 3-4 cümləyə qısalt. Əsas məzmunu saxla, amma detalları çıxar:\n\n{content}"
     """
-    api_key = get_gpt_api_key()
+    client = openai_client.get_client()
     
     # TODO: Tələbə burada kod yazmalıdır
-    # from openai import OpenAI
-    # client = OpenAI(api_key=api_key)
     # prompt = f"Bu forum mesajını 3-4 cümləyə qısalt. Əsas məzmunu saxla, amma detalları çıxar.\n\nOrijinal mətn:\n{content}\n\nQısa xülasə:"
     # response = client.chat.completions.create(
     #     model="gpt-3.5-turbo",
@@ -55,20 +45,60 @@ def summarize_with_gpt(content: str) -> str:
     
     return "TODO: GPT API çağırışı implement edilməlidir"
 
-def create_tts_audio_with_openai(text: str, voice: str = "alloy") -> str:
+def create_tts_audio_with_openai(text: str, voice: str = "alloy", filename: str = None) -> str:
     """
-    OpenAI TTS API ilə mətni səs faylına çevirir.
-    
-    TODO: Tələbə bu funksiyanı implement etməlidir:
-    1. OpenAI client yarat
-    2. TTS API çağırışı et (tts-1 model)
-    3. Audio faylını static/audio/forum/ qovluğuna yaz
-    4. Fayl adını qaytar
+    OpenAI TTS API ilə mətni səs faylına çevirir (static/audio/forum/) və fayl adını qaytarır.
+    Audio hissələri gəldikcə diskə yazılır (`tts_stream`), player səhifəsi sintez bitmədən oxumağa başlaya bilər.
+    `filename` — əvvəlcədən `tts_stream.reserve("forum")` ilə seçilmiş ad.
     
     Voice seçimləri: alloy, echo, fable, onyx, nova, shimmer
     """
-    # TODO: Tələbə burada kod yazmalıdır
-    return "TODO: OpenAI TTS API çağırışı implement edilməlidir"
+    return tts_stream.synthesize(text, voice, "forum", filename)
+
+@jobs.handler("forum_tts")
+def run_tts_job(payload: dict) -> dict:
+    """Fon işi: mövzunu və ya cavabı GPT ilə qısaldır, OpenAI TTS ilə audio yaradır və DB-yə yazır."""
+    topic_id, reply_id = payload["topic_id"], payload.get("reply_id")
+    db = get_db()
+    if reply_id is None:
+        row = db.execute("SELECT content FROM forum_topics WHERE id = ?", (topic_id,)).fetchone()
+    else:
+        row = db.execute("SELECT content FROM forum_replies WHERE id = ? AND topic_id = ?", (reply_id, topic_id)).fetchone()
+    if row is None:
+        raise ValueError("Mətn tapılmadı (silinib).")
+
+    # GPT ilə xülasə
+    summarized_content = summarize_with_gpt(row["content"])
+
+    # Audio faylının adını əvvəlcədən seç və DB-yə yaz: player səhifəsi sintez bitmədən açılır
+    audio_filename = tts_stream.reserve("forum")
+    file_id = None
+    try:
+        created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+        cursor = db.execute(
+            "INSERT INTO forum_tts_files (topic_id, reply_id, audio_filename, summarized_content, created_at) VALUES (?, ?, ?, ?, ?)",
+            (topic_id, reply_id, audio_filename, summarized_content, created_at)
+        )
+        db.commit()
+        file_id = cursor.lastrowid
+        result = {
+            "endpoint": "forum_tts.tts_player",
+            "values": {"topic_id": topic_id, "file_id": file_id},
+            "message": "Xülasə hazırdır, audio hazırlanır...",
+        }
+        jobs.publish(result)
+
+        # OpenAI TTS audio yarat (hissələr gəldikcə diskə yazılır və player-ə axır)
+        voice = os.getenv("OPENAI_TTS_VOICE", "alloy")
+        create_tts_audio_with_openai(summarized_content, voice, audio_filename)
+    except Exception:
+        # Marker yalnız sintez zamanı deyil, insert/publish xətasında da qalmamalıdır
+        tts_stream.discard("forum", audio_filename)
+        if file_id is not None:
+            db.execute("DELETE FROM forum_tts_files WHERE id = ?", (file_id,))
+            db.commit()
+        raise
+    return result
 
 @bp.route("/<int:topic_id>/tts", methods=["GET", "POST"])
 def tts_topic(topic_id: int):
@@ -76,7 +106,7 @@ def tts_topic(topic_id: int):
     Forum mövzusu üçün TTS yaradır.
     
     GET: TTS formu
-    POST: GPT ilə mövzunu qısaldır, OpenAI TTS ilə audio yaradır və DB-yə yazır
+    POST: TTS işini növbəyə qoyur (GPT xülasə + OpenAI TTS fon worker-ində işləyir)
     """
     db = get_db()
     
@@ -88,24 +118,12 @@ def tts_topic(topic_id: int):
     
     if request.method == "POST":
         try:
-            # GPT ilə xülasə
-            summarized_content = summarize_with_gpt(topic["content"])
-            
-            # OpenAI TTS audio yarat
-            voice = os.getenv("OPENAI_TTS_VOICE", "alloy")
-            audio_filename = create_tts_audio_with_openai(summarized_content, voice)
-            
-            # DB-yə yaz
-            created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-            cursor = db.execute(
-                "INSERT INTO forum_tts_files (topic_id, reply_id, audio_filename, summarized_content, created_at) VALUES (?, ?, ?, ?, ?)",
-                (topic_id, None, audio_filename, summarized_content, created_at)
+            # TTS işini növbəyə qoy
+            job_id = jobs.enqueue(
+                "forum_tts", {"topic_id": topic_id, "reply_id": None},
+                back_endpoint="forum_tts.tts_topic", back_values={"topic_id": topic_id},
             )
-            db.commit()
-            
-            file_id = cursor.lastrowid
-            flash("TTS uğurla yaradıldı!", "success")
-            return redirect(url_for("forum_tts.tts_player", topic_id=topic_id, file_id=file_id))
+            return redirect(url_for("jobs.status", job_id=job_id))
             
         except ValueError as e:
             flash(f"Xəta: {str(e)}", "error")
@@ -131,24 +149,12 @@ def tts_reply(topic_id: int, reply_id: int):
     
     if request.method == "POST":
         try:
-            # GPT ilə xülasə
-            summarized_content = summarize_with_gpt(reply["content"])
-            
-            # OpenAI TTS audio yarat
-            voice = os.getenv("OPENAI_TTS_VOICE", "alloy")
-            audio_filename = create_tts_audio_with_openai(summarized_content, voice)
-            
-            # DB-yə yaz
-            created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-            cursor = db.execute(
-                "INSERT INTO forum_tts_files (topic_id, reply_id, audio_filename, summarized_content, created_at) VALUES (?, ?, ?, ?, ?)",
-                (topic_id, reply_id, audio_filename, summarized_content, created_at)
+            # TTS işini növbəyə qoy
+            job_id = jobs.enqueue(
+                "forum_tts", {"topic_id": topic_id, "reply_id": reply_id},
+                back_endpoint="forum_tts.tts_reply", back_values={"topic_id": topic_id, "reply_id": reply_id},
             )
-            db.commit()
-            
-            file_id = cursor.lastrowid
-            flash("TTS uğurla yaradıldı!", "success")
-            return redirect(url_for("forum_tts.tts_player", topic_id=topic_id, file_id=file_id))
+            return redirect(url_for("jobs.status", job_id=job_id))
             
         except ValueError as e:
             flash(f"Xəta: {str(e)}", "error")
@@ -174,3 +180,15 @@ def tts_player(topic_id: int, file_id: int):
         return render_template("404.html"), 404
     
     return render_template("forum/tts_player.html", tts_file=dict(tts_file), topic_id=topic_id)
+
+@bp.route("/<int:topic_id>/tts/<int:file_id>/audio")
+def tts_audio(topic_id: int, file_id: int):
+    """
+    Audio faylı: hazırdırsa adi fayl kimi, hələ sintez olunursa chunked axın kimi (gələn hissələrlə).
+    """
+    row = get_db().execute(
+        "SELECT audio_filename FROM forum_tts_files WHERE id = ? AND topic_id = ?", (file_id, topic_id)
+    ).fetchone()
+    if not row:
+        return render_template("404.html"), 404
+    return tts_stream.stream_audio("forum", row["audio_filename"])
@@ -1,14 +1,17 @@
 # -*- coding: utf-8 -*-
 
 from flask import Blueprint, render_template, request, redirect, url_for, current_app, flash, abort
-from database import get_db
-import os, datetime, secrets
+from database import get_db, paginate_keyset
+from thumbnails import available_widths, make_derivatives, remove_derivatives, thumb_relpath
+import media
+import os, datetime, time, click
 
 bp = Blueprint("gallery", __name__, url_prefix="/gallery")
 
 ALLOWED = {"png", "jpg", "jpeg", "gif", "webp"}
 MAX_SIZE = 3 * 1024 * 1024  # 3 MB
 ADMIN_PASS = "admin123"     # demo parol (yalnız dərs məqsədi üçün)
+PER_PAGE = 12
 
 
 def allowed(filename: str) -> bool:
@@ -22,19 +25,90 @@ def allowed(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED
 
 
+def store_brightness(db, image_id: int, filename: str) -> dict:
+    """
+    Şəklin parlaqlığını bir dəfə hesablayır və `gallery_images`-ə yazır (commit çağıran tərəfdədir).
+    Fayl oxunmursa ("unknown") yazılmır — fayl bərpa olunanda yenidən hesablanacaq.
+    """
+    from gallery_detection import analyze_image_brightness
+    brightness = analyze_image_brightness(os.path.join(current_app.config["UPLOAD_FOLDER"], filename))
+    if brightness["label"] == "unknown":
+        return brightness
+    db.execute(
+        "UPDATE gallery_images SET brightness = ?, brightness_label = ? WHERE id = ?",
+        (brightness["brightness"], brightness["label"], image_id),
+    )
+    return brightness
+
+
+def store_derivatives(db, image_id: int, filename: str, force: bool = False):
+    """Şəklin versiyalarını yaradır və heş/ölçüləri yazır; fayl oxunmursa None (commit çağıran tərəfdədir)."""
+    path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
+    try:
+        info = make_derivatives(path, content_hash=media.content_hash(filename), force=force)
+    except (OSError, ValueError):
+        return None
+    db.execute(
+        "UPDATE gallery_images SET content_hash = ?, width = ?, height = ? WHERE id = ?",
+        (info["content_hash"], info["width"], info["height"], image_id),
+    )
+    return info
+
+
+@bp.app_template_global()
+def thumb_src(img, width: int = 640) -> str:
+    """`width`-ə ən yaxın (ondan böyük olmayan) versiyanın URL-i; versiya yoxdursa orijinal."""
+    if not img["content_hash"]:
+        return url_for("static", filename="uploads/" + img["filename"])
+    widths = available_widths(img["width"])
+    name = max((n for n, _ in widths if n <= width), default=widths[0][0])
+    return url_for("static", filename=thumb_relpath(img["content_hash"], name))
+
+
+@bp.app_template_global()
+def thumb_srcset(img) -> str:
+    """`<img srcset>` üçün: "url 320w, url 640w, ..." (versiya yoxdursa boş)."""
+    if not img["content_hash"]:
+        return ""
+    return ", ".join(
+        f"{url_for('static', filename=thumb_relpath(img['content_hash'], name))} {actual}w"
+        for name, actual in available_widths(img["width"])
+    )
+
+
+@bp.cli.command("thumbnails")
+@click.option("--force", is_flag=True, help="Mövcud versiyaları da yenidən yarat")
+def thumbnails_command(force):
+    """static/uploads-dakı şəkillər üçün kiçildilmiş versiyaları yaradır (backfill)."""
+    db = get_db()
+    where = "" if force else "WHERE content_hash IS NULL"
+    rows = db.execute(f"SELECT id, filename FROM gallery_images {where} ORDER BY id").fetchall()
+    started = time.perf_counter()
+    done = missing = 0
+    for row in rows:
+        if store_derivatives(db, row["id"], row["filename"], force=force) is None:
+            missing += 1
+        else:
+            done += 1
+        db.commit()
+    click.echo(f"{done} şəkil emal olundu, {missing} fayl tapılmadı — {time.perf_counter() - started:.1f} s")
+
+
 @bp.route("/")
 def grid():
     uploader = (request.args.get("uploader") or "").strip()
-    db = get_db()
+    cursor = (request.args.get("cursor") or "").strip()
+    conditions, params = [], []
     if uploader:
-        cur = db.execute(
-            "SELECT * FROM gallery_images WHERE uploader LIKE ? ORDER BY id DESC",
-            ("%" + uploader + "%",),
-        )
-    else:
-        cur = db.execute("SELECT * FROM gallery_images ORDER BY id DESC")
-    images = cur.fetchall()
-    return render_template("gallery/list.html", images=images, uploader=uploader)
+        conditions.append("uploader LIKE ?")
+        params.append("%" + uploader + "%")
+    db = get_db()
+    images, next_cursor, prev_cursor = paginate_keyset(
+        db, "SELECT * FROM gallery_images", conditions, params, [("id", "DESC")], cursor, PER_PAGE
+    )
+    return render_template(
+        "gallery/list.html", images=images, uploader=uploader, next_cursor=next_cursor, prev_cursor=prev_cursor
+    )
 
 
 @bp.route("/<int:image_id>")
@@ -44,9 +118,13 @@ def detail(image_id: int):
     img = cur.fetchone()
     if img is None:
         return render_template("404.html"), 404
-    from gallery_detection import analyze_image_brightness
-    image_path = os.path.join(current_app.config["UPLOAD_FOLDER"], img["filename"])
-    brightness = analyze_image_brightness(image_path)
+    if img["brightness_label"] is None:
+        # Köhnə şəkil: parlaqlıq ilk baxışda bir dəfə hesablanır, sonrakı baxışlar yalnız sətri oxuyur
+        writer = get_db(readonly=False)
+        brightness = store_brightness(writer, image_id, img["filename"])
+        writer.commit()
+    else:
+        brightness = {"label": img["brightness_label"], "brightness": img["brightness"]}
     return render_template("gallery/detail.html", img=img, brightness=brightness)
 
 
@@ -95,14 +173,18 @@ def delete(image_id: int):
         return render_template("404.html"), 404
 
     if request.method == "POST":
-        filename = img["filename"]
-        path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
-        try:
-            os.remove(path)
-        except OSError:
-            pass
+        # Fayl başqa yükləmələrlə paylaşıla bilər: yalnız son istinad gedəndə və commit uğurlu olandan sonra silinir
+        last_reference = media.release(db, img["filename"])
         db.execute("DELETE FROM gallery_images WHERE id = ?", (image_id,))
         db.commit()
+        if last_reference:
+            media.remove_if_unused(db, img["filename"])
+        # Versiyalar heşə görə paylaşılır: başqa şəkil istifadə etmirsə silinir
+        content_hash = img["content_hash"]
+        if content_hash and db.execute(
+            "SELECT 1 FROM gallery_images WHERE content_hash = ? LIMIT 1", (content_hash,)
+        ).fetchone() is None:
+            remove_derivatives(content_hash)
         return redirect(url_for("gallery.grid"))
 
     return render_template(
@@ -126,31 +208,52 @@ def upload():
         flash("Zəhmət olmasa ən azı bir şəkil faylı yükləyin (png, jpg, jpeg, gif, webp).")
         return redirect(url_for("gallery.upload"))
 
-    created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-    db = get_db()
-    ok = 0
-    for file in files:
-        if not file or not file.filename:
-            continue
-        if not allowed(file.filename):
-            continue
-        file.stream.seek(0, os.SEEK_END)
-        size = file.stream.tell()
-        file.stream.seek(0)
-        if size > MAX_SIZE:
-            continue
-
-        ext = file.filename.rsplit(".", 1)[1].lower()
-        filename = f"{secrets.token_hex(8)}.{ext}"
-        path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
-        file.save(path)
-        db.execute(
-            "INSERT INTO gallery_images (title, filename, uploader, created_at) VALUES (?, ?, ?, ?)",
-            (title, filename, uploader, created_at),
-        )
-        ok += 1
+    from gallery_detection import analyze_image_brightness
+
+    # Dekod, parlaqlıq və versiyalar (WebP) yazı tranzaksiyasından kənarda: bu vaxt digər yazanlar gözləmir
+    staged = []
+    try:
+        for file in files:
+            if not file or not file.filename:
+                continue
+            if not allowed(file.filename):
+                continue
+            file.stream.seek(0, os.SEEK_END)
+            size = file.stream.tell()
+            file.stream.seek(0)
+            if size > MAX_SIZE:
+                continue
+            upload = media.stage_upload(file)
+            staged.append(upload)
+            upload["brightness"] = analyze_image_brightness(upload["tmp_path"])
+            try:
+                upload["derivatives"] = make_derivatives(upload["tmp_path"], content_hash=upload["sha256"])
+            except (OSError, ValueError):
+                upload["derivatives"] = None
+
+        # Hər fayl üçün qısa tranzaksiya: media_files istinadı + gallery_images sətri (heş/ölçülərlə birlikdə)
+        created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+        db = get_db()
+        ok = 0
+        while staged:
+            upload = staged[0]
+            brightness, info = upload["brightness"], upload["derivatives"] or {}
+            known = brightness["label"] != "unknown"
+            filename = media.store_staged(db, upload)
+            staged.pop(0)
+            db.execute(
+                "INSERT INTO gallery_images (title, filename, uploader, created_at, brightness, brightness_label, "
+                "content_hash, width, height) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (title, filename, uploader, created_at,
+                 brightness["brightness"] if known else None, brightness["label"] if known else None,
+                 info.get("content_hash"), info.get("width"), info.get("height")),
+            )
+            db.commit()
+            ok += 1
+    finally:
+        for upload in staged:
+            media.discard_staged(upload)
 
-    db.commit()
     if ok:
         flash("Uğurla yükləndi." if ok == 1 else f"{ok} şəkil uğurla yükləndi.")
     else:
@@ -6,28 +6,32 @@ Bu modul şəkillərdə obyektləri GPT Vision API ilə tapır,
 sonra GPT Chat API ilə təbii dildə təsvir edir.
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
 from database import get_db
+import ai_cache
+import jobs
+import openai_client
+import media
 import os
 import datetime
 import secrets
 import json
 import base64
-from dotenv import load_dotenv
+import threading
+import time
+import click
 
-load_dotenv()
+bp = Blueprint("gallery_detection", __name__, url_prefix="/gallery", cli_group="detection")
+ADMIN_PASS = "admin123"  # demo parol (yalnız dərs məqsədi üçün)
+DETECT_BATCH_SIZE = 16   # bir model çağırışında neçə şəkil
+SQL_IN_CHUNK = 500       # IN (...) siyahısında maksimum parametr
 
-bp = Blueprint("gallery_detection", __name__, url_prefix="/gallery")
-
-
-def get_gpt_api_key():
-    """
-    Environment variable-dan GPT API açarını alır.
-    """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY tapılmadı! .env faylına əlavə edin.")
-    return api_key
+# YOLO modeli proses başına bir dəfə yüklənir (hər sorğuda deyil).
+# YOLO_WARMUP=1 olduqda tətbiq başlayanda fon thread-ində yüklənib "isidilir".
+YOLO_MODEL_PATH = os.getenv("YOLO_MODEL", "yolov8n.pt")
+_yolo_model = None
+_yolo_load_lock = threading.Lock()
+_yolo_infer_lock = threading.Lock()  # ultralytics modeli thread-safe deyil: inference ardıcıl gedir
 
 
 def _normalize_detection(obj: dict) -> dict:
@@ -66,59 +70,213 @@ def analyze_image_brightness(image_path: str) -> dict:
     """
     Şəkilin tünd və ya işıqlı olduğunu müəyyən edir.
     Grayscale ortalama parlaqlığa əsasən "dark" və ya "light" qaytarır.
+    Pillow ilə oxunur; JPEG üçün `draft` şəkli kiçik ölçüdə dekod edir (orta parlaqlıq üçün kifayətdir).
+    Nəticə `gallery_images`-də saxlanılır — bu funksiya şəkil başına bir dəfə çağırılır.
 
     Returns:
         dict: {"label": "dark"|"light", "brightness": 0-255}
     """
-    import cv2
+    from PIL import Image, ImageStat
+
     if not os.path.isfile(image_path):
         return {"label": "unknown", "brightness": 0}
-    img = cv2.imread(image_path)
-    if img is None:
+    try:
+        with Image.open(image_path) as img:
+            img.draft("L", (256, 256))
+            gray = img.convert("L")
+            gray.thumbnail((256, 256))
+            brightness = float(ImageStat.Stat(gray).mean[0])
+    except (OSError, ValueError):
         return {"label": "unknown", "brightness": 0}
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    brightness = float(gray.mean())
     label = "light" if brightness >= 128 else "dark"
     return {"label": label, "brightness": round(brightness, 1)}
 
 
+def get_yolo_model():
+    """
+    Prosesdə paylaşılan YOLO modelini qaytarır; ilk çağırışda (thread-safe) yükləyir.
+    """
+    global _yolo_model
+    if _yolo_model is None:
+        with _yolo_load_lock:
+            if _yolo_model is None:
+                try:
+                    from ultralytics import YOLO
+                except ImportError:
+                    raise ValueError("ultralytics quraşdırılmayıb. pip install ultralytics edin.")
+                _yolo_model = YOLO(YOLO_MODEL_PATH)
+    return _yolo_model
+
+
+def warm_up_model():
+    """
+    Modeli yükləyir və boş şəkil üzərində bir dəfə işlədir ki, ilk real sorğu
+    model yüklənməsi / ilk inference xərcini ödəməsin.
+    """
+    import numpy as np
+
+    model = get_yolo_model()
+    with _yolo_infer_lock:
+        model(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+
+
+@bp.record_once
+def _schedule_warm_up(state):
+    state.app.config.setdefault("YOLO_WARMUP", os.getenv("YOLO_WARMUP") == "1")
+    if not state.app.config["YOLO_WARMUP"]:
+        return
+
+    def run():
+        try:
+            warm_up_model()
+        except Exception as e:
+            state.app.logger.warning("YOLO warm-up alınmadı: %s", e)
+
+    threading.Thread(target=run, name="yolo-warmup", daemon=True).start()
+
+
+def _result_to_detections(result) -> list:
+    """Bir ultralytics nəticəsini detection siyahısına çevirir."""
+    out = []
+    if result.boxes is None:
+        return out
+    names = result.names or {}
+    for box in result.boxes:
+        xyxy = box.xyxy[0].tolist()
+        conf = float(box.conf[0])
+        cls_id = int(box.cls[0])
+        class_name = (names.get(cls_id) or "object").strip().lower()
+        if not class_name:
+            class_name = "object"
+        out.append({
+            "class": class_name,
+            "confidence": round(conf, 4),
+            "bbox": [int(round(x)) for x in xyxy]
+        })
+    return out
+
+
 def detect_objects_with_gpt_vision(image_path: str) -> list:
     """
     YOLOv8n ilə şəkillərdə obyektləri tapır. Nəticə formatı: class (lowercase singular),
     confidence (0-1), bbox [x1, y1, x2, y2] piksel. Heç bir obyekt tapılmazsa [] qaytarır.
+    Model prosesdə bir dəfə yüklənir (`get_yolo_model`), burada yalnız inference gedir.
     """
     if not os.path.isfile(image_path):
         return []
 
-    try:
-        from ultralytics import YOLO
-    except ImportError:
-        raise ValueError("ultralytics quraşdırılmayıb. pip install ultralytics edin.")
-
-    model = YOLO("yolov8n.pt")
-    results = model(image_path, verbose=False)
+    model = get_yolo_model()
+    with _yolo_infer_lock:
+        results = model(image_path, verbose=False)
 
     out = []
     for r in results:
-        if r.boxes is None:
-            continue
-        names = r.names or {}
-        for box in r.boxes:
-            xyxy = box.xyxy[0].tolist()
-            conf = float(box.conf[0])
-            cls_id = int(box.cls[0])
-            class_name = (names.get(cls_id) or "object").strip().lower()
-            if not class_name:
-                class_name = "object"
-            out.append({
-                "class": class_name,
-                "confidence": round(conf, 4),
-                "bbox": [int(round(x)) for x in xyxy]
-            })
+        out.extend(_result_to_detections(r))
+    return out
+
 
+def detect_objects_batch(image_paths: list, batch_size: int = DETECT_BATCH_SIZE) -> list:
+    """
+    Bir neçə şəkli modelə `batch_size`-lik qruplarla verir (çağırış başına xərc bölüşdürülür).
+    Qayıdır: hər şəkil üçün detection siyahısı, `image_paths` ilə eyni sırada (fayl yoxdursa []).
+    """
+    out = [[] for _ in image_paths]
+    present = [(i, p) for i, p in enumerate(image_paths) if os.path.isfile(p)]
+    if not present:
+        return out
+
+    model = get_yolo_model()
+    for start in range(0, len(present), max(1, batch_size)):
+        chunk = present[start:start + batch_size]
+        with _yolo_infer_lock:
+            results = model([p for _, p in chunk], verbose=False)
+        for (i, _), r in zip(chunk, results):
+            out[i] = _result_to_detections(r)
     return out
 
 
+def summarize_detections(detected_objects: list) -> str:
+    """GPT-siz qısa təsvir (toplu analiz üçün): "2 person, 1 dog"."""
+    if not detected_objects:
+        return "Şəkildə heç bir obyekt tapılmadı."
+    counts = {}
+    for obj in detected_objects:
+        counts[obj["class"]] = counts.get(obj["class"], 0) + 1
+    parts = [f"{n} {name}" for name, n in sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))]
+    return "Tapılan obyektlər: " + ", ".join(parts) + "."
+
+
+def pending_image_ids(db) -> list:
+    """Hələ heç bir detection nəticəsi olmayan qalereya şəkilləri."""
+    rows = db.execute(
+        "SELECT id FROM gallery_images i "
+        "WHERE NOT EXISTS (SELECT 1 FROM gallery_detections d WHERE d.image_id = i.id) "
+        "ORDER BY id"
+    ).fetchall()
+    return [r["id"] for r in rows]
+
+
+def run_batch_detection(db, image_ids: list, upload_folder: str, detections_folder: str,
+                        batch_size: int = DETECT_BATCH_SIZE, describe: bool = False) -> dict:
+    """
+    Verilən şəkillər üçün toplu detection: modeli batch-lərlə çağırır, qutulu şəkilləri çəkir
+    və bütün `gallery_detections` sətirlərini BİR tranzaksiyada yazır.
+    `describe=True` olduqda təsvir GPT ilə (hər şəkil üçün ayrıca API çağırışı), əks halda yerli xülasə ilə yazılır.
+
+    Qayıdır: {"images", "detections", "missing", "seconds", "images_per_sec"}
+    """
+    import shutil
+
+    started = time.perf_counter()
+    images = []
+    for start in range(0, len(image_ids), SQL_IN_CHUNK):
+        chunk = image_ids[start:start + SQL_IN_CHUNK]
+        marks = ",".join("?" * len(chunk))
+        images.extend(db.execute(
+            f"SELECT id, filename FROM gallery_images WHERE id IN ({marks}) ORDER BY id", chunk
+        ).fetchall())
+
+    paths = [os.path.join(upload_folder, img["filename"]) for img in images]
+    results = detect_objects_batch(paths, batch_size=batch_size)
+
+    out_dir = os.path.join(detections_folder, "gallery")
+    os.makedirs(out_dir, exist_ok=True)
+    created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+    rows, missing, total_objects = [], 0, 0
+    for img, path, detected_objects in zip(images, paths, results):
+        if not os.path.isfile(path):
+            missing += 1
+            continue
+        result_filename = f"detection_{secrets.token_hex(8)}.jpg"
+        result_path = os.path.join(out_dir, result_filename)
+        if any(obj.get("bbox") for obj in detected_objects):
+            draw_boxes(path, detected_objects, result_path)
+        else:
+            shutil.copy(path, result_path)
+        description = describe_objects_with_gpt(detected_objects) if describe else summarize_detections(detected_objects)
+        rows.append((img["id"], json.dumps(detected_objects, ensure_ascii=False), description, result_filename, created_at))
+        total_objects += len(detected_objects)
+
+    db.executemany(
+        "INSERT INTO gallery_detections (image_id, detected_objects_json, gpt_description, result_image_path, created_at) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+    db.commit()
+
+    seconds = time.perf_counter() - started
+    return {
+        "images": len(rows),
+        "detections": total_objects,
+        "missing": missing + (len(image_ids) - len(images)),
+        "seconds": round(seconds, 3),
+        "images_per_sec": round(len(rows) / seconds, 2) if seconds > 0 else 0.0,
+    }
+
+
+def _parse_ids(text: str) -> list:
+    return [int(x) for x in (text or "").replace(",", " ").split() if x.isdigit()]
+
+
 def draw_boxes(image_path: str, detections: list, output_path: str):
     """
     OpenCV ilə şəkil üzərində qutular çəkir. Hər detection üçün bbox varsa düzbucaqlı
@@ -143,18 +301,15 @@ def draw_boxes(image_path: str, detections: list, output_path: str):
     cv2.imwrite(output_path, img)
 
 
+@ai_cache.cached("gallery_detection.describe", model="gpt-3.5-turbo")
 def describe_objects_with_gpt(detected_objects: list) -> str:
     """
     GPT Chat API istifadə edərək tapılan obyektləri təbii dildə təsvir edir.
     """
-    api_key = get_gpt_api_key()
-
     if not detected_objects:
         return "Şəkildə heç bir obyekt tapılmadı."
 
-    from openai import OpenAI
-
-    client = OpenAI(api_key=api_key)
+    client = openai_client.get_client()
     objects_str = json.dumps(detected_objects, ensure_ascii=False, indent=2)
     prompt = (
         "Bu şəkildə tapılan obyektləri təbii dildə, maraqlı və informativ şəkildə təsvir et. "
@@ -175,13 +330,148 @@ def describe_objects_with_gpt(detected_objects: list) -> str:
         raise ValueError(f"GPT API xətası: {str(e)}")
 
 
+@bp.route("/detect/batch", methods=["POST"])
+def detect_batch():
+    """
+    Toplu detection (admin): `image_ids` (vergüllə) və ya `all=1` — hələ analiz olunmamış bütün şəkillər.
+    Bütün backlog üzrə inference sorğu daxilində getmir: fon işi yaradılır və status səhifəsinə yönləndirilir
+    (nəticə — emal olunan şəkil sayı, tapılan obyektlər, şəkil/saniyə — `/jobs/<id>.json`-da da görünür).
+    """
+    password = (request.form.get("password") or request.args.get("password") or "").strip()
+    if password != ADMIN_PASS:
+        return jsonify({"error": "Admin parolu səhvdir."}), 403
+
+    image_ids = _parse_ids(request.form.get("image_ids", ""))
+    if request.form.get("all") != "1" and not image_ids:
+        return jsonify({"images": 0, "detections": 0, "missing": 0, "seconds": 0.0, "images_per_sec": 0.0})
+    try:
+        batch_size = max(1, int(request.form.get("batch_size", DETECT_BATCH_SIZE)))
+    except ValueError:
+        batch_size = DETECT_BATCH_SIZE
+
+    job_id = jobs.enqueue(
+        "gallery_detection_batch",
+        {"image_ids": None if request.form.get("all") == "1" else image_ids, "batch_size": batch_size,
+         "describe": request.form.get("describe") == "1"},
+        back_endpoint="gallery.grid",
+    )
+    return redirect(url_for("jobs.status", job_id=job_id))
+
+
+@jobs.handler("gallery_detection_batch")
+def run_batch_detection_job(payload: dict) -> dict:
+    """
+    Fon işi: toplu detection `batch_size`-lik hissələrlə, hər hissə öz tranzaksiyasında yazılır.
+    `image_ids` None-dursa, iş başlayanda hələ analiz olunmamış bütün şəkillər götürülür.
+    """
+    db = get_db()
+    image_ids = payload["image_ids"] or pending_image_ids(db)
+    batch_size = payload["batch_size"]
+    totals = {"images": 0, "detections": 0, "missing": 0, "seconds": 0.0}
+    for start in range(0, len(image_ids), batch_size):
+        stats = run_batch_detection(
+            db, image_ids[start:start + batch_size], current_app.config["UPLOAD_FOLDER"],
+            current_app.config["DETECTIONS_FOLDER"], batch_size=batch_size, describe=payload["describe"],
+        )
+        for key in totals:
+            totals[key] += stats[key]
+    totals["seconds"] = round(totals["seconds"], 3)
+    totals["images_per_sec"] = round(totals["images"] / totals["seconds"], 2) if totals["seconds"] > 0 else 0.0
+    return {
+        "endpoint": "gallery.grid",
+        "message": f"Toplu detection: {totals['images']} şəkil, {totals['detections']} obyekt "
+                   f"({totals['images_per_sec']} şəkil/s).",
+        "stats": totals,
+    }
+
+
+@bp.cli.command("backfill")
+@click.option("--ids", default="", help="Vergüllə ayrılmış şəkil id-ləri (verilməsə: hələ analiz olunmamış hamısı)")
+@click.option("--batch-size", default=DETECT_BATCH_SIZE, show_default=True, type=int)
+@click.option("--describe", is_flag=True, help="Təsviri GPT ilə yarat (hər şəkil üçün API çağırışı)")
+def backfill_command(ids, batch_size, describe):
+    """Qalereya şəkilləri üçün toplu obyekt aşkarlama."""
+    db = get_db()
+    image_ids = _parse_ids(ids) or pending_image_ids(db)
+    if not image_ids:
+        click.echo("Analiz olunacaq şəkil yoxdur.")
+        return
+    try:
+        stats = run_batch_detection(
+            db, image_ids, current_app.config["UPLOAD_FOLDER"], current_app.config["DETECTIONS_FOLDER"],
+            batch_size=batch_size, describe=describe,
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(
+        f"{stats['images']} şəkil, {stats['detections']} obyekt, {stats['missing']} tapılmadı — "
+        f"{stats['seconds']} s ({stats['images_per_sec']} şəkil/s)"
+    )
+
+
+@jobs.handler("gallery_detection")
+def run_detection_job(payload: dict) -> dict:
+    """Fon işi: YOLO ilə obyektləri tapır, qutuları çəkir, GPT ilə təsvir edir və DB-yə yazır."""
+    import shutil
+
+    image_id = payload["image_id"]
+    image_path = os.path.join(current_app.config["UPLOAD_FOLDER"], payload["filename"])
+    db = get_db()
+
+    # Eyni fayl (fayl adı = məzmun heşi) başqa qalereya sətri üçün artıq analiz olunubsa, nəticəni təkrar istifadə et
+    previous = None
+    if media.content_hash(payload["filename"]) is not None:   # köhnə (təsadüfi/seed) adlar başqa məzmun ola bilər
+        previous = db.execute(
+            "SELECT d.detected_objects_json, d.gpt_description, d.result_image_path "
+            "FROM gallery_detections d JOIN gallery_images i ON i.id = d.image_id "
+            "WHERE i.filename = ? ORDER BY d.id DESC LIMIT 1",
+            (payload["filename"],)
+        ).fetchone()
+    if previous is not None and os.path.isfile(
+            os.path.join(current_app.config["DETECTIONS_FOLDER"], "gallery", previous["result_image_path"] or "")):
+        detected_objects = json.loads(previous["detected_objects_json"] or "[]")
+        gpt_description = previous["gpt_description"]
+        result_filename = previous["result_image_path"]
+    else:
+        # YOLO ilə obyektləri tap
+        detected_objects = detect_objects_with_gpt_vision(image_path)
+
+        # Qutular çək (əgər bbox varsa)
+        result_filename = f"detection_{secrets.token_hex(8)}.jpg"
+        result_path = os.path.join(current_app.config["DETECTIONS_FOLDER"], "gallery", result_filename)
+        os.makedirs(os.path.dirname(result_path), exist_ok=True)
+
+        if detected_objects and any("bbox" in obj for obj in detected_objects):
+            draw_boxes(image_path, detected_objects, result_path)
+        else:
+            # Bbox yoxdursa, orijinal şəkili kopyala
+            shutil.copy(image_path, result_path)
+
+        # GPT ilə təsvir et
+        gpt_description = describe_objects_with_gpt(detected_objects)
+
+    # DB-yə yaz
+    created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+    cursor = db.execute(
+        "INSERT INTO gallery_detections (image_id, detected_objects_json, gpt_description, result_image_path, created_at) VALUES (?, ?, ?, ?, ?)",
+        (image_id, json.dumps(detected_objects, ensure_ascii=False), gpt_description, result_filename,
+         created_at)
+    )
+    db.commit()
+    return {
+        "endpoint": "gallery_detection.detection_result",
+        "values": {"image_id": image_id, "result_id": cursor.lastrowid},
+        "message": "Detection uğurla tamamlandı!",
+    }
+
+
 @bp.route("/<int:image_id>/detect", methods=["GET", "POST"])
 def detect(image_id: int):
     """
     Şəkil üzərində obyekt tapma.
 
     GET: Detection başlatma formu
-    POST: GPT Vision ilə detection işlədir, qutular çəkir, GPT Chat ilə təsvir edir və DB-yə yazır
+    POST: Detection işini növbəyə qoyur (YOLO + qutular + GPT təsviri fon worker-ində işləyir)
     """
     db = get_db()
 
@@ -193,39 +483,12 @@ def detect(image_id: int):
 
     if request.method == "POST":
         try:
-            # Şəkil yolunu tap
-            image_path = os.path.join(current_app.config["UPLOAD_FOLDER"], image["filename"])
-
-            # GPT Vision ilə obyektləri tap
-            detected_objects = detect_objects_with_gpt_vision(image_path)
-
-            # Qutular çək (əgər bbox varsa)
-            result_filename = f"detection_{secrets.token_hex(8)}.jpg"
-            result_path = os.path.join(current_app.config["DETECTIONS_FOLDER"], "gallery", result_filename)
-            os.makedirs(os.path.dirname(result_path), exist_ok=True)
-
-            if detected_objects and any("bbox" in obj for obj in detected_objects):
-                draw_boxes(image_path, detected_objects, result_path)
-            else:
-                # Bbox yoxdursa, orijinal şəkili kopyala
-                import shutil
-                shutil.copy(image_path, result_path)
-
-            # GPT ilə təsvir et
-            gpt_description = describe_objects_with_gpt(detected_objects)
-
-            # DB-yə yaz
-            created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-            cursor = db.execute(
-                "INSERT INTO gallery_detections (image_id, detected_objects_json, gpt_description, result_image_path, created_at) VALUES (?, ?, ?, ?, ?)",
-                (image_id, json.dumps(detected_objects, ensure_ascii=False), gpt_description, result_filename,
-                 created_at)
+            # Detection işini növbəyə qoy
+            job_id = jobs.enqueue(
+                "gallery_detection", {"image_id": image_id, "filename": image["filename"]},
+                back_endpoint="gallery_detection.detect", back_values={"image_id": image_id},
             )
-            db.commit()
-
-            result_id = cursor.lastrowid
-            flash("Detection uğurla tamamlandı!", "success")
-            return redirect(url_for("gallery_detection.detection_result", image_id=image_id, result_id=result_id))
+            return redirect(url_for("jobs.status", job_id=job_id))
 
         except ValueError as e:
             flash(f"Xəta: {str(e)}", "error")
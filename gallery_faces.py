@@ -8,45 +8,65 @@ sonra GPT Chat API ilə şəkil təsviri və teqlər yaradır.
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from database import get_db
+import ai_cache
+import jobs
+import openai_client
+import media
+from thumbnails import file_hash
 import os
 import datetime
 import json
 import base64
-from dotenv import load_dotenv
 import re
 
-load_dotenv()
-
 bp = Blueprint("gallery_faces", __name__, url_prefix="/gallery")
 
-def get_gpt_api_key():
+# Vision API-yə göndərilən şəkil: uzun tərəf VISION_MAX_SIDE-a kiçildilir və JPEG kimi yenidən kodlanır.
+# gpt-4o-mini şəkli onsuz da ~768-2048 px-ə endirir; daha böyük fayl yalnız trafik, gecikmə və token xərcidir.
+VISION_MAX_SIDE = 1024
+VISION_JPEG_QUALITY = 85
+
+def prepare_vision_image(image_path: str, content_hash: str = None) -> bytes:
     """
-    Environment variable-dan GPT API açarını alır.
+    Şəkli Vision API üçün hazırlayır: EXIF oriyentasiyası, uzun tərəf ≤ VISION_MAX_SIDE, JPEG.
+    Nəticə məzmun heşinə görə CACHE_FOLDER/vision/ altında saxlanılır — eyni şəkil üçün
+    təkrar analizdə dekod/kodlama yenidən edilmir. `content_hash` (media / `gallery_images.content_hash`)
+    verilibsə fayl yenidən oxunub heşlənmir.
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY tapılmadı! .env faylına əlavə edin.")
-    return api_key
+    from PIL import Image, ImageOps
+
+    cache_dir = os.path.join(current_app.config["CACHE_FOLDER"], "vision")
+    content_hash = content_hash or file_hash(image_path)
+    key = f"{content_hash}_{VISION_MAX_SIDE}_{VISION_JPEG_QUALITY}.jpg"
+    cache_path = os.path.join(cache_dir, key[:2], key)
+    if os.path.isfile(cache_path):
+        with open(cache_path, "rb") as f:
+            return f.read()
+
+    with Image.open(image_path) as img:
+        img.draft("RGB", (VISION_MAX_SIDE, VISION_MAX_SIDE))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((VISION_MAX_SIDE, VISION_MAX_SIDE), Image.LANCZOS)
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp = cache_path + ".tmp"
+        img.save(tmp, format="JPEG", quality=VISION_JPEG_QUALITY, optimize=True)
+        os.replace(tmp, cache_path)
+    with open(cache_path, "rb") as f:
+        return f.read()
+
 
-def detect_faces_with_gpt_vision(image_path: str) -> int:
+def detect_faces_with_gpt_vision(image_path: str, content_hash: str = None) -> int:
     """
     GPT Vision API ilə şəkillərdə üzləri tapır.
-    Şəkili base64-ə çevirir, GPT Vision API çağırır, üz sayını parse edir.
+    Şəkili kiçildib (`prepare_vision_image`) base64-ə çevirir, GPT Vision API çağırır, üz sayını parse edir.
     """
     if not os.path.isfile(image_path):
         return 0
 
-    with open(image_path, "rb") as f:
-        image_data = f.read()
-    base64_image = base64.b64encode(image_data).decode("utf-8")
+    base64_image = base64.b64encode(prepare_vision_image(image_path, content_hash)).decode("utf-8")
+    image_url = f"data:image/jpeg;base64,{base64_image}"
 
-    ext = os.path.splitext(image_path)[1].lower()
-    mime = "image/jpeg" if ext in (".jpg", ".jpeg") else "image/png" if ext == ".png" else "image/jpeg"
-    image_url = f"data:{mime};base64,{base64_image}"
-
-    api_key = get_gpt_api_key()
-    from openai import OpenAI
-    client = OpenAI(api_key=api_key)
+    client = openai_client.get_client()
 
     try:
         response = client.chat.completions.create(
@@ -66,14 +86,13 @@ def detect_faces_with_gpt_vision(image_path: str) -> int:
     except Exception as e:
         raise ValueError(f"GPT Vision API xətası: {str(e)}")
 
+@ai_cache.cached("gallery_faces.describe", model="gpt-3.5-turbo")
 def generate_description_with_gpt(face_count: int) -> tuple:
     """
     GPT Chat API istifadə edərək şəkil təsviri və teqlər yaradır.
     Üz sayına əsasən prompt hazırlayır, təsvir və teqləri parse edir.
     """
-    api_key = get_gpt_api_key()
-    from openai import OpenAI
-    client = OpenAI(api_key=api_key)
+    client = openai_client.get_client()
 
     if face_count == 0:
         prompt = "Bu şəkildə üz yoxdur. Şəkil haqqında qısa təsvir və 5 teq yarat. Cavabı mütləq bu formatta ver: Təsvir: ... | Teqlər: tag1, tag2, tag3, tag4, tag5"
@@ -101,13 +120,57 @@ def generate_description_with_gpt(face_count: int) -> tuple:
     except Exception as e:
         raise ValueError(f"GPT Chat API xətası: {str(e)}")
 
+@jobs.handler("gallery_faces")
+def run_faces_job(payload: dict) -> dict:
+    """Fon işi: GPT Vision ilə üzləri tapır, GPT Chat ilə təsvir yaradır və DB-yə yazır."""
+    image_id = payload["image_id"]
+    image_path = os.path.join(current_app.config["UPLOAD_FOLDER"], payload["filename"])
+    db = get_db()
+
+    # Eyni fayl (fayl adı = məzmun heşi) başqa qalereya sətri üçün artıq analiz olunubsa, nəticəni təkrar istifadə et
+    previous = None
+    if media.content_hash(payload["filename"]) is not None:   # köhnə (təsadüfi/seed) adlar başqa məzmun ola bilər
+        previous = db.execute(
+            "SELECT f.face_count, f.gpt_description, f.gpt_tags "
+            "FROM gallery_faces f JOIN gallery_images i ON i.id = f.image_id "
+            "WHERE i.filename = ? ORDER BY f.id DESC LIMIT 1",
+            (payload["filename"],)
+        ).fetchone()
+    if previous is not None:
+        face_count, gpt_description, gpt_tags = previous["face_count"], previous["gpt_description"], previous["gpt_tags"]
+    else:
+        # Saxlanmış heş: məzmun-ünvanlı ad, köhnə adlar üçün qalereya sətrindəki content_hash
+        content_hash = media.content_hash(payload["filename"])
+        if content_hash is None:
+            row = db.execute("SELECT content_hash FROM gallery_images WHERE id = ?", (image_id,)).fetchone()
+            content_hash = row["content_hash"] if row else None
+
+        # GPT Vision ilə üzləri tap
+        face_count = detect_faces_with_gpt_vision(image_path, content_hash)
+
+        # GPT ilə təsvir və teqlər yarat
+        gpt_description, gpt_tags = generate_description_with_gpt(face_count)
+
+    # DB-yə yaz
+    created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+    cursor = db.execute(
+        "INSERT INTO gallery_faces (image_id, face_count, gpt_description, gpt_tags, created_at) VALUES (?, ?, ?, ?, ?)",
+        (image_id, face_count, gpt_description, gpt_tags, created_at)
+    )
+    db.commit()
+    return {
+        "endpoint": "gallery_faces.faces_result",
+        "values": {"image_id": image_id, "result_id": cursor.lastrowid},
+        "message": "Face detection uğurla tamamlandı!",
+    }
+
 @bp.route("/<int:image_id>/faces", methods=["GET", "POST"])
 def faces_detect(image_id: int):
     """
     Şəkil üzərində üz tapma.
     
     GET: Face detection başlatma formu
-    POST: GPT Vision ilə üzləri tapır, GPT Chat ilə təsvir yaradır və DB-yə yazır
+    POST: Üz tapma işini növbəyə qoyur (GPT Vision + GPT Chat fon worker-ində işləyir)
     """
     db = get_db()
     
@@ -119,26 +182,12 @@ def faces_detect(image_id: int):
     
     if request.method == "POST":
         try:
-            # Şəkil yolunu tap
-            image_path = os.path.join(current_app.config["UPLOAD_FOLDER"], image["filename"])
-            
-            # GPT Vision ilə üzləri tap
-            face_count = detect_faces_with_gpt_vision(image_path)
-            
-            # GPT ilə təsvir və teqlər yarat
-            gpt_description, gpt_tags = generate_description_with_gpt(face_count)
-            
-            # DB-yə yaz
-            created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-            cursor = db.execute(
-                "INSERT INTO gallery_faces (image_id, face_count, gpt_description, gpt_tags, created_at) VALUES (?, ?, ?, ?, ?)",
-                (image_id, face_count, gpt_description, gpt_tags, created_at)
+            # Üz tapma işini növbəyə qoy
+            job_id = jobs.enqueue(
+                "gallery_faces", {"image_id": image_id, "filename": image["filename"]},
+                back_endpoint="gallery_faces.faces_detect", back_values={"image_id": image_id},
             )
-            db.commit()
-            
-            result_id = cursor.lastrowid
-            flash("Face detection uğurla tamamlandı!", "success")
-            return redirect(url_for("gallery_faces.faces_result", image_id=image_id, result_id=result_id))
+            return redirect(url_for("jobs.status", job_id=job_id))
             
         except ValueError as e:
             flash(f"Xəta: {str(e)}", "error")
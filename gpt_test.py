@@ -1,9 +1,10 @@
-from openai import OpenAI
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+import openai_client  # noqa: E402 — parametrlər .env yükləndikdən sonra oxunur
+
 
 def test_all_apis():
     api_key = os.getenv("OPENAI_API_KEY")
@@ -11,7 +12,7 @@ def test_all_apis():
         print("❌ API açarı tapılmadı!")
         return False
 
-    client = OpenAI(api_key=api_key)
+    client = openai_client.get_client()
 
     # Test Chat API
     try:
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+jobs.py — AI/ML əməliyyatları üçün SQLite əsaslı fon iş növbəsi (job queue)
+
+Workshop 2 route-ları (OCR, TTS, Whisper, YOLO, GPT Vision) saniyələrlə çəkən işi request daxilində görmür:
+POST faylı saxlayır, `enqueue(...)` ilə iş yaradır və istifadəçini `/jobs/<id>` status səhifəsinə yönləndirir.
+İşi prosesdəki fon worker-ləri görür; nəticə hazır olanda status səhifəsi nəticə səhifəsinə keçir.
+
+- İş növləri `@handler("ad")` ilə qeydiyyata alınır; handler `payload` alır və nəticə lüğəti qaytarır:
+  {"endpoint": ..., "values": {...}, "message": ..., "session": {...}}. `session` — iş bitəndə
+  işin sahibinin sessiyasına yazılacaq açarlar (məs. `voted_<poll_id>`).
+- Handler nəticəni iş bitmədən `publish(result)` ilə dərc edə bilər (məs. TTS: audio hələ sintez olunur,
+  amma player səhifəsi artıq açıla bilər) — status səhifəsi dərhal nəticəyə keçir.
+- `ValueError` istifadəçi/konfiqurasiya xətasıdır (məs. API açarı yoxdur) — təkrarlanmır.
+  Digər xətalar (şəbəkə, timeout) eksponensial gecikmə ilə `JOB_MAX_ATTEMPTS` dəfəyə qədər təkrarlanır.
+- İş götürülərkən "lease" verilir: worker ölsə, `JOB_LEASE_S` saniyədən sonra iş başqa worker-ə keçir.
+  Worker-in yazdığı nəticə yalnız iş hələ onun götürməsidirsə (`attempts` dəyişməyibsə) qəbul olunur —
+  lease-i bitmiş gecikmiş worker yenidən götürülmüş işin vəziyyətini üstələmir.
+- JOB_WORKERS=0 olduqda veb proses iş görmür; işləri ayrıca `flask jobs work` prosesi görür.
+- `/jobs/<id>` yalnız işi yaradan sessiyaya görünür; nəticə (sessiya açarları, flash) bir dəfə tətbiq olunur
+  və iş `consumed_at` ilə işarələnir — səhifəni yeniləmək onu təkrarlamır.
+"""
+
+import datetime
+import json
+import os
+import secrets
+import threading
+import time
+import traceback
+
+import click
+from flask import Blueprint, current_app, flash, jsonify, redirect, render_template, session, url_for
+
+import database
+from database import get_db
+
+bp = Blueprint("jobs", __name__, url_prefix="/jobs")
+
+JOB_DEFAULTS = {
+    "JOB_WORKERS": int(os.getenv("JOB_WORKERS", "2")),            # veb prosesdəki fon worker thread-ləri
+    "JOB_MAX_ATTEMPTS": int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+    "JOB_RETRY_BASE_S": float(os.getenv("JOB_RETRY_BASE_S", "2")),  # 2, 4, 8 ... saniyə
+    "JOB_LEASE_S": float(os.getenv("JOB_LEASE_S", "600")),          # "running" iş bu qədər sonra yenidən götürülə bilər
+    "JOB_POLL_S": float(os.getenv("JOB_POLL_S", "1")),              # boş növbədə yoxlama intervalı
+}
+
+_handlers = {}
+_workers = []
+_workers_pid = None
+_workers_lock = threading.Lock()
+_wakeup = threading.Event()
+_current = threading.local()   # hazırda bu thread-də icra olunan iş və onun cəhd nömrəsi (publish üçün)
+
+
+def handler(kind: str):
+    """İş növü üçün icraçı funksiyanı qeydiyyata alır."""
+    def decorator(fn):
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+
+def _now() -> str:
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _config(app=None) -> dict:
+    app = app or current_app
+    return {key: app.config.get(key, value) for key, value in JOB_DEFAULTS.items()}
+
+
+def enqueue(kind: str, payload: dict, back_endpoint: str = None, back_values: dict = None) -> int:
+    """
+    Yeni iş yaradır və id-sini qaytarır. `back_endpoint`/`back_values` — iş uğursuz olanda
+    istifadəçinin qaytarılacağı səhifə (adətən formun özü).
+    """
+    if kind not in _handlers:
+        raise ValueError(f"Naməlum iş növü: {kind}")
+    payload = dict(payload, _back={"endpoint": back_endpoint, "values": back_values or {}})
+    owner = session.setdefault("voter_id", secrets.token_hex(8))
+    now = _now()
+    db = get_db(readonly=False)
+    cursor = db.execute(
+        "INSERT INTO jobs (kind, payload_json, status, max_attempts, run_after, owner, created_at, updated_at) "
+        "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+        (kind, json.dumps(payload, ensure_ascii=False), _config()["JOB_MAX_ATTEMPTS"], time.time(), owner, now, now),
+    )
+    db.commit()
+    _wakeup.set()
+    return cursor.lastrowid
+
+
+def _claim(conn, lease_s: float):
+    """Növbədən bir işi atomik götürür (BEGIN IMMEDIATE — eyni işi iki worker götürə bilməz)."""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE status IN ('queued', 'running') AND run_after <= ? "
+            "ORDER BY run_after, id LIMIT 1",
+            (now,),
+        ).fetchone()
+        if row is None:
+            conn.commit()
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, run_after = ?, updated_at = ? WHERE id = ?",
+            (now + lease_s, _now(), row["id"]),
+        )
+        job = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+        conn.commit()
+        return dict(job)
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _finish(conn, job_id: int, attempts: int, **fields) -> bool:
+    """
+    İşi yalnız bu götürmə (`attempts`) hələ aktivdirsə yeniləyir. Lease bitib iş başqa worker-ə
+    keçibsə, heç nə yazmır və False qaytarır.
+    """
+    fields["updated_at"] = _now()
+    sets = ", ".join(f"{key} = ?" for key in fields)
+    cursor = conn.execute(
+        f"UPDATE jobs SET {sets} WHERE id = ? AND attempts = ? AND status = 'running'",
+        (*fields.values(), job_id, attempts),
+    )
+    conn.commit()
+    return cursor.rowcount > 0
+
+
+def run_next(app) -> bool:
+    """Bir işi götürür və icra edir. Növbə boşdursa False qaytarır."""
+    cfg = _config(app)
+    pool = database.get_pool()
+    conn = pool.acquire()
+    try:
+        job = _claim(conn, cfg["JOB_LEASE_S"])
+    finally:
+        pool.release(conn)
+    if job is None:
+        return False
+
+    fn = _handlers.get(job["kind"])
+    try:
+        if job["attempts"] > job["max_attempts"]:
+            raise ValueError("İş bir neçə dəfə yarımçıq qaldı (worker dayandı).")
+        if fn is None:
+            raise ValueError(f"Naməlum iş növü: {job['kind']}")
+        _current.job_id, _current.attempts = job["id"], job["attempts"]
+        with app.app_context():
+            result = fn(json.loads(job["payload_json"]))
+        fields = {"status": "done", "result_json": json.dumps(result or {}, ensure_ascii=False), "error": None}
+    except ValueError as e:
+        fields = {"status": "failed", "error": str(e), "result_json": None}
+    except Exception as e:
+        if job["attempts"] < job["max_attempts"]:
+            delay = cfg["JOB_RETRY_BASE_S"] * (2 ** (job["attempts"] - 1))
+            fields = {"status": "queued", "run_after": time.time() + delay, "error": str(e), "result_json": None}
+        else:
+            fields = {"status": "failed", "error": str(e), "result_json": None}
+        app.logger.warning("Job %s (%s) attempt %s failed:\n%s",
+                           job["id"], job["kind"], job["attempts"], traceback.format_exc())
+    finally:
+        _current.job_id = _current.attempts = None
+
+    conn = pool.acquire()
+    try:
+        if not _finish(conn, job["id"], job["attempts"], **fields):
+            app.logger.warning("Job %s (%s) attempt %s finished after its lease expired; result discarded.",
+                               job["id"], job["kind"], job["attempts"])
+    finally:
+        pool.release(conn)
+    return True
+
+
+def publish(result: dict) -> None:
+    """
+    Handler daxilində: nəticəni iş bitmədən dərc edir. Status səhifəsi istifadəçini dərhal nəticə
+    səhifəsinə yönləndirir, handler isə qalan işi davam etdirir. Handler xəta ilə bitsə, dərc olunan
+    nəticə silinir (təkrar cəhddə yenidən dərc olunmalıdır).
+    """
+    job_id = getattr(_current, "job_id", None)
+    if job_id is None:
+        return
+    pool = database.get_pool()
+    conn = pool.acquire()
+    try:
+        _finish(conn, job_id, _current.attempts, result_json=json.dumps(result or {}, ensure_ascii=False))
+    finally:
+        pool.release(conn)
+
+
+def _worker_loop(app, stop=None):
+    poll_s = _config(app)["JOB_POLL_S"]
+    while stop is None or not stop.is_set():
+        try:
+            if run_next(app):
+                continue
+        except Exception:
+            app.logger.exception("Job worker error")
+        _wakeup.wait(poll_s)
+        _wakeup.clear()
+
+
+def start_workers(app):
+    """Prosesdə `JOB_WORKERS` fon thread-i başladır (bir dəfə; fork-dan sonra yenidən)."""
+    global _workers, _workers_pid
+    if _workers_pid == os.getpid():
+        return
+    with _workers_lock:
+        if _workers_pid == os.getpid():
+            return
+        _workers_pid = os.getpid()
+        _workers = []
+        for i in range(_config(app)["JOB_WORKERS"]):
+            t = threading.Thread(target=_worker_loop, args=(app,), name=f"job-worker-{i}", daemon=True)
+            t.start()
+            _workers.append(t)
+
+
+def init_app(app):
+    """Konfiqurasiya default-larını yazır; worker-lər ilk sorğuda başlayır (`jobs` cədvəli — database miqrasiyası)."""
+    for key, value in JOB_DEFAULTS.items():
+        app.config.setdefault(key, value)
+
+    @app.before_request
+    def _start_job_workers():
+        start_workers(app)
+
+
+def _is_owner(row) -> bool:
+    """İş bu sessiyanın işidirmi (id ardıcıl olduğu üçün başqasının nəticəsi id təxmin etməklə açılmasın)."""
+    return not row["owner"] or row["owner"] == session.get("voter_id")
+
+
+def _consume(job_id: int) -> bool:
+    """İşin nəticəsini istehlak olunmuş kimi işarələyir; yalnız ilk çağırışda True qaytarır."""
+    db = get_db(readonly=False)
+    cursor = db.execute("UPDATE jobs SET consumed_at = ? WHERE id = ? AND consumed_at IS NULL", (_now(), job_id))
+    db.commit()
+    return cursor.rowcount > 0
+
+
+def job_dict(row) -> dict:
+    job = dict(row)
+    job["payload"] = json.loads(job.pop("payload_json") or "{}")
+    job["result"] = json.loads(job.pop("result_json") or "null")
+    job["ready"] = job["status"] == "done" or (job["status"] == "running" and job["result"] is not None)
+    return job
+
+
+@bp.route("/<int:job_id>.json")
+def status_json(job_id: int):
+    """İşin vəziyyəti JSON kimi (polling üçün)."""
+    row = get_db().execute(
+        "SELECT id, kind, status, attempts, max_attempts, error, owner, created_at, updated_at, "
+        "(status = 'done' OR (status = 'running' AND result_json IS NOT NULL)) AS ready FROM jobs WHERE id = ?",
+        (job_id,),
+    ).fetchone()
+    if row is None or not _is_owner(row):
+        return jsonify({"error": "not found"}), 404
+    job = dict(row, ready=bool(row["ready"]))
+    del job["owner"]
+    return jsonify(job)
+
+
+@bp.route("/<int:job_id>")
+def status(job_id: int):
+    """
+    İşin status səhifəsi: gözləyərkən özünü yeniləyir; iş bitəndə (və ya nəticə dərc olunanda) nəticə səhifəsinə,
+    uğursuz olanda xəta ilə formun özünə yönləndirir. Sessiya açarları və mesaj yalnız ilk baxışda tətbiq olunur.
+    """
+    row = get_db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None or not _is_owner(row):
+        return render_template("404.html"), 404
+    job = job_dict(row)
+    back = job["payload"].get("_back") or {}
+    first_view = (job["ready"] or job["status"] == "failed") and job["consumed_at"] is None and _consume(job_id)
+
+    if job["ready"]:
+        result = job["result"] or {}
+        if first_view:
+            for key, value in (result.get("session") or {}).items():
+                session[key] = value
+            if result.get("message"):
+                flash(result["message"], "success")
+        if result.get("endpoint"):
+            return redirect(url_for(result["endpoint"], **(result.get("values") or {})))
+        return redirect(url_for("index"))
+
+    if job["status"] == "failed":
+        if first_view:
+            flash(f"Xəta: {job['error']}", "error")
+        if back.get("endpoint"):
+            return redirect(url_for(back["endpoint"], **back.get("values", {})))
+        return redirect(url_for("index"))
+
+    return render_template("jobs/status.html", job=job)
+
+
+@bp.cli.command("work")
+@click.option("--once", is_flag=True, help="Növbədəki işləri görüb çıx")
+def work_command(once):
+    """Ayrıca worker prosesi: növbədəki AI işlərini icra edir (veb prosesdə JOB_WORKERS=0 ilə)."""
+    app = current_app._get_current_object()
+    if once:
+        done = 0
+        while run_next(app):
+            done += 1
+        click.echo(f"{done} iş icra olundu.")
+        return
+    click.echo("Job worker işləyir (Ctrl+C ilə dayandırın)...")
+    _worker_loop(app)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+media.py — yüklənən fayllar üçün məzmun-ünvanlı (SHA-256) ortaq saxlama
+
+Qalereya, Blog OCR, Events Speech və Polls Speech yükləmələri `save_upload` ilə saxlanılır:
+fayl adı məzmunun heşidir (`<sha256>.<ext>`), eyni fayl ikinci dəfə yüklənəndə diskə yenidən
+yazılmır — `media_files` cədvəlində istinad sayı (refcount) artır. `release` sayı azaldır; son istinad
+gedəndə fayl commit-dən sonra `remove_if_unused` ilə silinir. `stage_upload` / `store_staged` ağır emalı
+(dekod, versiyalar) yazı tranzaksiyasından kənara çıxarmağa imkan verir.
+
+Fayl adı məzmunu təyin etdiyi üçün AI nəticələri də fayl adına görə təkrar istifadə oluna bilər
+(məs. eyni şəkil üçün əvvəlki OCR nəticəsi) — yalnız `content_hash(filename)` heş qaytaran adlar üçün;
+köhnə/seed adları (`placeholder.jpg` və s.) fərqli məzmun ola bilər.
+"""
+
+import datetime
+import hashlib
+import os
+import secrets
+
+from flask import current_app
+
+HASH_CHUNK = 1024 * 1024
+
+
+def stage_upload(file, default_ext: str = "jpg") -> dict:
+    """
+    Yüklənən faylı (werkzeug FileStorage) heşləyərək müvəqqəti fayla yazır — DB-yə toxunmur.
+    Qayıdır: {"tmp_path", "sha256", "size", "ext"}. Ağır emal (şəkil dekodu, versiyalar) `tmp_path` üzərində
+    tranzaksiyadan əvvəl edilə bilər; sonra `store_staged` ilə qısa tranzaksiyada saxlanılır.
+    """
+    ext = file.filename.rsplit(".", 1)[1].lower() if "." in (file.filename or "") else default_ext
+    tmp_path = os.path.join(current_app.config["UPLOAD_FOLDER"], f".upload-{secrets.token_hex(8)}.tmp")
+
+    h, size = hashlib.sha256(), 0
+    file.stream.seek(0)
+    with open(tmp_path, "wb") as out:
+        for chunk in iter(lambda: file.stream.read(HASH_CHUNK), b""):
+            h.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    return {"tmp_path": tmp_path, "sha256": h.hexdigest(), "size": size, "ext": ext}
+
+
+def store_staged(db, staged: dict) -> str:
+    """
+    `stage_upload`-un faylını kanonik adla saxlayır və fayl adını qaytarır. Eyni məzmun artıq varsa
+    yeni fayl yazılmır, yalnız istinad sayı artır (commit çağıran tərəfdədir).
+    """
+    sha256 = staged["sha256"]
+    # Əvvəl istinadı yaz (yazı kilidi paralel eyni yükləmələri ardıcıllaşdırır), sonra kanonik adı oxu:
+    # eyni məzmun fərqli genişlənmə ilə gəlsə də ilk saxlanan ad istifadə olunur.
+    db.execute(
+        "INSERT INTO media_files (sha256, filename, size, refcount, created_at) VALUES (?, ?, ?, 1, ?) "
+        "ON CONFLICT (sha256) DO UPDATE SET refcount = refcount + 1",
+        (sha256, f"{sha256}.{staged['ext']}", staged["size"], datetime.datetime.now().strftime("%Y-%m-%d %H:%M")),
+    )
+    filename = db.execute("SELECT filename FROM media_files WHERE sha256 = ?", (sha256,)).fetchone()["filename"]
+    final_path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
+    if os.path.exists(final_path):
+        os.remove(staged["tmp_path"])
+    else:
+        os.replace(staged["tmp_path"], final_path)
+    return filename
+
+
+def discard_staged(staged: dict) -> None:
+    """Saxlanmamış (`store_staged` çağırılmamış) müvəqqəti faylı silir."""
+    try:
+        os.remove(staged["tmp_path"])
+    except OSError:
+        pass
+
+
+def save_upload(db, file, default_ext: str = "jpg") -> str:
+    """`stage_upload` + `store_staged`: faylı heşləyib saxlayır və fayl adını qaytarır (commit çağıran tərəfdədir)."""
+    return store_staged(db, stage_upload(file, default_ext))
+
+
+def release(db, filename: str) -> bool:
+    """
+    Fayla bir istinadı buraxır (tranzaksiya daxilində; faylı silmir). Son istinad idisə True qaytarır —
+    onda `db.commit()` uğurlu olandan sonra `remove_if_unused` çağırılmalıdır. `media_files`-də olmayan
+    (köhnə, təsadüfi adlı) fayllar üçün də True.
+    """
+    row = db.execute("SELECT sha256, refcount FROM media_files WHERE filename = ?", (filename,)).fetchone()
+    if row is not None and row["refcount"] > 1:
+        db.execute("UPDATE media_files SET refcount = refcount - 1 WHERE sha256 = ?", (row["sha256"],))
+        return False
+    if row is not None:
+        db.execute("DELETE FROM media_files WHERE sha256 = ?", (row["sha256"],))
+    return True
+
+
+def remove_if_unused(db, filename: str) -> bool:
+    """
+    Commit-dən sonra: fayla artıq istinad yoxdursa (arada eyni məzmun yenidən yüklənməyibsə) diskdən silir.
+    Commit uğursuz olsa bu çağırılmır — sətir də, fayl da yerində qalır.
+    """
+    if db.execute("SELECT 1 FROM media_files WHERE filename = ?", (filename,)).fetchone() is not None:
+        return False
+    try:
+        os.remove(os.path.join(current_app.config["UPLOAD_FOLDER"], filename))
+    except OSError:
+        pass
+    return True
+
+
+def content_hash(filename: str):
+    """Məzmun-ünvanlı fayl adından SHA-256-nı qaytarır (köhnə təsadüfi adlar üçün None)."""
+    stem = filename.rsplit(".", 1)[0]
+    if len(stem) == 64 and all(c in "0123456789abcdef" for c in stem):
+        return stem
+    return None
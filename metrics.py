@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""
+metrics.py — sorğu səviyyəsində ölçmələr və Prometheus formatında `/metrics`
+
+Hər HTTP sorğusu üçün toplanır (endpoint üzrə):
+- gecikmə histoqramı (`campuslink_request_duration_seconds`) və status kodları üzrə sayğac;
+- SQL ifadələrinin sayı (`sqlite3` trace callback — implicit BEGIN/COMMIT və skriptlər də daxil) və
+  `execute` / `executemany` / `commit` vaxtı (hovuz bağlantıları `InstrumentedConnection`-dır);
+- şablon render vaxtı (Flask `before_render_template` / `template_rendered` siqnalları);
+- xarici AI (OpenAI) çağırışlarının vaxtı — ortaq httpx klientinin event hook-ları ilə
+  (cavab başlıqları gələnə qədər; axınla oxunan gövdə daxil deyil).
+
+Cavaba `Server-Timing` başlığı əlavə olunur (brauzerin DevTools-unda görünür).
+METRICS_SLOW_QUERY_MS-dən uzun SQL ifadələri `debug_log`-a WARNING kimi yazılır.
+METRICS_PROFILE_SLOW_MS > 0 olduqda hər sorğu cProfile altında icra olunur və bu həddən uzun çəkən
+sorğuların profili `<CACHE_FOLDER>/profiles/*.prof` faylına yazılır (`python -m pstats` / snakeviz ilə açılır).
+
+`/metrics` yalnız METRICS_TOKEN təyin olunduqda açıqdır (`?token=` və ya `Authorization: Bearer`);
+token verilməyibsə endpoint 403 qaytarır. Sayğaclar proses daxilindədir: bir neçə worker olduqda
+hər biri öz `/metrics`-ini verir.
+"""
+
+import cProfile
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from flask import (
+    Response, abort, before_render_template, current_app, g, has_request_context, request, template_rendered,
+)
+
+import database
+import debug_log
+
+METRICS_DEFAULTS = {
+    "METRICS_ENABLED": os.getenv("METRICS_ENABLED", "1") == "1",
+    "METRICS_TOKEN": os.getenv("METRICS_TOKEN", ""),                         # boşdursa /metrics bağlıdır (403)
+    "METRICS_SLOW_QUERY_MS": float(os.getenv("METRICS_SLOW_QUERY_MS", "100")),
+    "METRICS_PROFILE_SLOW_MS": float(os.getenv("METRICS_PROFILE_SLOW_MS", "0")),  # 0 — profil söndürülüb
+    "METRICS_PROFILE_DIR": os.getenv("METRICS_PROFILE_DIR", ""),             # boşdursa <CACHE_FOLDER>/profiles
+}
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+AI_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_config = dict(METRICS_DEFAULTS)
+_lock = threading.Lock()
+
+
+class Histogram:
+    """Prometheus histoqramı: hər bucket üçün sayğac (kumulyativ hesablama `render`-də), cəm və say."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+_request_latency = {}                 # (endpoint, method) -> Histogram
+_requests_total = defaultdict(int)    # (endpoint, method, status) -> n
+_endpoint_totals = defaultdict(lambda: {"sql_statements": 0, "sql_seconds": 0.0,
+                                        "template_seconds": 0.0, "ai_seconds": 0.0})
+_ai_latency = {}                      # (path, status) -> Histogram
+_counters = {"slow_queries": 0, "profiles_written": 0}
+
+
+class RequestStats:
+    __slots__ = ("start", "sql_count", "sql_time", "template_time", "template_depth", "template_start",
+                 "ai_time", "profiler")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.template_start = 0.0
+        self.ai_time = 0.0
+        self.profiler = None
+
+
+def _current():
+    return g.get("_metrics") if has_request_context() else None
+
+
+# --- SQL -------------------------------------------------------------------------------------------------
+
+def _on_statement(sql: str) -> None:
+    stats = _current()
+    if stats is not None:
+        stats.sql_count += 1
+
+
+def _record_sql(sql: str, elapsed: float) -> None:
+    stats = _current()
+    if stats is not None:
+        stats.sql_time += elapsed
+    if elapsed * 1000 >= _config["METRICS_SLOW_QUERY_MS"]:
+        with _lock:
+            _counters["slow_queries"] += 1
+        debug_log.event(
+            "slow_query", level=logging.WARNING, sql=" ".join(str(sql).split())[:500], ms=round(elapsed * 1000, 1),
+            endpoint=request.endpoint if has_request_context() else None,
+        )
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Hovuz bağlantısı: ifadələri trace callback ilə sayır, `execute`/`commit` vaxtını ölçür."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_trace_callback(_on_statement)
+
+    def execute(self, sql, parameters=(), /):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_sql(sql, time.perf_counter() - t0)
+
+    def executemany(self, sql, parameters, /):
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            _record_sql(sql, time.perf_counter() - t0)
+
+    def commit(self):
+        t0 = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            _record_sql("COMMIT", time.perf_counter() - t0)
+
+
+# --- Şablonlar ---------------------------------------------------------------------------------------------
+
+def _before_render(sender, template, context, **extra):
+    stats = _current()
+    if stats is not None:
+        if stats.template_depth == 0:
+            stats.template_start = time.perf_counter()
+        stats.template_depth += 1
+
+
+def _after_render(sender, template, context, **extra):
+    stats = _current()
+    if stats is not None and stats.template_depth > 0:
+        stats.template_depth -= 1
+        if stats.template_depth == 0:   # iç-içə render_template ikiqat sayılmasın
+            stats.template_time += time.perf_counter() - stats.template_start
+
+
+# --- AI (httpx) --------------------------------------------------------------------------------------------
+
+def _on_ai_request(req) -> None:
+    req.extensions["metrics_start"] = time.perf_counter()
+
+
+def _on_ai_response(resp) -> None:
+    start = resp.request.extensions.get("metrics_start")
+    if start is None or not _config["METRICS_ENABLED"]:
+        return
+    elapsed = time.perf_counter() - start
+    key = (resp.request.url.path, str(resp.status_code))
+    with _lock:
+        _ai_latency.setdefault(key, Histogram(AI_BUCKETS)).observe(elapsed)
+    stats = _current()
+    if stats is not None:
+        stats.ai_time += elapsed
+
+
+def httpx_event_hooks() -> dict:
+    """`httpx.Client(event_hooks=...)` üçün: hər AI sorğusunun vaxtını ölçür (openai_client istifadə edir)."""
+    return {"request": [_on_ai_request], "response": [_on_ai_response]}
+
+
+# --- Sorğu həyat dövrü ------------------------------------------------------------------------------------
+
+def _before_request():
+    stats = g._metrics = RequestStats()
+    if _config["METRICS_PROFILE_SLOW_MS"] > 0:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:   # başqa profiler artıq aktivdir
+            return
+        stats.profiler = profiler
+
+
+def _dump_profile(app, profiler, endpoint: str, elapsed: float) -> None:
+    folder = _config["METRICS_PROFILE_DIR"] or os.path.join(app.config["CACHE_FOLDER"], "profiles")
+    os.makedirs(folder, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    path = os.path.join(folder, f"{stamp}-{endpoint.replace('.', '_')}-{int(elapsed * 1000)}ms.prof")
+    profiler.dump_stats(path)
+    with _lock:
+        _counters["profiles_written"] += 1
+    debug_log.event("slow_request_profile", level=logging.WARNING, endpoint=endpoint,
+                    ms=round(elapsed * 1000, 1), path=path)
+
+
+def _after_request(response):
+    stats = g.get("_metrics")
+    if stats is None:
+        return response
+    elapsed = time.perf_counter() - stats.start
+    endpoint = request.endpoint or "<unmatched>"
+    with _lock:
+        _request_latency.setdefault((endpoint, request.method), Histogram(LATENCY_BUCKETS)).observe(elapsed)
+        _requests_total[(endpoint, request.method, str(response.status_code))] += 1
+        totals = _endpoint_totals[endpoint]
+        totals["sql_statements"] += stats.sql_count
+        totals["sql_seconds"] += stats.sql_time
+        totals["template_seconds"] += stats.template_time
+        totals["ai_seconds"] += stats.ai_time
+    if stats.profiler is not None and elapsed * 1000 >= _config["METRICS_PROFILE_SLOW_MS"]:
+        _dump_profile(current_app, stats.profiler, endpoint, elapsed)   # dump_stats profili özü dayandırır
+    response.headers["Server-Timing"] = (
+        f"app;dur={elapsed * 1000:.1f}, sql;dur={stats.sql_time * 1000:.1f};desc=\"{stats.sql_count} queries\", "
+        f"tpl;dur={stats.template_time * 1000:.1f}, ai;dur={stats.ai_time * 1000:.1f}"
+    )
+    return response
+
+
+def _teardown_request(exc):
+    # Hər çıxış yolunda işləyir (after_request-dəki istisna, ötürülən xəta daxil): aktiv profiler qalmasın
+    stats = g.pop("_metrics", None)
+    if stats is not None and stats.profiler is not None:
+        stats.profiler.disable()
+
+
+# --- Prometheus mətn formatı -------------------------------------------------------------------------------
+
+def _labels(**labels) -> str:
+    def esc(v):
+        return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels.items()) + "}"
+
+
+def _histogram_lines(name: str, series: dict, label_names: tuple) -> list:
+    lines = []
+    for key, hist in sorted(series.items()):
+        labels = dict(zip(label_names, key))
+        cumulative = 0
+        for bound, n in zip(hist.buckets, hist.counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_labels(**labels, le=f'{bound:g}')} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {hist.count}")
+        lines.append(f"{name}_sum{_labels(**labels)} {hist.sum:.6f}")
+        lines.append(f"{name}_count{_labels(**labels)} {hist.count}")
+    return lines
+
+
+def render() -> str:
+    """Bütün ölçmələr Prometheus text exposition formatında (0.0.4)."""
+    out = []
+
+    def metric(name, kind, help_text, lines):
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(lines)
+
+    with _lock:
+        metric("campuslink_request_duration_seconds", "histogram", "HTTP request latency by endpoint.",
+               _histogram_lines("campuslink_request_duration_seconds", _request_latency, ("endpoint", "method")))
+        metric("campuslink_requests_total", "counter", "HTTP requests by endpoint and status.",
+               [f"campuslink_requests_total{_labels(endpoint=e, method=m, status=s)} {n}"
+                for (e, m, s), n in sorted(_requests_total.items())])
+        for field, help_text in (
+            ("sql_statements", "SQL statements executed while serving requests."),
+            ("sql_seconds", "Time spent in SQL execute/commit while serving requests."),
+            ("template_seconds", "Time spent rendering templates."),
+            ("ai_seconds", "Time spent waiting for external AI API responses during requests."),
+        ):
+            name = f"campuslink_request_{field}_total"
+            metric(name, "counter", help_text,
+                   [f"{name}{_labels(endpoint=e)} {t[field]:g}" for e, t in sorted(_endpoint_totals.items())])
+        metric("campuslink_ai_request_duration_seconds", "histogram", "External AI API call latency (to response headers).",
+               _histogram_lines("campuslink_ai_request_duration_seconds", _ai_latency, ("path", "status")))
+        metric("campuslink_slow_queries_total", "counter", "SQL statements slower than METRICS_SLOW_QUERY_MS.",
+               [f"campuslink_slow_queries_total {_counters['slow_queries']}"])
+        metric("campuslink_profiles_written_total", "counter", "cProfile dumps written for slow requests.",
+               [f"campuslink_profiles_written_total {_counters['profiles_written']}"])
+
+    pool_lines = []
+    for pool, s in database.pool_stats().items():
+        for state in ("opened", "in_use", "idle"):
+            pool_lines.append(f"campuslink_db_pool_connections{_labels(pool=pool, state=state)} {s[state]}")
+    metric("campuslink_db_pool_connections", "gauge", "DB connection pool state.", pool_lines)
+    return "\n".join(out) + "\n"
+
+
+def metrics_view():
+    token = _config["METRICS_TOKEN"]
+    supplied = request.args.get("token") or request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not token or supplied != token:
+        abort(403)
+    return Response(render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+def reset() -> None:
+    """Bütün sayğacları sıfırlayır."""
+    with _lock:
+        _request_latency.clear()
+        _requests_total.clear()
+        _endpoint_totals.clear()
+        _ai_latency.clear()
+        for key in _counters:
+            _counters[key] = 0
+
+
+def init_app(app):
+    """Sorğu hook-larını, şablon siqnallarını, instrumentasiyalı DB bağlantılarını və `/metrics`-i qoşur."""
+    for key, value in METRICS_DEFAULTS.items():
+        app.config.setdefault(key, value)
+    _config.update({key: app.config[key] for key in METRICS_DEFAULTS})
+    if not _config["METRICS_ENABLED"]:
+        return
+    database.set_connection_factory(InstrumentedConnection)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+openai_client.py — bütün Workshop 2 modulları üçün ortaq OpenAI klienti
+
+Hər çağırışda `OpenAI(api_key=...)` yaratmaq HTTP bağlantı hovuzunu atır: hər sorğu yeni TCP + TLS
+əl sıxışması ilə başlayır. `get_client()` prosesdə bir dəfə klient yaradır və onu saxlayır;
+bağlantılar keep-alive ilə təkrar istifadə olunur.
+
+Parametrlər (.env — `app.py` başlanğıcda bir dəfə yükləyir):
+- OPENAI_API_KEY — API açarı (məcburi)
+- OPENAI_BASE_URL — başqa ünvan (məs. test üçün lokal stub server: http://127.0.0.1:8080/v1)
+- OPENAI_TIMEOUT_S / OPENAI_CONNECT_TIMEOUT_S — ümumi və bağlantı timeout-u
+- OPENAI_MAX_RETRIES — müvəqqəti xətalarda (429, 5xx, şəbəkə) təkrar cəhd sayı (SDK özü gözləyir)
+- OPENAI_MAX_CONNECTIONS / OPENAI_KEEPALIVE_S — hovuzun ölçüsü və boş bağlantının ömrü
+"""
+
+import os
+import threading
+
+import metrics
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_TIMEOUT_S = float(os.getenv("OPENAI_TIMEOUT_S", "60"))
+OPENAI_CONNECT_TIMEOUT_S = float(os.getenv("OPENAI_CONNECT_TIMEOUT_S", "5"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_S = float(os.getenv("OPENAI_KEEPALIVE_S", "30"))
+
+_client = None
+_client_key = None   # (pid, api_key, base_url): fork-dan və ya açar dəyişəndən sonra klient yenidən yaradılır
+_lock = threading.Lock()
+
+
+def get_api_key() -> str:
+    """
+    Environment variable-dan GPT API açarını alır.
+    """
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY tapılmadı! .env faylına əlavə edin.")
+    return api_key
+
+
+def _build_client(api_key: str):
+    import httpx
+    from openai import OpenAI
+
+    http_client = httpx.Client(
+        timeout=httpx.Timeout(OPENAI_TIMEOUT_S, connect=OPENAI_CONNECT_TIMEOUT_S),
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_S,
+        ),
+        event_hooks=metrics.httpx_event_hooks(),   # AI çağırışlarının vaxtı → /metrics
+    )
+    return OpenAI(
+        api_key=api_key,
+        base_url=OPENAI_BASE_URL,
+        max_retries=OPENAI_MAX_RETRIES,
+        timeout=httpx.Timeout(OPENAI_TIMEOUT_S, connect=OPENAI_CONNECT_TIMEOUT_S),
+        http_client=http_client,
+    )
+
+
+def get_client():
+    """Prosesin ortaq OpenAI klientini qaytarır (ilk çağırışda yaradılır; thread-safe)."""
+    global _client, _client_key
+    key = (os.getpid(), get_api_key(), OPENAI_BASE_URL)
+    if _client is not None and _client_key == key:
+        return _client
+    with _lock:
+        if _client is None or _client_key != key:
+            # Köhnə klient bağlanmır: başqa thread hələ onunla sorğu göndərə bilər
+            _client = _build_client(key[1])
+            _client_key = key
+    return _client
+
+
+def close_client() -> None:
+    """Klienti və onun bağlantı hovuzunu bağlayır (növbəti `get_client()` yenisini yaradır)."""
+    global _client, _client_key
+    with _lock:
+        if _client is not None and _client_key[0] == os.getpid():
+            _client.close()
+        _client = None
+        _client_key = None
@@ -1,11 +1,111 @@
 # -*- coding: utf-8 -*-
 
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from database import get_db
-import json, datetime, secrets
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app, jsonify
+from database import get_db, paginate_keyset
+from vote_buffer import VoteBuffer
+import os, json, datetime, secrets, threading, click
 
 bp = Blueprint("polls", __name__, url_prefix="/polls")
 ADMIN_PASS = "admin123"  # demo parol (yalnız dərs məqsədi üçün)
+PER_PAGE = 20
+
+# Səs buferinin default parametrləri; `app.config` və ya env ilə dəyişmək olar.
+# POLL_VOTE_BATCH_SIZE=0 buferi söndürür (hər səs dərhal öz tranzaksiyasında yazılır).
+VOTE_BUFFER_DEFAULTS = {
+    "POLL_VOTE_BATCH_SIZE": int(os.getenv("POLL_VOTE_BATCH_SIZE", "200")),   # bir tranzaksiyada maksimum səs
+    "POLL_VOTE_FLUSH_MS": int(os.getenv("POLL_VOTE_FLUSH_MS", "50")),        # ilk səsdən yazılışa qədər pəncərə
+    "POLL_VOTE_QUEUE_MAX": int(os.getenv("POLL_VOTE_QUEUE_MAX", "10000")),   # növbə dolu olanda backpressure
+}
+_vote_buffer = None
+_vote_buffer_lock = threading.Lock()
+
+# Xam səslər: düymə ilə (`poll_votes`) və səslə (`poll_speech_votes`) verilənlər.
+RAW_VOTES_SQL = """
+    SELECT poll_id, option_index FROM poll_votes
+    UNION ALL
+    SELECT poll_id, matched_option_index FROM poll_speech_votes WHERE matched_option_index >= 0
+"""
+
+
+def bump_tally(db, poll_id: int, option_index: int, n: int = 1):
+    """Səsin özü ilə eyni tranzaksiyada nəticəni artırır (commit çağıran tərəfdədir)."""
+    db.execute(
+        "INSERT INTO poll_tallies (poll_id, option_index, count) VALUES (?, ?, ?) "
+        "ON CONFLICT (poll_id, option_index) DO UPDATE SET count = count + excluded.count",
+        (poll_id, option_index, n),
+    )
+
+
+def rebuild_tallies(db, poll_id=None) -> int:
+    """`poll_tallies`-i xam səslərdən yenidən hesablayır (hamısı və ya bir sorğu üçün)."""
+    where, params = ("WHERE poll_id = ?", (poll_id,)) if poll_id is not None else ("", ())
+    db.execute(f"DELETE FROM poll_tallies {where}", params)
+    db.execute(
+        f"INSERT INTO poll_tallies (poll_id, option_index, count) "
+        f"SELECT poll_id, option_index, COUNT(*) FROM ({RAW_VOTES_SQL}) {where} GROUP BY poll_id, option_index",
+        params,
+    )
+    return db.execute(f"SELECT COALESCE(SUM(count), 0) FROM poll_tallies {where}", params).fetchone()[0]
+
+
+def verify_tallies(db) -> list:
+    """Xam səslərlə üst-üstə düşməyən nəticələr: [(poll_id, option_index, tally, actual), ...]."""
+    rows = db.execute(
+        f"""
+        WITH actual AS (
+            SELECT poll_id, option_index, COUNT(*) AS cnt FROM ({RAW_VOTES_SQL}) GROUP BY poll_id, option_index
+        )
+        SELECT a.poll_id, a.option_index, COALESCE(t.count, 0) AS tally, a.cnt AS actual
+        FROM actual a LEFT JOIN poll_tallies t ON t.poll_id = a.poll_id AND t.option_index = a.option_index
+        WHERE COALESCE(t.count, 0) != a.cnt
+        UNION ALL
+        SELECT t.poll_id, t.option_index, t.count, 0
+        FROM poll_tallies t
+        WHERE t.count != 0 AND NOT EXISTS (
+            SELECT 1 FROM actual a WHERE a.poll_id = t.poll_id AND a.option_index = t.option_index
+        )
+        """
+    ).fetchall()
+    return [tuple(r) for r in rows]
+
+
+def get_vote_buffer():
+    """Proses üzrə tək `VoteBuffer`; buferləmə söndürülübsə None."""
+    global _vote_buffer
+    cfg = {key: current_app.config.get(key, value) for key, value in VOTE_BUFFER_DEFAULTS.items()}
+    if cfg["POLL_VOTE_BATCH_SIZE"] <= 0:
+        return None
+    if _vote_buffer is None:
+        with _vote_buffer_lock:
+            if _vote_buffer is None:
+                _vote_buffer = VoteBuffer(
+                    batch_size=cfg["POLL_VOTE_BATCH_SIZE"],
+                    flush_ms=cfg["POLL_VOTE_FLUSH_MS"],
+                    max_queue=cfg["POLL_VOTE_QUEUE_MAX"],
+                    spill_path=os.path.join(current_app.config["CACHE_FOLDER"], "poll_votes.spill.jsonl"),
+                )
+    return _vote_buffer
+
+
+@bp.cli.command("rebuild-tallies")
+@click.option("--poll-id", type=int, default=None, help="Yalnız bu sorğu üçün")
+def rebuild_tallies_command(poll_id):
+    """Sorğu nəticələrini (poll_tallies) xam səslərdən yenidən hesablayır."""
+    db = get_db()
+    total = rebuild_tallies(db, poll_id)
+    db.commit()
+    click.echo(f"Tallies rebuilt: {total} votes.")
+
+
+@bp.cli.command("verify-tallies")
+def verify_tallies_command():
+    """poll_tallies-i xam səslərlə müqayisə edir; uyğunsuzluq varsa 1 kodu ilə çıxır."""
+    mismatches = verify_tallies(get_db())
+    for poll_id, option_index, tally, actual in mismatches:
+        click.echo(f"poll {poll_id} option {option_index}: tally={tally} actual={actual}")
+    if mismatches:
+        raise SystemExit(1)
+    click.echo("Tallies OK.")
 
 
 @bp.before_app_request
@@ -18,9 +118,11 @@ def ensure_session():
 @bp.route("/")
 def list_polls():
     db = get_db()
-    cursor = db.execute("SELECT * FROM polls ORDER BY id DESC")
-    polls = [dict(row) for row in cursor.fetchall()]
-    return render_template("polls/list.html", polls=polls)
+    rows, next_cursor, prev_cursor = paginate_keyset(
+        db, "SELECT * FROM polls", [], [], [("id", "DESC")], request.args.get("cursor", "").strip(), PER_PAGE
+    )
+    polls = [dict(row) for row in rows]
+    return render_template("polls/list.html", polls=polls, next_cursor=next_cursor, prev_cursor=prev_cursor)
 
 
 @bp.route("/new", methods=["GET", "POST"])
@@ -60,6 +162,15 @@ def new():
     return redirect(url_for("polls.list_polls"))
 
 
+@bp.route("/admin/vote-buffer")
+def vote_buffer_stats():
+    """Səs buferinin vəziyyəti: növbədəki, yazılmış, rədd edilmiş səslər və batch sayğacları."""
+    if request.args.get("password", "").strip() != ADMIN_PASS:
+        return jsonify({"error": "Görüntü üçün ?password=admin123 əlavə edin."}), 403
+    buffer = get_vote_buffer()
+    return jsonify(buffer.stats() if buffer is not None else {"enabled": False})
+
+
 @bp.route("/<int:poll_id>/toggle", methods=["GET", "POST"])
 def toggle(poll_id: int):
     # Get password from form (POST) or query parameter (GET)
@@ -70,8 +181,8 @@ def toggle(poll_id: int):
         flash("Admin parolu səhvdir.", "error")
         return redirect(url_for("polls.detail", poll_id=poll_id))
 
-    # DB UPDATE
-    db = get_db()
+    # DB UPDATE (GET also toggles, so ask for the writer explicitly)
+    db = get_db(readonly=False)
     db.execute("UPDATE polls SET is_closed = 1 - is_closed WHERE id=?", (poll_id,))
     db.commit()
 
@@ -113,11 +224,19 @@ def detail(poll_id: int):
         # Validate option_index
         if 0 <= idx < len(options):
             created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-            db.execute(
-                "INSERT INTO poll_votes (poll_id, option_index, created_at) VALUES (?, ?, ?)",
-                (poll_id, idx, created_at)
-            )
-            db.commit()
+            buffer = get_vote_buffer()
+            if buffer is not None:
+                # Səs buferə düşür və bir neçə ms ərzində digərləri ilə birlikdə bir tranzaksiyada yazılır
+                if not buffer.submit(poll_id, idx, created_at):
+                    flash("Hazırda çox səs gəlir, bir neçə saniyə sonra yenidən cəhd edin.", "error")
+                    return redirect(url_for("polls.detail", poll_id=poll_id))
+            else:
+                db.execute(
+                    "INSERT INTO poll_votes (poll_id, option_index, created_at) VALUES (?, ?, ?)",
+                    (poll_id, idx, created_at)
+                )
+                bump_tally(db, poll_id, idx)
+                db.commit()
             session[f"voted_{poll_id}"] = True
             flash("Səsiniz qeydə alındı!", "success")
             return redirect(url_for("polls.detail", poll_id=poll_id))
@@ -125,13 +244,12 @@ def detail(poll_id: int):
             flash("Yanlış seçim.", "error")
             return redirect(url_for("polls.detail", poll_id=poll_id))
 
-    # GET: Calculate results
+    # GET: Read materialized results (primary-key lookup, no scan over poll_votes)
     cursor = db.execute(
-        "SELECT option_index, COUNT(*) AS cnt FROM poll_votes WHERE poll_id=? GROUP BY option_index",
+        "SELECT option_index, count FROM poll_tallies WHERE poll_id=?",
         (poll_id,)
     )
-    votes = cursor.fetchall()
-    counts = {row["option_index"]: row["cnt"] for row in votes}
+    counts = {row["option_index"]: row["count"] for row in cursor.fetchall()}
     total = sum(counts.values()) if counts else 0
 
     # Build percentages list: (option_name, (count, percentage))
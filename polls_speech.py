@@ -8,25 +8,17 @@ sonra GPT Chat API ilə transkripti sorğu seçimlərinə uyğunlaşdırır.
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, session
 from database import get_db
+from polls import bump_tally
+import ai_cache
+import jobs
+import openai_client
+import media
 import os
 import datetime
-import secrets
 import json
-from dotenv import load_dotenv
-
-load_dotenv()
 
 bp = Blueprint("polls_speech", __name__, url_prefix="/polls")
 
-def get_gpt_api_key():
-    """
-    Environment variable-dan GPT API açarını alır.
-    """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY tapılmadı! .env faylına əlavə edin.")
-    return api_key
-
 def transcribe_audio_with_whisper(audio_path: str) -> str:
     """
     OpenAI Whisper API ilə audio faylından mətn çıxarır.
@@ -38,9 +30,7 @@ def transcribe_audio_with_whisper(audio_path: str) -> str:
     4. Transkript mətni qaytar
     
     Nümunə:
-    from openai import OpenAI
-    
-    client = OpenAI(api_key=get_gpt_api_key())
+    client = openai_client.get_client()
     with open(audio_path, "rb") as audio_file:
         transcript = client.audio.transcriptions.create(
             model="whisper-1",
@@ -52,6 +42,7 @@ def transcribe_audio_with_whisper(audio_path: str) -> str:
     # TODO: Tələbə burada kod yazmalıdır
     return "TODO: Whisper API çağırışı implement edilməlidir"
 
+@ai_cache.cached("polls_speech.match", model="gpt-3.5-turbo")
 def match_speech_to_poll_option(transcribed_text: str, options: list) -> int:
     """
     GPT Chat API istifadə edərək səs transkriptini sorğu seçimlərinə uyğunlaşdırır.
@@ -65,11 +56,9 @@ def match_speech_to_poll_option(transcribed_text: str, options: list) -> int:
     Nümunə prompt:
     "Bu mətn hansı seçimə uyğundur? Yalnız rəqəm qaytar (0, 1, 2, və s.).\n\nSeçimlər:\n{options}\n\nMətn: {transcribed_text}"
     """
-    api_key = get_gpt_api_key()
+    client = openai_client.get_client()
     
     # TODO: Tələbə burada kod yazmalıdır
-    # from openai import OpenAI
-    # client = OpenAI(api_key=api_key)
     # options_str = "\n".join([f"{i}. {opt}" for i, opt in enumerate(options)])
     # prompt = f"Bu mətn hansı seçimə uyğundur? Yalnız rəqəm qaytar (0, 1, 2, və s.).\n\nSeçimlər:\n{options_str}\n\nMətn: {transcribed_text}\n\nCavab: Yalnız indeks rəqəmi (0, 1, 2, ...)"
     # response = client.chat.completions.create(
@@ -95,13 +84,64 @@ def match_speech_to_poll_option(transcribed_text: str, options: list) -> int:
     
     return -1
 
+@jobs.handler("polls_speech")
+def run_speech_vote_job(payload: dict) -> dict:
+    """Fon işi: Whisper ilə transkript edir, GPT ilə seçimə uyğunlaşdırır və səsi yazır."""
+    poll_id = payload["poll_id"]
+    db = get_db()
+    poll = db.execute("SELECT options_json, is_closed FROM polls WHERE id = ?", (poll_id,)).fetchone()
+    if poll is None or poll["is_closed"]:
+        raise ValueError("Sorğu bağlıdır, səs vermək mümkün deyil.")
+    options = json.loads(poll["options_json"])
+    audio_path = os.path.join(current_app.config["UPLOAD_FOLDER"], payload["filename"])
+
+    # Eyni audio (fayl adı = məzmun heşi) artıq transkript olunubsa, onu təkrar istifadə et;
+    # eyni sorğu üçün uyğunlaşdırma nəticəsi də eynidir
+    previous = None
+    if media.content_hash(payload["filename"]) is not None:   # köhnə (təsadüfi/seed) adlar başqa məzmun ola bilər
+        previous = db.execute(
+            "SELECT poll_id, transcribed_text, matched_option_index FROM poll_speech_votes WHERE audio_filename = ? "
+            "ORDER BY poll_id = ? DESC, id DESC LIMIT 1",
+            (payload["filename"], poll_id)
+        ).fetchone()
+    if previous is not None:
+        transcribed_text = previous["transcribed_text"]
+    else:
+        # Whisper ilə transkript et
+        transcribed_text = transcribe_audio_with_whisper(audio_path)
+
+    if previous is not None and previous["poll_id"] == poll_id:
+        matched_option_index = previous["matched_option_index"]
+    else:
+        # GPT ilə seçimə uyğunlaşdır
+        matched_option_index = match_speech_to_poll_option(transcribed_text, options)
+
+    if matched_option_index < 0 or matched_option_index >= len(options):
+        raise ValueError("Seçim tapılmadı. Zəhmət olmasa yenidən cəhd edin.")
+
+    # DB-yə yaz
+    created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+    cursor = db.execute(
+        "INSERT INTO poll_speech_votes (poll_id, audio_filename, transcribed_text, matched_option_index, created_at) VALUES (?, ?, ?, ?, ?)",
+        (poll_id, payload["filename"], transcribed_text, matched_option_index, created_at)
+    )
+    bump_tally(db, poll_id, matched_option_index)
+    db.commit()
+    return {
+        "endpoint": "polls_speech.speech_result",
+        "values": {"poll_id": poll_id, "vote_id": cursor.lastrowid},
+        "message": "Səsiniz qeydə alındı!",
+        # Səs vermə qeydi iş bitəndə sahibinin sessiyasına yazılır
+        "session": {f"voted_{poll_id}": True},
+    }
+
 @bp.route("/<int:poll_id>/speech-vote", methods=["GET", "POST"])
 def speech_vote(poll_id: int):
     """
     Səs ilə sorğuya səs vermə.
     
     GET: Audio yükləmə formu
-    POST: Audio yükləyir, Whisper ilə transkript edir, GPT ilə uyğunlaşdırır və DB-yə yazır
+    POST: Audio yükləyir və səs işini növbəyə qoyur (Whisper + GPT fon worker-ində işləyir)
     """
     db = get_db()
     
@@ -134,38 +174,16 @@ def speech_vote(poll_id: int):
             flash("Audio faylı seçilməyib.", "error")
             return redirect(url_for("polls_speech.speech_vote", poll_id=poll_id))
         
-        # Audio faylını yüklə
-        ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else 'mp3'
-        filename = f"{secrets.token_hex(8)}.{ext}"
-        audio_path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
-        
         try:
-            file.save(audio_path)
+            # Audio faylını yüklə (məzmun-ünvanlı: eyni fayl yenidən yazılmır)
+            filename = media.save_upload(db, file, default_ext="mp3")
             
-            # Whisper ilə transkript et
-            transcribed_text = transcribe_audio_with_whisper(audio_path)
-            
-            # GPT ilə seçimə uyğunlaşdır
-            matched_option_index = match_speech_to_poll_option(transcribed_text, options)
-            
-            if matched_option_index < 0 or matched_option_index >= len(options):
-                flash("Seçim tapılmadı. Zəhmət olmasa yenidən cəhd edin.", "error")
-                return redirect(url_for("polls_speech.speech_vote", poll_id=poll_id))
-            
-            # DB-yə yaz
-            created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-            cursor = db.execute(
-                "INSERT INTO poll_speech_votes (poll_id, audio_filename, transcribed_text, matched_option_index, created_at) VALUES (?, ?, ?, ?, ?)",
-                (poll_id, filename, transcribed_text, matched_option_index, created_at)
+            # Transkripsiya + uyğunlaşdırma işini növbəyə qoy
+            job_id = jobs.enqueue(
+                "polls_speech", {"poll_id": poll_id, "filename": filename},
+                back_endpoint="polls_speech.speech_vote", back_values={"poll_id": poll_id},
             )
-            db.commit()
-            
-            # Səs vermə qeydini sessiyaya yaz
-            session[f"voted_{poll_id}"] = True
-            
-            vote_id = cursor.lastrowid
-            flash("Səsiniz qeydə alındı!", "success")
-            return redirect(url_for("polls_speech.speech_result", poll_id=poll_id, vote_id=vote_id))
+            return redirect(url_for("jobs.status", job_id=job_id))
             
         except ValueError as e:
             flash(f"Xəta: {str(e)}", "error")
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+query_audit.py — SQL sorğularının indeks istifadəsinin yoxlanması
+
+`flask db audit` layihə modullarındakı SQL ifadələrini mənbə kodundan (AST) toplayır —
+`db.execute("...")`, `executemany`, `paginate_keyset(db, "SELECT ...", ..., [("id", "DESC")], ...)` —
+və hər birini cari DB üzərində `EXPLAIN QUERY PLAN` ilə yoxlayır:
+
+- böyük cədvəldə tam skan (`SCAN <cədvəl>`, indekssiz) — xəta;
+- indeksi olmayan xarici açar (FOREIGN KEY) sütunu — xəta: valideyn silinəndə `ON DELETE CASCADE`
+  uşaq cədvəli tam skan edir (bu, EXPLAIN-də görünmür, ona görə sxemdən ayrıca yoxlanılır).
+
+Xəta varsa 1 kodu ilə çıxır (CI-da istifadə üçün). Kiçik "məlumat" cədvəlləri (SMALL_TABLES) istisnadır;
+`--min-rows N` ilə N-dən az sətri olan cədvəllər də kiçik sayılır (məs. real məlumatın surəti üzərində).
+Dəyişəndən/şərtdən qurulan (dinamik) ifadələr yoxlanılmır, sadəcə sayı göstərilir.
+"""
+
+import ast
+import os
+import pathlib
+import re
+import sqlite3
+
+import click
+
+import database
+
+# Admin tərəfindən əl ilə doldurulan, həmişə kiçik qalan cədvəllər: tam oxunması normaldır
+SMALL_TABLES = {"events", "polls", "schema_version"}
+DML_PREFIXES = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+EXCLUDED_MODULES = {"query_audit"}
+# Bütün cədvəli bilərəkdən oxuyan xidmət funksiyaları (backfill / yenidənqurma / yoxlama CLI-ları)
+FULL_SCAN_FUNCTIONS = {
+    ("blog", "rebuild_post_tags"),
+    ("polls", "verify_tallies"),
+    ("polls", "rebuild_tallies"),
+    ("gallery_detection", "pending_image_ids"),
+}
+
+_SCAN_RE = re.compile(r"^SCAN (\w+)$")
+_FROM_RE = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_BINDINGS_RE = re.compile(r"uses (\d+), and there are")
+_NOT_ALIASES = {"where", "join", "left", "inner", "cross", "on", "order", "group", "limit", "set", "values",
+                "using", "natural", "select", "union", "having", "default", "as"}
+
+
+def _module_strings(tree) -> dict:
+    """Modul səviyyəsində sabit sətir dəyişənləri (f-string-lərdə istifadə olunan sütun siyahıları və s.)."""
+    consts = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    consts[target.id] = node.value.value
+    return consts
+
+
+def _resolve(node, consts):
+    """Sətir ifadəsini statik hesablayır; mümkün deyilsə None."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left, right = _resolve(node.left, consts), _resolve(node.right, consts)
+        return left + right if left is not None and right is not None else None
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(value.value)
+            elif isinstance(value, ast.FormattedValue) and isinstance(value.value, ast.Name) and value.value.id in consts:
+                parts.append(consts[value.value.id])
+            else:
+                return None
+        return "".join(parts)
+    if isinstance(node, ast.Name) and node.id in consts:
+        return consts[node.id]
+    return None
+
+
+def _literal_conditions(node, consts) -> list:
+    """WHERE şərtlərinin statik hissəsi: `where + ["pinned = 0"]` → ["pinned = 0"] (dəyişənlər — opsional filtrlər)."""
+    if isinstance(node, ast.List):
+        return [c for c in (_resolve(elt, consts) for elt in node.elts) if c is not None]
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        return _literal_conditions(node.left, consts) + _literal_conditions(node.right, consts)
+    return []
+
+
+def _keyset_sql(call, consts):
+    """`paginate_keyset(db, select_sql, conditions, params, order_by, ...)` — ilk səhifənin sorğusu."""
+    if len(call.args) < 5:
+        return None
+    select_sql = _resolve(call.args[1], consts)
+    try:
+        order_by = ast.literal_eval(call.args[4])
+    except ValueError:
+        return None
+    if select_sql is None:
+        return None
+    conditions = _literal_conditions(call.args[2], consts)
+    where_sql = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"{select_sql}{where_sql} ORDER BY {', '.join(f'{expr} {d}' for expr, d in order_by)} LIMIT ?"
+
+
+class _Collector(ast.NodeVisitor):
+    def __init__(self, filename, consts):
+        self.filename, self.consts = filename, consts
+        self.function = None
+        self.statements, self.dynamic = [], 0
+
+    def visit_FunctionDef(self, node):
+        outer, self.function = self.function, self.function or node.name
+        self.generic_visit(node)
+        self.function = outer
+
+    def visit_Call(self, node):
+        func = node.func
+        func_name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", None)
+        sql = False
+        if node.args and func_name in ("execute", "executemany"):
+            sql = _resolve(node.args[0], self.consts)
+        elif node.args and func_name == "paginate_keyset":
+            sql = _keyset_sql(node, self.consts)
+        if sql is None:
+            self.dynamic += 1
+        elif sql and sql.lstrip().upper().startswith(DML_PREFIXES):
+            self.statements.append((self.filename, node.lineno, self.function, " ".join(sql.split())))
+        self.generic_visit(node)
+
+
+def extract_statements(root: str):
+    """Layihə modullarından SQL ifadələri: ([(fayl, sətir, funksiya, sql), ...], dinamik_ifadə_sayı)."""
+    statements, dynamic = [], 0
+    for name in sorted(os.listdir(root)):
+        if not name.endswith(".py") or name[:-3] in EXCLUDED_MODULES:
+            continue
+        with open(os.path.join(root, name), encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=name)
+        collector = _Collector(name, _module_strings(tree))
+        collector.visit(tree)
+        statements.extend(collector.statements)
+        dynamic += collector.dynamic
+    return statements, dynamic
+
+
+def _aliases(sql: str) -> dict:
+    aliases = {}
+    for table, alias in _FROM_RE.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in _NOT_ALIASES:
+            aliases[alias] = table
+    return aliases
+
+
+def explain(conn, sql: str) -> list:
+    """EXPLAIN QUERY PLAN sətirlərinin `detail` hissələri (parametrlər NULL ilə bağlanır)."""
+    params = ()
+    for _ in range(2):
+        try:
+            return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+        except sqlite3.ProgrammingError as exc:
+            match = _BINDINGS_RE.search(str(exc))
+            if not match:
+                raise
+            params = (None,) * int(match.group(1))
+    raise sqlite3.ProgrammingError(sql)
+
+
+def _bounded(sql: str, details: list) -> bool:
+    """`ORDER BY ... LIMIT` sıralı oxunuşla (temp B-tree olmadan) verilirsə, skan LIMIT-də dayanır."""
+    upper = sql.upper()
+    return ("ORDER BY" in upper and "LIMIT" in upper
+            and not any(d.startswith("USE TEMP B-TREE FOR ORDER BY") for d in details))
+
+
+def _table_rows(conn) -> dict:
+    names = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND sql NOT LIKE 'CREATE VIRTUAL%'"
+    )]
+    return {name: conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0] for name in names}
+
+
+def unindexed_foreign_keys(conn, tables) -> list:
+    """[(cədvəl, sütun, valideyn), ...] — sütunla başlayan indeksi olmayan xarici açarlar."""
+    missing = []
+    for table in tables:
+        leading = set()
+        for index in conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+            cols = conn.execute(f'PRAGMA index_info("{index[1]}")').fetchall()
+            if cols:
+                leading.add(min(cols, key=lambda c: c[0])[2])
+        for fk in conn.execute(f'PRAGMA foreign_key_list("{table}")').fetchall():
+            if fk[3] not in leading:
+                missing.append((table, fk[3], fk[2]))
+    return missing
+
+
+def audit(conn, root: str, min_rows: int = 0) -> dict:
+    """Bütün yoxlamalar: {"checked", "dynamic", "scans": [(fayl, sətir, cədvəl, sql)], "errors", "foreign_keys"}."""
+    rows = _table_rows(conn)
+    large = {t for t, n in rows.items() if t not in SMALL_TABLES and n >= min_rows}
+    statements, dynamic = extract_statements(root)
+    scans, errors = [], []
+    for filename, lineno, function, sql in statements:
+        if (filename[:-3], function) in FULL_SCAN_FUNCTIONS:
+            continue
+        try:
+            details = explain(conn, sql)
+        except sqlite3.Error as exc:
+            errors.append((filename, lineno, str(exc), sql))
+            continue
+        if _bounded(sql, details):
+            continue
+        aliases = _aliases(sql)
+        for detail in details:
+            match = _SCAN_RE.match(detail)
+            if match and aliases.get(match.group(1), match.group(1)) in large:
+                scans.append((filename, lineno, aliases.get(match.group(1), match.group(1)), sql))
+    return {
+        "checked": len(statements),
+        "dynamic": dynamic,
+        "scans": scans,
+        "errors": errors,
+        "foreign_keys": unindexed_foreign_keys(conn, rows),
+    }
+
+
+@click.command("audit")
+@click.option("--min-rows", default=0, show_default=True, help="Bundan az sətri olan cədvəllər kiçik sayılır")
+def audit_command(min_rows):
+    """SQL sorğularının planlarını yoxlayır: böyük cədvəldə tam skan və ya indekssiz FK varsa 1 kodu."""
+    pending = database.pending_migrations()
+    if pending:
+        click.echo(f"DİQQƏT: {len(pending)} miqrasiya tətbiq olunmayıb — `flask db upgrade`")
+    root = os.path.dirname(os.path.abspath(__file__))
+    conn = sqlite3.connect(pathlib.Path(database.DB_PATH).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        result = audit(conn, root, min_rows)
+    finally:
+        conn.close()
+
+    for filename, lineno, table, sql in result["scans"]:
+        click.echo(f"SCAN {table:<24} {filename}:{lineno}  {sql[:120]}")
+    for table, column, parent in result["foreign_keys"]:
+        click.echo(f"FK   {table}.{column} -> {parent}: indeks yoxdur (ON DELETE CASCADE tam skan edir)")
+    for filename, lineno, message, sql in result["errors"]:
+        click.echo(f"ERR  {filename}:{lineno}  {message}  {sql[:120]}")
+    click.echo(f"{result['checked']} sorğu yoxlanıldı, {result['dynamic']} dinamik sorğu ötürüldü.")
+    if result["scans"] or result["foreign_keys"] or result["errors"]:
+        raise SystemExit(1)
+    click.echo("Query plan OK.")
+
+
+def init_app(app):
+    """`flask db audit` əmrini qeydiyyata alır."""
+    database.db_cli.add_command(audit_command)
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+search.py — SQLite FTS5 əsaslı tam mətn axtarışı üçün ümumi köməkçilər
+
+- Azərbaycan hərflərinə uyğun "fold": ə→e, ı/I/İ→i, ö→o, ü→u, ğ→g, ş→s, ç→c və kiçik hərf.
+  İndeksə yazarkən ə/ı/İ SQL `replace()` ilə, qalanları `unicode61 remove_diacritics 2` tokenizer-i ilə edilir;
+  sorğu və snippet tərəfində eyni çevirmə Python-da (`az_fold`) edilir.
+- Forum: `forum_search` FTS5 cədvəli mövzuları (rowid = id*2) və cavabları (rowid = id*2+1) saxlayır,
+  trigger-lər onu `forum_topics` / `forum_replies` ilə sinxron saxlayır.
+- Blog: `blog_search` FTS5 cədvəli (rowid = blog_posts.id) başlıq və məzmunu saxlayır.
+"""
+
+import re
+import sqlite3
+import unicodedata
+
+from markupsafe import Markup, escape
+
+from database import run_script
+
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+
+_AZ_FOLD = {"ə": "e", "Ə": "e", "ı": "i", "I": "i", "İ": "i"}
+
+
+def _fold_char(ch: str) -> str:
+    if ch in _AZ_FOLD:
+        return _AZ_FOLD[ch]
+    base = unicodedata.normalize("NFD", ch)[0]
+    low = base.lower()
+    return low if len(low) == 1 else ch
+
+
+def az_fold(text: str) -> str:
+    """Mətni axtarış üçün normallaşdırır; uzunluğu dəyişmir (snippet mövqeləri üçün vacibdir)."""
+    return "".join(_fold_char(ch) for ch in (text or ""))
+
+
+def fold_sql(expr: str) -> str:
+    """İndeksə yazılan dəyər üçün SQL ifadəsi: tokenizer-in bilmədiyi ə/ı/İ hərflərini əvəz edir."""
+    for src, dst in (("Ə", "e"), ("ə", "e"), ("İ", "i"), ("ı", "i")):
+        expr = f"replace({expr}, '{src}', '{dst}')"
+    return expr
+
+
+def query_terms(q: str) -> list:
+    """İstifadəçi sorğusunu normallaşdırılmış sözlərə bölür."""
+    return re.findall(r"\w+", az_fold(q))
+
+
+def build_match_query(q: str) -> str:
+    """
+    FTS5 MATCH ifadəsi: hər söz prefiks kimi axtarılır ("pyth" → "python"), sözlər AND ilə birləşir.
+    Sözlər dırnaqda olduğu üçün istifadəçi FTS5 operatorları (OR, NEAR, *) yaza bilməz.
+    """
+    return " ".join(f'"{t}"*' for t in query_terms(q))
+
+
+def make_snippet(text: str, terms: list, width: int = 160) -> Markup:
+    """
+    Orijinal mətndən ilk uyğunluğun ətrafında `width` simvolluq parça kəsir və sözləri <mark> ilə işarələyir.
+    """
+    text = text or ""
+    folded = az_fold(text)
+    spans = []
+    for term in terms:
+        for m in re.finditer(r"\b" + re.escape(term) + r"\w*", folded):
+            spans.append((m.start(), m.end()))
+    spans.sort()
+
+    start = 0
+    if spans and spans[0][0] > width // 3:
+        start = spans[0][0] - width // 3
+    end = min(len(text), start + width)
+
+    out = [Markup("…")] if start > 0 else []
+    pos = start
+    for s, e in spans:
+        if s < pos or s >= end:
+            continue
+        e = min(e, end)
+        out.append(escape(text[pos:s]))
+        out.append(Markup("<mark>") + escape(text[s:e]) + Markup("</mark>"))
+        pos = e
+    out.append(escape(text[pos:end]))
+    if end < len(text):
+        out.append(Markup("…"))
+    return Markup("").join(out)
+
+
+def _forum_search_schema() -> str:
+    topic_title, topic_body = fold_sql("new.title"), fold_sql("new.content")
+    reply_body = fold_sql("new.content")
+    return f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS forum_search USING fts5(
+            title, body, topic_id UNINDEXED, tokenize = '{FTS_TOKENIZER}'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS forum_topics_search_ai AFTER INSERT ON forum_topics BEGIN
+            INSERT INTO forum_search (rowid, title, body, topic_id)
+            VALUES (new.id * 2, {topic_title}, {topic_body}, new.id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS forum_topics_search_au AFTER UPDATE OF title, content ON forum_topics BEGIN
+            UPDATE forum_search SET title = {topic_title}, body = {topic_body} WHERE rowid = new.id * 2;
+        END;
+        CREATE TRIGGER IF NOT EXISTS forum_topics_search_ad AFTER DELETE ON forum_topics BEGIN
+            DELETE FROM forum_search WHERE rowid = old.id * 2;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS forum_replies_search_ai AFTER INSERT ON forum_replies BEGIN
+            INSERT INTO forum_search (rowid, title, body, topic_id)
+            VALUES (new.id * 2 + 1, '', {reply_body}, new.topic_id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS forum_replies_search_au AFTER UPDATE OF content ON forum_replies BEGIN
+            UPDATE forum_search SET body = {reply_body} WHERE rowid = new.id * 2 + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS forum_replies_search_ad AFTER DELETE ON forum_replies BEGIN
+            DELETE FROM forum_search WHERE rowid = old.id * 2 + 1;
+        END;
+    """
+
+
+def rebuild_forum_search(db) -> int:
+    """`forum_search` indeksini sıfırdan doldurur (backfill). İndekslənmiş sənəd sayını qaytarır."""
+    db.execute("DELETE FROM forum_search")
+    db.execute(
+        f"INSERT INTO forum_search (rowid, title, body, topic_id) "
+        f"SELECT id * 2, {fold_sql('title')}, {fold_sql('content')}, id FROM forum_topics"
+    )
+    db.execute(
+        f"INSERT INTO forum_search (rowid, title, body, topic_id) "
+        f"SELECT id * 2 + 1, '', {fold_sql('content')}, topic_id FROM forum_replies"
+    )
+    db.execute("INSERT INTO forum_search (forum_search) VALUES ('optimize')")
+    return db.execute("SELECT COUNT(*) FROM forum_search").fetchone()[0]
+
+
+def fts_table_exists(db, table: str) -> bool:
+    """FTS5 cədvəli yaradılıbmı (miqrasiya FTS5-siz SQLite-da onu keçir)."""
+    return db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+def _ensure_fts(db, table: str, schema_sql: str, rebuild) -> bool:
+    """
+    FTS5 cədvəlini və trigger-ləri yaradır; cədvəl yeni yaranıbsa mövcud məlumatla doldurur.
+    Çağıranın tranzaksiyası daxilində işləyir (commit çağıran tərəfdədir).
+    SQLite FTS5-siz yığılıbsa yarımçıq dəyişiklikləri geri alır və False qaytarır.
+    """
+    existed = fts_table_exists(db, table)
+    db.execute("SAVEPOINT fts_schema")
+    try:
+        run_script(db, schema_sql)
+    except sqlite3.OperationalError as e:
+        db.execute("ROLLBACK TO fts_schema")
+        db.execute("RELEASE fts_schema")
+        if "fts5" in str(e).lower():
+            return False
+        raise
+    db.execute("RELEASE fts_schema")
+    if not existed:
+        rebuild(db)
+    return True
+
+
+def ensure_forum_search(db) -> bool:
+    """Forum FTS5 indeksi (`_ensure_fts`); FTS5 yoxdursa False — forum onda LIKE axtarışına qayıdır."""
+    return _ensure_fts(db, "forum_search", _forum_search_schema(), rebuild_forum_search)
+
+
+def search_forum(db, q: str, limit: int, offset: int = 0) -> list:
+    """
+    Mövzuları bm25 reytinqinə görə qaytarır (başlıq uyğunluğu 10x ağırlıqlı).
+    Cavabda tapılan uyğunluq öz mövzusunu qaldırır; hər mövzu üçün ən yaxşı sənədin rowid-i də qaytarılır
+    (MIN() ilə seçilən "bare" sütun SQLite-da həmin sətirdən götürülür). bm25() yalnız MATCH edən sorğuda
+    işlədiyi üçün CTE MATERIALIZED-dir (flatten olunmur).
+
+    Qayıdır: [(topic_id, score, best_rowid), ...]
+    """
+    match = build_match_query(q)
+    if not match:
+        return []
+    rows = db.execute(
+        """
+        WITH hits AS MATERIALIZED (
+            SELECT topic_id, rowid AS rid, bm25(forum_search, 10.0, 1.0) AS score
+            FROM forum_search
+            WHERE forum_search MATCH ?
+        )
+        SELECT topic_id, MIN(score) AS score, rid
+        FROM hits
+        GROUP BY topic_id
+        ORDER BY score
+        LIMIT ? OFFSET ?
+        """,
+        (match, limit, offset),
+    ).fetchall()
+    return [(r["topic_id"], r["score"], r["rid"]) for r in rows]
+
+
+def _blog_search_schema() -> str:
+    title, body = fold_sql("new.title"), fold_sql("new.content")
+    return f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS blog_search USING fts5(
+            title, body, tokenize = '{FTS_TOKENIZER}'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS blog_posts_search_ai AFTER INSERT ON blog_posts BEGIN
+            INSERT INTO blog_search (rowid, title, body) VALUES (new.id, {title}, {body});
+        END;
+        CREATE TRIGGER IF NOT EXISTS blog_posts_search_au AFTER UPDATE OF title, content ON blog_posts BEGIN
+            UPDATE blog_search SET title = {title}, body = {body} WHERE rowid = new.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS blog_posts_search_ad AFTER DELETE ON blog_posts BEGIN
+            DELETE FROM blog_search WHERE rowid = old.id;
+        END;
+    """
+
+
+def rebuild_blog_search(db) -> int:
+    """`blog_search` indeksini sıfırdan doldurur (backfill). İndekslənmiş yazı sayını qaytarır."""
+    db.execute("DELETE FROM blog_search")
+    db.execute(
+        f"INSERT INTO blog_search (rowid, title, body) "
+        f"SELECT id, {fold_sql('title')}, {fold_sql('content')} FROM blog_posts"
+    )
+    db.execute("INSERT INTO blog_search (blog_search) VALUES ('optimize')")
+    return db.execute("SELECT COUNT(*) FROM blog_search").fetchone()[0]
+
+
+def ensure_blog_search(db) -> bool:
+    """`ensure_forum_search` kimi, blog üçün: yaradır, ilk dəfə doldurur; FTS5 yoxdursa False."""
+    return _ensure_fts(db, "blog_search", _blog_search_schema(), rebuild_blog_search)
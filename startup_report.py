@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+startup_report.py — tətbiqin başlanğıc (cold start) vaxtının hesabatı
+
+`flask startup-report` tətbiqi ayrıca prosesdə `python -X importtime` ilə başladır
+(`import app` + `create_app()`), import vaxtlarını modullar üzrə toplayır və göstərir:
+- layihə modulları (öz vaxtı və kumulyativ),
+- ən ağır xarici paketlər,
+- başlanğıcda import olunmamalı ağır ML asılılıqlarının (openai, cv2, ultralytics, numpy, Pillow)
+  tətbiq açılarkən artıq yüklənib-yüklənmədiyi (onlar yalnız ilk istifadədə import olunmalıdır).
+"""
+
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+import click
+
+LAZY_MODULES = ("openai", "httpx", "cv2", "ultralytics", "numpy", "PIL")
+
+_PROBE = (
+    "import json, sys, time\n"
+    "t0 = time.perf_counter()\n"
+    "import app\n"
+    "t1 = time.perf_counter()\n"
+    "app.create_app()\n"
+    "t2 = time.perf_counter()\n"
+    "print(json.dumps({'import_s': t1 - t0, 'create_app_s': t2 - t1}))\n"
+)
+
+
+def _project_modules(root: str) -> set:
+    return {name[:-3] for name in os.listdir(root) if name.endswith(".py")}
+
+
+def parse_importtime(stderr: str) -> list:
+    """`-X importtime` çıxışı: [(modul, öz_vaxtı_us, kumulyativ_us), ...] (import sırası ilə)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # başlıq sətri
+        rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return rows
+
+
+def collect(root: str) -> dict:
+    """Tətbiqi ayrıca prosesdə başladır və hesabat üçün xam məlumatı qaytarır."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE],
+        cwd=root, capture_output=True, text=True, env=dict(os.environ, JOB_WORKERS="0"),
+    )
+    if proc.returncode != 0:
+        raise click.ClickException(f"Tətbiq başlaya bilmədi:\n{proc.stderr[-2000:]}")
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {"timings": timings, "imports": parse_importtime(proc.stderr)}
+
+
+@click.command("startup-report")
+@click.option("--top", default=15, show_default=True, help="Neçə modul/paket göstərilsin")
+def startup_report_command(top):
+    """Başlanğıc vaxtı: `-X importtime` ilə modullar üzrə import vaxtları və create_app() müddəti."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    data = collect(root)
+    timings, imports = data["timings"], data["imports"]
+    project = _project_modules(root)
+
+    click.echo(f"import app:    {timings['import_s'] * 1000:8.1f} ms")
+    click.echo(f"create_app():  {timings['create_app_s'] * 1000:8.1f} ms")
+    click.echo(f"Modul sayı:    {len(imports)}")
+
+    own = sorted((r for r in imports if r[0] in project), key=lambda r: r[2], reverse=True)
+    click.echo("\nLayihə modulları (kumulyativ / öz vaxtı, ms):")
+    for name, self_us, cum_us in own[:top]:
+        click.echo(f"  {cum_us / 1000:8.1f}  {self_us / 1000:8.1f}  {name}")
+
+    packages = defaultdict(int)
+    for name, self_us, _ in imports:
+        package = name.split(".")[0]
+        if package not in project:
+            packages[package] += self_us
+    click.echo("\nXarici paketlər (öz vaxtlarının cəmi, ms):")
+    for package, self_us in sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+        click.echo(f"  {self_us / 1000:8.1f}  {package}")
+
+    eager = sorted({name.split(".")[0] for name, _, _ in imports} & set(LAZY_MODULES))
+    if eager:
+        click.echo(f"\nDİQQƏT: başlanğıcda yüklənən ağır asılılıqlar: {', '.join(eager)} "
+                   "(ilk istifadəyə qədər import edilməməlidir)")
+    else:
+        click.echo("\nAğır ML asılılıqları başlanğıcda yüklənmir.")
+
+
+def init_app(app):
+    """`flask startup-report` əmrini qeydiyyata alır."""
+    app.cli.add_command(startup_report_command)
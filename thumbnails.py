@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+thumbnails.py — qalereya şəkilləri üçün kiçildilmiş (responsive) versiyalar
+
+Yükləmə zamanı orijinaldan bir neçə enlikdə (THUMB_WIDTHS) WebP versiyalar yaradılır və
+məzmun heşinə görə saxlanılır: static/thumbs/<hash[:2]>/<hash>_<en>.webp.
+Eyni fayl iki dəfə yüklənsə, versiyalar bir dəfə yaradılır və paylaşılır.
+
+Şablonlar `thumb_src(img, en)` və `thumb_srcset(img)` ilə lazımi ölçünü seçir; hansı versiyaların
+mövcud olduğu DB-dəki `width` sütunundan hesablanır (diskə baxmadan).
+
+Pillow yalnız versiya yaradılanda import olunur (tətbiqin başlanğıcını yavaşlatmır).
+"""
+
+import functools
+import hashlib
+import os
+
+THUMB_WIDTHS = (320, 640, 1280)
+THUMB_QUALITY = 80
+THUMBS_DIR = os.path.join(os.path.dirname(__file__), "static", "thumbs")
+
+
+@functools.lru_cache(maxsize=None)
+def thumb_format() -> str:
+    """"webp" (Pillow WebP dəstəyi varsa) və ya "jpeg"."""
+    from PIL import features
+    return "webp" if features.check("webp") else "jpeg"
+
+
+def file_hash(path: str) -> str:
+    """Faylın SHA-256 heşi (hissə-hissə oxunur)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def available_widths(orig_width) -> list:
+    """
+    Orijinalın enliyinə görə mövcud versiyalar: [(ad_enliyi, faktiki_enlik), ...].
+    Böyütmə edilmir; ən kiçik versiya həmişə var (kiçik şəkildə faktiki enlik orijinalınkıdır).
+    """
+    orig_width = int(orig_width or 0)
+    out = [(w, w) for w in THUMB_WIDTHS if w < orig_width]
+    if not out:
+        smallest = THUMB_WIDTHS[0]
+        out = [(smallest, min(smallest, orig_width) if orig_width else smallest)]
+    return out
+
+
+def thumb_relpath(content_hash: str, width: int) -> str:
+    """`static/` qovluğuna nisbətən yol (url_for('static', filename=...) üçün)."""
+    ext = "webp" if thumb_format() == "webp" else "jpg"
+    return f"thumbs/{content_hash[:2]}/{content_hash}_{width}.{ext}"
+
+
+def _thumb_path(content_hash: str, width: int) -> str:
+    return os.path.join(os.path.dirname(THUMBS_DIR), *thumb_relpath(content_hash, width).split("/"))
+
+
+def make_derivatives(src_path: str, content_hash: str = None, force: bool = False) -> dict:
+    """
+    Orijinaldan bütün versiyaları yaradır (artıq varsa keçir).
+    Qayıdır: {"content_hash", "width", "height", "created"} — `created` yeni yazılan fayl sayıdır.
+    """
+    from PIL import Image, ImageOps
+
+    content_hash = content_hash or file_hash(src_path)
+    fmt = thumb_format()
+    created = 0
+    with Image.open(src_path) as img:
+        img = ImageOps.exif_transpose(img)
+        width, height = img.size
+        targets = [(name, _thumb_path(content_hash, name)) for name, _ in available_widths(width)]
+        todo = [(name, path) for name, path in targets if force or not os.path.exists(path)]
+        if todo:
+            # Böyükdən kiçiyə: hər versiya əvvəlkindən kiçildilir (orijinal bir dəfə dekod olunur)
+            mode = "RGBA" if fmt == "webp" and img.mode in ("RGBA", "LA", "P") else "RGB"
+            work = img.convert(mode)
+            for name, path in sorted(todo, reverse=True):
+                work.thumbnail((name, name * 10), Image.LANCZOS)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = path + ".tmp"
+                if fmt == "webp":
+                    work.save(tmp, format="WEBP", quality=THUMB_QUALITY, method=4)
+                else:
+                    work.save(tmp, format="JPEG", quality=THUMB_QUALITY, optimize=True)
+                os.replace(tmp, path)
+                created += 1
+    return {"content_hash": content_hash, "width": width, "height": height, "created": created}
+
+
+def remove_derivatives(content_hash: str) -> None:
+    """Bu heşə aid bütün versiyaları silir (heç bir şəkil sətri ona istinad etmirsə çağırılır)."""
+    for name in THUMB_WIDTHS:
+        try:
+            os.remove(_thumb_path(content_hash, name))
+        except OSError:
+            pass
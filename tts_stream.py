@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+tts_stream.py — OpenAI TTS audiosunun axınla (streaming) diskə və brauzerə ötürülməsi
+
+Bütün faylın sintezini gözləmək əvəzinə audio hissələri (chunk) gəldikcə
+static/audio/<qovluq>/<ad>.mp3 faylına yazılır. Player səhifəsi `stream_audio` endpoint-indən
+oxuyur: fayl hələ yazılırsa, mövcud baytlar dərhal göndərilir və yeni hissələr gəldikcə
+chunked HTTP cavabı ilə ardınca ötürülür — ilk səs bütün sintezdən yox, ilk hissədən sonra gəlir.
+
+- Yazılış davam edərkən faylın yanında `<ad>.mp3.partial` markeri olur (fayl adı dəyişdirilmir —
+  oxuyan tərəfin açıq faylı Windows-da da problem yaratmır).
+- Fayl tam hazırdırsa, endpoint adi `send_file` ilə cavab verir (Range/seek dəstəyi ilə).
+- İş `reserve`-dən sonra uğursuz olsa, handler `discard` ilə markeri və yarımçıq faylı silir. Worker ölübsə,
+  `JOB_LEASE_S`-dən çox yazılış olmayan marker köhnəlmiş sayılır: endpoint onu silir və 404 qaytarır
+  (iş həmin vaxt başqa worker-ə keçir və yeni fayl yaradır).
+"""
+
+import os
+import secrets
+import time
+
+from flask import Response, current_app, send_file
+
+import openai_client
+
+TTS_MODEL = os.getenv("OPENAI_TTS_MODEL", "tts-1")
+TTS_CHUNK_BYTES = 16 * 1024
+TTS_STREAM_IDLE_S = float(os.getenv("TTS_STREAM_IDLE_S", "30"))   # yeni bayt gəlməsə axın bu qədər sonra bağlanır
+TTS_STREAM_POLL_S = 0.1
+
+
+def audio_path(subdir: str, filename: str) -> str:
+    return os.path.join(current_app.config["AUDIO_FOLDER"], subdir, filename)
+
+
+def _marker_stale(path: str, marker: str) -> bool:
+    """Marker (və ya yazılan fayl) `JOB_LEASE_S` ərzində dəyişməyibsə, onu yaradan worker artıq yoxdur."""
+    try:
+        touched = max(os.path.getmtime(p) for p in (path, marker) if os.path.exists(p))
+    except (ValueError, OSError):
+        return False
+    return time.time() - touched > current_app.config.get("JOB_LEASE_S", 600)
+
+
+def reserve(subdir: str) -> str:
+    """
+    Yeni audio faylı üçün ad seçir və `.partial` markerini yaradır (sintez hələ başlamayıb, amma
+    player səhifəsi artıq açıla bilər — axın faylın görünməsini gözləyir). Fayl adını qaytarır.
+    """
+    filename = f"{secrets.token_hex(8)}.mp3"
+    path = audio_path(subdir, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path + ".partial", "w").close()
+    return filename
+
+
+def discard(subdir: str, filename: str) -> None:
+    """`reserve` ilə seçilmiş faylın markerini və yarımçıq audiosunu silir (iş uğursuz olduqda)."""
+    path = audio_path(subdir, filename)
+    for p in (path + ".partial", path):
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+
+
+def synthesize(text: str, voice: str, subdir: str, filename: str = None) -> str:
+    """
+    Mətni OpenAI TTS ilə audioya çevirir, hissələri gəldikcə diskə yazır və fayl adını qaytarır.
+    `filename` əvvəlcədən `reserve` ilə seçilibsə, həmin fayla yazılır.
+    Xəta olarsa yarımçıq fayl silinir və xəta yuxarı ötürülür.
+    """
+    filename = filename or reserve(subdir)
+    path = audio_path(subdir, filename)
+    marker = path + ".partial"
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+    try:
+        client = openai_client.get_client()
+        with client.audio.speech.with_streaming_response.create(
+            model=TTS_MODEL, voice=voice, input=text, response_format="mp3"
+        ) as response:
+            with open(path, "wb") as out:
+                for chunk in response.iter_bytes(TTS_CHUNK_BYTES):
+                    out.write(chunk)
+                    out.flush()
+    except Exception:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    finally:
+        try:
+            os.remove(marker)
+        except OSError:
+            pass
+    return filename
+
+
+def _follow(path: str, marker: str):
+    """Yazılmaqda olan faylı "tail -f" kimi oxuyur: marker yox olanda və fayl sonuna çatanda bitir."""
+    idle_deadline = time.monotonic() + TTS_STREAM_IDLE_S
+    f = None
+    try:
+        while True:
+            if f is None:
+                try:
+                    f = open(path, "rb")
+                except FileNotFoundError:
+                    if not os.path.exists(marker):
+                        return  # sintez uğursuz oldu (fayl silinib)
+            if f is not None:
+                chunk = f.read(TTS_CHUNK_BYTES)
+                if chunk:
+                    idle_deadline = time.monotonic() + TTS_STREAM_IDLE_S
+                    yield chunk
+                    continue
+                if not os.path.exists(marker):
+                    rest = f.read()  # marker silinməzdən əvvəl yazılan son baytlar
+                    if rest:
+                        yield rest
+                    return
+            if time.monotonic() > idle_deadline:
+                return
+            time.sleep(TTS_STREAM_POLL_S)
+    finally:
+        if f is not None:
+            f.close()
+
+
+def stream_audio(subdir: str, filename: str):
+    """
+    Audio faylı üçün HTTP cavabı: hazırdırsa `send_file`, hələ sintez olunursa chunked axın.
+    Fayl da, marker də yoxdursa (və ya marker köhnəlibsə) 404.
+    """
+    filename = os.path.basename(filename or "")
+    path = audio_path(subdir, filename)
+    marker = path + ".partial"
+    if not filename or not (os.path.exists(path) or os.path.exists(marker)):
+        return Response("Audio tapılmadı.", status=404, mimetype="text/plain")
+    if not os.path.exists(marker):
+        return send_file(path, mimetype="audio/mpeg", conditional=True)
+    if _marker_stale(path, marker):
+        discard(subdir, filename)
+        return Response("Audio tapılmadı.", status=404, mimetype="text/plain")
+    response = Response(_follow(path, marker), mimetype="audio/mpeg", direct_passthrough=True)
+    response.headers["Cache-Control"] = "no-store"
+    response.headers["X-Accel-Buffering"] = "no"   # nginx arxasında buferləmə olmasın
+    return response
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+vote_buffer.py — sorğu səsləri üçün proses daxili yazı buferi (write coalescing)
+
+Hər səs ayrıca INSERT + commit (yəni ayrıca fsync) etmək əvəzinə səslər növbəyə yığılır və fon thread-i
+onları hər `flush_ms` millisaniyədə və ya `batch_size` səs yığılanda BİR tranzaksiyada yazır:
+xam səslər `poll_votes`-a, yekun artımlar isə `poll_tallies`-ə (səs başına yox, seçim başına bir UPSERT).
+
+- Növbə məhduddur (`max_queue`): dolu olduqda `submit` `timeout` qədər gözləyir, sonra False qaytarır
+  (backpressure — çağıran tərəf istifadəçiyə "yenidən cəhd edin" deyir).
+- Proses bağlananda (`atexit`) növbədə qalan bütün səslər yazılır.
+- Yazılış xətası səsi itirmir: müvəqqəti xətada təkrar cəhd olunur (dayanma zamanı isə səslər `spill_path`
+  faylına düşür və növbəti başlanğıcda bazaya yazılır); yalnız qalıcı xətalı səslər `failures`-da sayılır.
+- Yazıçının öz bağlantısı var (`ConnectionPool.dedicated`): hovuz dolu olsa da sorğularla yarışmır.
+- Fork-dan sonra (məs. gunicorn worker) yeni prosesdə yeni thread başladılır.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import database
+
+logger = logging.getLogger(__name__)
+
+STOP_ATTEMPTS = 5      # proses dayananda müvəqqəti xətada bu qədər cəhddən sonra səslər diskə yazılır
+MAX_BACKOFF_S = 2.0
+_TRANSIENT_MARKERS = ("locked", "busy", "disk i/o", "unable to open")
+
+
+def _is_transient(exc: sqlite3.Error) -> bool:
+    """Kilid/IO və hovuz gözləmə xətaları keçicidir (təkrar cəhd mənalıdır); constraint, sxem xətaları qalıcıdır."""
+    if isinstance(exc, database.PoolTimeoutError):
+        return True
+    return isinstance(exc, sqlite3.OperationalError) and any(m in str(exc).lower() for m in _TRANSIENT_MARKERS)
+
+
+class VoteBuffer:
+    """Səsləri yığıb toplu (batch) yazan bufer. `submit` thread-safe-dir."""
+
+    def __init__(self, batch_size: int = 200, flush_ms: int = 50, max_queue: int = 10000, spill_path: str = None):
+        self.batch_size = max(1, int(batch_size))
+        self.flush_ms = max(1, int(flush_ms))
+        self.max_queue = max(1, int(max_queue))
+        self.spill_path = spill_path
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._write_lock = threading.Lock()   # fon thread-i və `flush()` eyni anda yazmasın
+        self._stats_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = None
+        self._conn_pid = None
+        self.pid = None
+        self.submitted = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.retries = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.last_batch = 0
+        atexit.register(self.stop)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive() and self.pid == os.getpid():
+            return
+        with self._stats_lock:
+            if self._thread is not None and self._thread.is_alive() and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="poll-vote-buffer", daemon=True)
+            self._thread.start()
+
+    def submit(self, poll_id: int, option_index: int, created_at: str, timeout: float = 1.0) -> bool:
+        """Səsi növbəyə qoyur. Növbə `timeout` saniyə ərzində boşalmasa False qaytarır (səs qəbul olunmadı)."""
+        self._ensure_thread()
+        try:
+            self._queue.put((poll_id, option_index, created_at), timeout=timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            return False
+        with self._stats_lock:
+            self.submitted += 1
+        return True
+
+    def _drain(self) -> list:
+        """Növbədən gözləmədən ən çox `batch_size` səs götürür."""
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        self._replay_spill()
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_ms / 1000)
+            except queue.Empty:
+                continue
+            # İlk səs gəldi: pəncərə bitənə və ya batch dolana qədər yığ
+            deadline = time.monotonic() + self.flush_ms / 1000
+            batch = [first]
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch: list) -> None:
+        """Batch-i yazır (müvəqqəti xətalarda təkrarlayaraq) və növbədəki elementləri tamamlanmış sayır."""
+        if not batch:
+            return
+        try:
+            with self._write_lock:
+                self._write_batch(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_batch(self, batch: list) -> None:
+        """
+        Batch-i bir tranzaksiyada yazır. Səs artıq istifadəçiyə "qeydə alındı" deyilib, ona görə atılmır:
+        - müvəqqəti xəta (`database is locked` və s.) — artan gözləmə ilə uğur alınana qədər təkrar;
+          proses dayanırsa (`stop`) bir neçə cəhddən sonra səslər `spill_path` faylına yazılır
+          və növbəti başlanğıcda oradan bazaya köçürülür;
+        - qalıcı xəta (məs. sorğu silinib — FOREIGN KEY) — batch səs-səs yazılır ki, bir pis səs
+          digərlərini aparmasın; yalnız yazıla bilməyən səs `failures`-da sayılır.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self._insert(batch)
+            except sqlite3.Error as e:
+                if not _is_transient(e):
+                    if len(batch) > 1:
+                        for vote in batch:
+                            self._write_batch([vote])
+                        return
+                    with self._stats_lock:
+                        self.failures += 1
+                    logger.error("Poll vote %r rejected by the database: %s", batch[0], e)
+                    return
+                if self._stop.is_set() and attempt >= STOP_ATTEMPTS and self.spill_path:
+                    self._spill(batch)
+                    return
+                with self._stats_lock:
+                    self.retries += 1
+                if attempt == 1 or attempt % 20 == 0:
+                    logger.warning("Poll vote batch (%d votes) not written yet (attempt %d): %s", len(batch), attempt, e)
+                time.sleep(min(MAX_BACKOFF_S, 0.05 * 2 ** (attempt - 1)))
+                continue
+            with self._stats_lock:
+                self.flushed += len(batch)
+                self.batches += 1
+                self.last_batch = len(batch)
+            return
+
+    def _connection(self):
+        """Yazıçının öz bağlantısı (`_write_lock` altında istifadə olunur); fork-dan sonra yenisi açılır."""
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = database.get_pool().dedicated()
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _close_connection(self) -> None:
+        if self._conn is not None and self._conn_pid == os.getpid():
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+        self._conn = self._conn_pid = None
+
+    def _insert(self, batch: list) -> None:
+        tallies = Counter((poll_id, idx) for poll_id, idx, _ in batch)
+        conn = self._connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO poll_votes (poll_id, option_index, created_at) VALUES (?, ?, ?)", batch
+            )
+            conn.executemany(
+                "INSERT INTO poll_tallies (poll_id, option_index, count) VALUES (?, ?, ?) "
+                "ON CONFLICT (poll_id, option_index) DO UPDATE SET count = count + excluded.count",
+                [(poll_id, idx, n) for (poll_id, idx), n in tallies.items()],
+            )
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                self._close_connection()   # pozulmuş bağlantı — növbəti cəhd yenisini açır
+            raise
+
+    def _spill(self, batch: list) -> None:
+        """Yazıla bilməyən səsləri diskə (JSON sətirləri, fsync ilə) saxlayır."""
+        os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            for vote in batch:
+                f.write(json.dumps(list(vote)) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        with self._stats_lock:
+            self.spilled += len(batch)
+        logger.warning("Poll vote batch (%d votes) spilled to %s", len(batch), self.spill_path)
+
+    def _replay_spill(self) -> None:
+        """Əvvəlki prosesdən diskə düşmüş səsləri bazaya yazır (fon thread-i başlayanda)."""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        replaying = f"{self.spill_path}.{os.getpid()}.replay"
+        try:
+            os.replace(self.spill_path, replaying)   # başqa proses eyni faylı ikinci dəfə oxumasın
+        except OSError:
+            return
+        with open(replaying, encoding="utf-8") as f:
+            votes = [tuple(json.loads(line)) for line in f if line.strip()]
+        for i in range(0, len(votes), self.batch_size):
+            with self._write_lock:
+                self._write_batch(votes[i:i + self.batch_size])
+        os.remove(replaying)
+        with self._stats_lock:
+            self.replayed += len(votes)
+
+    def flush(self) -> int:
+        """
+        Növbədə gözləyən bütün səsləri dərhal (sinxron) yazır və fon thread-inin əlindəki batch-in
+        commit olunmasını gözləyir. Bu thread-in yazdığı səs sayını qaytarır.
+        """
+        total = 0
+        while True:
+            batch = self._drain()
+            if not batch:
+                break
+            self._write(batch)
+            total += len(batch)
+        if self._thread is not None and self._thread.is_alive() and self.pid == os.getpid():
+            self._queue.join()
+        return total
+
+    def stop(self) -> None:
+        """Fon thread-ini dayandırır və qalan səsləri yazır (`atexit`-də avtomatik çağırılır)."""
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive() and self.pid == os.getpid():
+            self._thread.join(timeout=max(1.0, self.flush_ms / 1000 * 2))
+        self.flush()
+        with self._write_lock:
+            self._close_connection()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "batch_size": self.batch_size,
+                "flush_ms": self.flush_ms,
+                "max_queue": self.max_queue,
+                "queued": self._queue.qsize(),
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "flushed": self.flushed,
+                "batches": self.batches,
+                "failures": self.failures,
+                "retries": self.retries,
+                "spilled": self.spilled,
+                "replayed": self.replayed,
+                "last_batch": self.last_batch,
+            }